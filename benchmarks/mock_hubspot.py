@@ -0,0 +1,584 @@
+"""
+Local stand-in for the parts of the Hubspot API the migrator uses, for benchmarking without spending API quota.
+
+Serves /integrations/v1/me, the CRM v3 objects (basic, batch and search), associations and properties endpoints
+from memory. Every API key gets its own portal: keys containing "sandbox" are sandbox portals, any other key is a
+production portal. Latency, random 429s and a per-key rate limit can be injected.
+Association batch creates that name an unknown record answer 207 with the failures listed in errors, like Hubspot does.
+
+Besides the Hubspot endpoints, the server answers a few of its own under /__mock__/:
+    POST /__mock__/config   {"latency": 0.02, "error_rate": 0.01, "rate_limit": 100, "rate_interval": 1}
+    POST /__mock__/seed     {"api_key": "prod-key", "contacts": 1000, "companies": 100, "deals": 200, "products": 10}
+    POST /__mock__/reset    drops every portal, counter and setting
+    GET  /__mock__/stats    {"calls": {"GET /crm/v3/objects/contacts": 10, ...}, "total": 10, "throttled": 0}
+
+Run it on its own with `python benchmarks/mock_hubspot.py --port 8765`, then point the migrator at it with
+HUBSPOT_API_HOST=http://127.0.0.1:8765 or HubspotSandboxMigrator(..., host="http://127.0.0.1:8765").
+"""
+import argparse
+import bisect
+import datetime
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HUBSPOT_OBJECT_SINGULARS = {
+    "companies": "company",
+    "contacts": "contact",
+    "deals": "deal",
+    "line_items": "line_item",
+    "products": "product",
+    "quotes": "quote",
+    "tickets": "ticket",
+}
+HUBSPOT_OBJECT_PLURALS = {v: k for k, v in HUBSPOT_OBJECT_SINGULARS.items()}
+
+# Every object reports the same property schema, a superset of the default object_config
+PROPERTIES = [
+    "address", "address2", "amount", "city", "closedate", "company", "country", "createdate", "deal_status",
+    "dealname", "dealstage", "dealtype", "description", "discount", "domain", "email", "firstname", "hs_lastmodifieddate",
+    "hs_object_id", "hs_product_id", "hs_sku", "jobtitle", "lastmodifieddate", "lastname", "lifecyclestage", "name",
+    "phone", "pipeline", "price", "quantity", "recurringbillingfrequency", "state", "status", "tax", "type", "website",
+    "zip",
+]
+
+SEARCH_RESULTS_LIMIT = 10000
+
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def to_millis(timestamp):
+    return int(
+        datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+        .replace(tzinfo=datetime.timezone.utc)
+        .timestamp()
+        * 1000
+    )
+
+
+def reverse_association_type(hs_association_string):
+    from_object, to_object = hs_association_string.replace("_unlabeled", "").split("_to_")
+    return f"{to_object}_to_{from_object}"
+
+
+class Portal:
+    """Records and associations of one Hubspot instance, with IDs kept sorted for cursor paging"""
+
+    def __init__(self, portal_id, account_type):
+        self.portal_id = portal_id
+        self.account_type = account_type
+        self.records = {hs_object: {} for hs_object in HUBSPOT_OBJECT_SINGULARS}
+        self.sorted_ids = {hs_object: [] for hs_object in HUBSPOT_OBJECT_SINGULARS}
+        self.unsorted = set()
+        # {(hs_object, id): {to_object: {to_id: hs_association_string}}}
+        self.associations = {}
+        self.next_id = portal_id * 10 ** 9 + 1
+        self.lock = threading.Lock()
+
+    def create(self, hs_object, properties):
+        record_id = self.next_id
+        self.next_id += 1
+        self.records[hs_object][str(record_id)] = {
+            "properties": dict(properties),
+            "createdAt": now(),
+            "updatedAt": now(),
+        }
+        # IDs only grow, so appending keeps the list sorted
+        self.sorted_ids[hs_object].append(record_id)
+        return str(record_id)
+
+    def archive(self, hs_object, record_id):
+        if self.records[hs_object].pop(record_id, None) is not None:
+            self.unsorted.add(hs_object)
+        for to_object, to_ids in self.associations.pop((hs_object, record_id), {}).items():
+            for to_id in to_ids:
+                self.associations.get((to_object, to_id), {}).get(hs_object, {}).pop(record_id, None)
+
+    def get_sorted_ids(self, hs_object):
+        if hs_object in self.unsorted:
+            self.sorted_ids[hs_object] = sorted(int(i) for i in self.records[hs_object])
+            self.unsorted.discard(hs_object)
+        return self.sorted_ids[hs_object]
+
+    def associate(self, from_object, from_id, to_object, to_id, hs_association_string):
+        self.associations.setdefault((from_object, from_id), {}).setdefault(to_object, {})[to_id] = hs_association_string
+        self.associations.setdefault((to_object, to_id), {}).setdefault(from_object, {})[from_id] = (
+            reverse_association_type(hs_association_string)
+        )
+
+    def dissociate(self, from_object, from_id, to_object, to_id):
+        self.associations.get((from_object, from_id), {}).get(to_object, {}).pop(to_id, None)
+        self.associations.get((to_object, to_id), {}).get(from_object, {}).pop(from_id, None)
+
+    def get_associations(self, hs_object, record_id, to_object):
+        return [
+            {"id": to_id, "type": hs_association_string}
+            for to_id, hs_association_string in self.associations.get((hs_object, record_id), {})
+            .get(to_object, {})
+            .items()
+        ]
+
+    def get_record(self, hs_object, record_id, properties=None, associations=None):
+        record = self.records[hs_object][record_id]
+        if properties:
+            record_properties = {p: record["properties"].get(p) for p in properties}
+        else:
+            record_properties = dict(record["properties"])
+        record_properties["hs_object_id"] = record_id
+        result = {
+            "id": record_id,
+            "properties": record_properties,
+            "createdAt": record["createdAt"],
+            "updatedAt": record["updatedAt"],
+            "archived": False,
+        }
+        if associations:
+            result["associations"] = {}
+            for to_object in associations:
+                results = self.get_associations(hs_object, record_id, to_object)
+                if results:
+                    result["associations"][to_object] = {"results": results}
+        return result
+
+    def get_property_value(self, hs_object, record_id, property_name):
+        record = self.records[hs_object][record_id]
+        if property_name in ("hs_lastmodifieddate", "lastmodifieddate"):
+            return to_millis(record["updatedAt"])
+        if property_name == "hs_object_id":
+            return int(record_id)
+        return record["properties"].get(property_name)
+
+
+class MockState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.portals = {}
+        self.calls = {}
+        self.throttled = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.rate_limit = 0
+        self.rate_interval = 1.0
+        self.windows = {}
+        self.random = random.Random(0)
+
+    def get_portal(self, api_key):
+        with self.lock:
+            if api_key not in self.portals:
+                account_type = "SANDBOX" if "sandbox" in api_key else "STANDARD"
+                self.portals[api_key] = Portal(len(self.portals) + 1, account_type)
+            return self.portals[api_key]
+
+    def record_call(self, api_key, route, limited=True):
+        """
+        Counts a call, returning the rate limit headers to send, or None if the call is to be throttled.
+        Calls that are not limited are never throttled.
+        """
+        with self.lock:
+            self.calls[route] = self.calls.get(route, 0) + 1
+            if not limited:
+                return {}
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.throttled += 1
+                return None
+            if not self.rate_limit:
+                return {}
+            window = int(time.monotonic() / self.rate_interval)
+            calls_in_window = self.windows.get((api_key, window), 0) + 1
+            self.windows = {k: v for k, v in self.windows.items() if k[1] == window}
+            self.windows[(api_key, window)] = calls_in_window
+            headers = {
+                "X-HubSpot-RateLimit-Max": str(self.rate_limit),
+                "X-HubSpot-RateLimit-Interval-Milliseconds": str(int(self.rate_interval * 1000)),
+                "X-HubSpot-RateLimit-Remaining": str(max(self.rate_limit - calls_in_window, 0)),
+            }
+            if calls_in_window > self.rate_limit:
+                self.throttled += 1
+                return None
+            return headers
+
+
+STATE = MockState()
+
+
+def seed(portal, contacts=1000, companies=None, deals=None, products=10):
+    """
+    Fills a portal with records associated the way a CRM usually is: every contact with one company, one deal per
+    five contacts, and one line item for a product on every deal
+    """
+    companies = max(contacts // 10, 1) if companies is None else companies
+    deals = contacts // 5 if deals is None else deals
+    with portal.lock:
+        product_ids = [
+            portal.create("products", {"name": f"Product {i}", "hs_sku": f"SKU-{i}", "price": str(i * 10)})
+            for i in range(products)
+        ]
+        company_ids = [
+            portal.create("companies", {"name": f"Company {i}", "domain": f"company{i}.example.com", "city": "Springfield"})
+            for i in range(companies)
+        ]
+        deal_ids = [
+            portal.create("deals", {"dealname": f"Deal {i}", "amount": str(i * 100), "pipeline": "default", "dealstage": "appointmentscheduled"})
+            for i in range(deals)
+        ]
+        for i in range(contacts):
+            contact_id = portal.create(
+                "contacts",
+                {"firstname": f"First{i}", "lastname": f"Last{i}", "email": f"contact{i}@example.com", "city": "Springfield", "lifecyclestage": "lead"},
+            )
+            if company_ids:
+                portal.associate("contacts", contact_id, "companies", company_ids[i % len(company_ids)], "contact_to_company")
+            if deal_ids and i % 5 == 0 and i // 5 < len(deal_ids):
+                portal.associate("contacts", contact_id, "deals", deal_ids[i // 5], "contact_to_deal")
+        for i, deal_id in enumerate(deal_ids):
+            if product_ids:
+                line_item_id = portal.create(
+                    "line_items",
+                    {"name": f"Line Item {i}", "quantity": "1", "price": "10", "hs_product_id": product_ids[i % len(product_ids)]},
+                )
+                portal.associate("deals", deal_id, "line_items", line_item_id, "deal_to_line_item")
+    return {hs_object: len(records) for hs_object, records in portal.records.items()}
+
+
+def matches_filter(portal, hs_object, record_id, search_filter):
+    value = portal.get_property_value(hs_object, record_id, search_filter["propertyName"])
+    operator = search_filter.get("operator")
+    target = search_filter.get("value")
+    if operator == "EQ":
+        return value is not None and str(value) == str(target)
+    if operator == "NEQ":
+        return value is None or str(value) != str(target)
+    if operator == "IN":
+        return value is not None and str(value) in [str(v) for v in search_filter.get("values", [])]
+    if operator == "HAS_PROPERTY":
+        return value not in (None, "")
+    if operator == "NOT_HAS_PROPERTY":
+        return value in (None, "")
+    if value is None:
+        return False
+    try:
+        value, target = float(value), float(target)
+    except (TypeError, ValueError):
+        value, target = str(value), str(target)
+    return {
+        "GT": value > target,
+        "GTE": value >= target,
+        "LT": value < target,
+        "LTE": value <= target,
+    }[operator]
+
+
+class MockHubspotHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body=None, headers=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+
+        if url.path.startswith("/__mock__/"):
+            return self.handle_mock(method, url.path, body)
+
+        api_key = (query.get("hapikey") or [""])[0]
+        if not api_key:
+            return self.send_json(401, {"status": "error", "message": "Missing hapikey"})
+
+        route = method + " " + re.sub(r"/\d+", "/{id}", url.path)
+        # account lookups are not throttled, the migrator does not retry them
+        headers = STATE.record_call(api_key, route, limited=url.path.startswith("/crm/"))
+        if STATE.latency:
+            time.sleep(STATE.latency)
+        if headers is None:
+            return self.send_json(
+                429,
+                {"status": "error", "message": "You have reached your secondly limit.", "category": "RATE_LIMITS"},
+                {"X-HubSpot-RateLimit-Max": str(STATE.rate_limit or 100), "X-HubSpot-RateLimit-Remaining": "0"},
+            )
+
+        portal = STATE.get_portal(api_key)
+        with portal.lock:
+            try:
+                status, response = self.handle_api(method, url.path, query, body, portal)
+            except KeyError as ex:
+                status, response = 404, {"status": "error", "message": f"Not found: {ex}"}
+        self.send_json(status, response, headers)
+
+    def handle_mock(self, method, path, body):
+        if path == "/__mock__/config" and method == "POST":
+            with STATE.lock:
+                for name in ("latency", "error_rate", "rate_limit", "rate_interval"):
+                    if name in body:
+                        setattr(STATE, name, type(getattr(STATE, name))(body[name]))
+            return self.send_json(200, {"status": "ok"})
+        if path == "/__mock__/seed" and method == "POST":
+            body = dict(body)
+            portal = STATE.get_portal(body.pop("api_key", "prod-key"))
+            return self.send_json(200, seed(portal, **body))
+        if path == "/__mock__/reset" and method == "POST":
+            with STATE.lock:
+                STATE.reset()
+            return self.send_json(200, {"status": "ok"})
+        if path == "/__mock__/stats" and method == "GET":
+            with STATE.lock:
+                return self.send_json(
+                    200,
+                    {"calls": dict(STATE.calls), "total": sum(STATE.calls.values()), "throttled": STATE.throttled},
+                )
+        return self.send_json(404, {"status": "error"})
+
+    def handle_api(self, method, path, query, body, portal):
+        if path == "/integrations/v1/me":
+            return 200, {"portalId": portal.portal_id, "accountType": portal.account_type, "timeZone": "US/Eastern"}
+
+        match = re.fullmatch(r"/crm/v3/properties/(\w+)", path)
+        if match:
+            return 200, {
+                "results": [
+                    {
+                        "name": name,
+                        "label": name,
+                        "type": "string",
+                        "fieldType": "text",
+                        "groupName": "mock",
+                        "description": "",
+                        "options": [],
+                        "calculated": False,
+                        "modificationMetadata": {
+                            "readOnlyValue": name in ("hs_object_id", "createdate", "lastmodifieddate", "hs_lastmodifieddate"),
+                            "readOnlyDefinition": True,
+                            "archivable": False,
+                        },
+                    }
+                    for name in PROPERTIES
+                ]
+            }
+
+        match = re.fullmatch(r"/crm/v3/associations/(\w+)/(\w+)/batch/(create|read|archive)", path)
+        if match:
+            from_object, to_object, action = match.groups()
+            from_object = HUBSPOT_OBJECT_PLURALS.get(from_object, from_object)
+            to_object = HUBSPOT_OBJECT_PLURALS.get(to_object, to_object)
+            return self.handle_associations(portal, from_object, to_object, action, body.get("inputs", []))
+
+        match = re.fullmatch(r"/crm/v3/objects/(\w+)(?:/(\w+))?(?:/(\w+))?", path)
+        if not match or match.group(1) not in portal.records:
+            return 404, {"status": "error", "message": "Unknown endpoint"}
+        hs_object, record_id, action = match.groups()
+
+        if record_id == "batch":
+            return self.handle_batch(portal, hs_object, action, body)
+        if record_id == "search" and method == "POST":
+            return self.handle_search(portal, hs_object, body)
+
+        properties = self.get_list_param(query, "properties")
+        associations = self.get_list_param(query, "associations")
+        if record_id is None and method == "GET":
+            return self.handle_page(portal, hs_object, query, properties, associations)
+        if record_id is None and method == "POST":
+            return 201, portal.get_record(hs_object, portal.create(hs_object, body.get("properties", {})))
+        if method == "GET":
+            return 200, portal.get_record(hs_object, record_id, properties, associations)
+        if method == "PATCH":
+            record = portal.records[hs_object][record_id]
+            record["properties"].update(body.get("properties", {}))
+            record["updatedAt"] = now()
+            return 200, portal.get_record(hs_object, record_id)
+        if method == "DELETE":
+            portal.archive(hs_object, record_id)
+            return 204, None
+        return 404, {"status": "error", "message": "Unknown endpoint"}
+
+    @staticmethod
+    def get_list_param(query, name):
+        values = query.get(name) or []
+        return [v for value in values for v in value.split(",") if v]
+
+    def handle_page(self, portal, hs_object, query, properties, associations):
+        sorted_ids = portal.get_sorted_ids(hs_object)
+        after = (query.get("after") or [None])[0]
+        limit = min(int((query.get("limit") or ["10"])[0]), 100)
+        start = bisect.bisect_left(sorted_ids, int(after)) if after else 0
+        page_ids = sorted_ids[start : start + limit]
+        response = {
+            "results": [
+                portal.get_record(hs_object, str(record_id), properties, associations)
+                for record_id in page_ids
+            ]
+        }
+        if start + limit < len(sorted_ids):
+            next_after = str(sorted_ids[start + limit])
+            response["paging"] = {"next": {"after": next_after, "link": ""}}
+        return 200, response
+
+    def handle_batch(self, portal, hs_object, action, body):
+        inputs = body.get("inputs", [])
+        if len(inputs) > 100:
+            return 400, {"status": "error", "message": "Batch inputs are limited to 100"}
+        store = portal.records[hs_object]
+        if action == "create":
+            results = [
+                portal.get_record(hs_object, portal.create(hs_object, i.get("properties", {})))
+                for i in inputs
+            ]
+            return 201, {"status": "COMPLETE", "results": results, "startedAt": now(), "completedAt": now()}
+        if action == "read":
+            results = [
+                portal.get_record(hs_object, str(i["id"]), body.get("properties"))
+                for i in inputs
+                if str(i["id"]) in store
+            ]
+            return 200, {"status": "COMPLETE", "results": results, "startedAt": now(), "completedAt": now()}
+        if action == "update":
+            results = []
+            for i in inputs:
+                record = store.get(str(i["id"]))
+                if record is not None:
+                    record["properties"].update(i.get("properties", {}))
+                    record["updatedAt"] = now()
+                    results.append(portal.get_record(hs_object, str(i["id"])))
+            return 200, {"status": "COMPLETE", "results": results, "startedAt": now(), "completedAt": now()}
+        if action == "archive":
+            for i in inputs:
+                portal.archive(hs_object, str(i["id"]))
+            return 204, None
+        return 404, {"status": "error", "message": "Unknown batch action"}
+
+    def handle_search(self, portal, hs_object, body):
+        filter_groups = body.get("filterGroups") or []
+        record_ids = [
+            str(record_id)
+            for record_id in portal.get_sorted_ids(hs_object)
+            if not filter_groups
+            or any(
+                all(matches_filter(portal, hs_object, str(record_id), f) for f in group.get("filters", []))
+                for group in filter_groups
+            )
+        ]
+        for sort in reversed(body.get("sorts") or []):
+            if isinstance(sort, str):
+                sort = {"propertyName": sort, "direction": "ASCENDING"}
+
+            def sort_key(record_id, property_name=sort["propertyName"]):
+                value = portal.get_property_value(hs_object, record_id, property_name)
+                try:
+                    return (value is None, float(value), "")
+                except (TypeError, ValueError):
+                    return (value is None, 0.0, str(value))
+
+            record_ids.sort(key=sort_key, reverse=sort.get("direction") == "DESCENDING")
+
+        after = int(body.get("after") or 0)
+        limit = min(int(body.get("limit") or 10), 100)
+        if after + limit > SEARCH_RESULTS_LIMIT:
+            return 400, {"status": "error", "message": f"Search results are limited to {SEARCH_RESULTS_LIMIT}"}
+        response = {
+            "total": len(record_ids),
+            "results": [
+                portal.get_record(hs_object, record_id, body.get("properties"))
+                for record_id in record_ids[after : after + limit]
+            ],
+        }
+        if after + limit < len(record_ids):
+            response["paging"] = {"next": {"after": str(after + limit), "link": ""}}
+        return 200, response
+
+    def handle_associations(self, portal, from_object, to_object, action, inputs):
+        if action == "read":
+            results = []
+            for i in inputs:
+                to = portal.get_associations(from_object, str(i["id"]), to_object)
+                if to:
+                    results.append({"from": {"id": str(i["id"])}, "to": to})
+            return 200, {"status": "COMPLETE", "results": results, "startedAt": now(), "completedAt": now()}
+
+        results = []
+        errors = []
+        for i in inputs:
+            from_id, to_id = str(i["from"]["id"]), str(i["to"]["id"])
+            if action == "archive":
+                portal.dissociate(from_object, from_id, to_object, to_id)
+                continue
+            if from_id not in portal.records[from_object] or to_id not in portal.records[to_object]:
+                # like Hubspot, the rest of the batch is still created and the failures are listed in a 207
+                errors.append(
+                    {
+                        "status": "error",
+                        "category": "OBJECT_NOT_FOUND",
+                        "message": f"Unknown record in association {from_id} to {to_id}",
+                        "errors": [],
+                        "context": {"fromId": [from_id], "toId": [to_id]},
+                        "links": {},
+                    }
+                )
+                continue
+            portal.associate(from_object, from_id, to_object, to_id, i["type"])
+            results.append({"from": {"id": from_id}, "to": {"id": to_id}, "type": i["type"]})
+        if action == "archive":
+            return 204, None
+        response = {"status": "COMPLETE", "results": results, "startedAt": now(), "completedAt": now()}
+        if errors:
+            response.update({"errors": errors, "numErrors": len(errors)})
+            return 207, response
+        return 201, response
+
+
+def start_server(host="127.0.0.1", port=0):
+    """Starts the mock server on a background thread, returning the server and its base URL"""
+    server = ThreadingHTTPServer((host, port), MockHubspotHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the Hubspot API endpoints used by the migrator.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on, 0 for any free port")
+    args = parser.parse_args()
+
+    server, url = start_server(args.host, args.port)
+    # the benchmark runner reads the URL from this first line
+    print(url, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
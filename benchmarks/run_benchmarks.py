@@ -0,0 +1,253 @@
+"""
+Offline benchmarks for HubspotSandboxMigrator, run against the local mock server in mock_hubspot.py
+so that no Hubspot API quota is spent.
+
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --latency 0.05 --error-rate 0.01 --compare benchmarks/results.json
+
+Each scenario runs in a fresh process against a freshly seeded mock server, and only the call under test is timed.
+For every scenario and size the results hold records per second, API calls per record (counted by the mock server)
+and peak resident memory of the migrator's process, as JSON that can be compared across versions with --compare.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+PROD_API_KEY = "prod-key"
+SANDBOX_API_KEY = "sandbox-key"
+
+# Scenario name: what is timed
+SCENARIOS = {
+    "migrate_object": "migrate_object of contacts without associations",
+    "migrate_object_associations": "migrate_object of contacts with their associated objects",
+    "create_all_associations": "create_all_associations after a migration with associations and delete_all_associations",
+    "clean_up": "clean_up after a migration with associations",
+}
+
+
+def mock_request(url, path, body=None):
+    """Calls one of the mock server's own /__mock__/ endpoints"""
+    request = urllib.request.Request(
+        url + path,
+        data=None if body is None else json.dumps(body).encode(),
+        method="GET" if body is None else "POST",
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def start_mock_server():
+    """Starts mock_hubspot.py in its own process so it does not compete with the migrator for the GIL"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "mock_hubspot.py"), "--port", "0"],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return process, process.stdout.readline().strip()
+
+
+def get_peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where the resource module is not available"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def get_version():
+    try:
+        version = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+        dirty = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+        return version + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(scenario, size, url, migrator_kwargs, verbose=False):
+    """
+    Runs in a fresh process, with its mapping SQLite file in a temporary directory.
+    Sets the scenario up, then times the call under test and measures what it cost.
+    """
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="hubspot-benchmark-"))
+
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        from hubspot_prod_to_sandbox import HubspotSandboxMigrator
+
+        migrator = HubspotSandboxMigrator(PROD_API_KEY, SANDBOX_API_KEY, host=url, **migrator_kwargs)
+        store = migrator.mapping_store
+
+        if scenario in ["create_all_associations", "clean_up"]:
+            migrator.migrate_object("contacts", limit=size, include_associations=True)
+        if scenario == "create_all_associations":
+            # associations already created are skipped, so take them out of sandbox for them to be created again
+            migrator.delete_all_associations()
+
+        calls_before = mock_request(url, "/__mock__/stats")
+        memory_before = get_peak_memory_mb()
+        started = time.perf_counter()
+
+        if scenario == "migrate_object":
+            migrator.migrate_object("contacts", limit=size)
+            records = len(store.get_mappings(include_products=False))
+        elif scenario == "migrate_object_associations":
+            migrator.migrate_object("contacts", limit=size, include_associations=True)
+            records = len(store.get_mappings(include_products=False))
+        elif scenario == "create_all_associations":
+            migrator.create_all_associations()
+            records = store.query(f"SELECT COUNT(*) FROM {store.prod_associations}")[0][0]
+        elif scenario == "clean_up":
+            records = len(store.get_mappings(include_products=False))
+            migrator.clean_up()
+        else:
+            raise ValueError(f"Unknown scenario {scenario}. Should be one of {list(SCENARIOS)}")
+
+        seconds = time.perf_counter() - started
+
+    calls_after = mock_request(url, "/__mock__/stats")
+    memory_after = get_peak_memory_mb()
+    calls = {
+        route: count - calls_before["calls"].get(route, 0)
+        for route, count in calls_after["calls"].items()
+        if count > calls_before["calls"].get(route, 0)
+    }
+    api_calls = sum(calls.values())
+
+    return {
+        "scenario": scenario,
+        "size": size,
+        "records": records,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(records / seconds, 1) if seconds else None,
+        "api_calls": api_calls,
+        "calls_per_record": round(api_calls / records, 4) if records else None,
+        "throttled_calls": calls_after["throttled"] - calls_before["throttled"],
+        "peak_memory_mb": None if memory_after is None else round(memory_after, 1),
+        "memory_growth_mb": None if memory_after is None else round(memory_after - memory_before, 1),
+        "calls": dict(sorted(calls.items())),
+    }
+
+
+def print_header():
+    print(
+        f"{'scenario':<30}{'size':>8}{'records':>9}{'seconds':>10}{'records/s':>11}{'calls/rec':>11}{'429s':>6}{'peak MB':>9}"
+    )
+
+
+def print_result(r):
+    print(
+        f"{r['scenario']:<30}{r['size']:>8}{r['records']:>9}{r['seconds']:>10.2f}"
+        f"{r['records_per_sec'] or 0:>11.1f}{r['calls_per_record'] or 0:>11.3f}{r['throttled_calls']:>6}"
+        f"{r['peak_memory_mb'] or 0:>9.1f}",
+        flush=True,
+    )
+
+
+def print_comparison(results, baseline):
+    """Changes from a baseline results file, for every scenario and size both have"""
+    baseline_results = {(r["scenario"], r["size"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline.get('version')} ({baseline.get('started_at')})")
+    print(f"{'scenario':<30}{'size':>8}{'records/s':>18}{'calls/rec':>18}{'peak MB':>18}")
+
+    def change(new, old):
+        if not new or not old:
+            return "n/a"
+        return f"{(new - old) / old:+.1%}"
+
+    for r in results:
+        old = baseline_results.get((r["scenario"], r["size"]))
+        if old is None:
+            continue
+        print(
+            f"{r['scenario']:<30}{r['size']:>8}"
+            f"{change(r['records_per_sec'], old['records_per_sec']):>18}"
+            f"{change(r['calls_per_record'], old['calls_per_record']):>18}"
+            f"{change(r['peak_memory_mb'], old['peak_memory_mb']):>18}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for HubspotSandboxMigrator against a mock Hubspot server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Numbers of contacts to migrate, e.g. 1000 10000 100000")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the mock server waits before answering each call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls the mock server answers with a 429")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Calls per API key the mock server allows per --rate-interval, 0 for no limit")
+    parser.add_argument("--rate-interval", type=float, default=1.0, help="Seconds in the mock server's rate limit window")
+    parser.add_argument("--burst-limit", type=int, default=100000, help="Calls per 10 seconds the migrator's rate limiter allows")
+    parser.add_argument("--pool-size", type=int, default=10, help="Connection pool size of the migrator")
+    parser.add_argument("--output", help="File to write the results to as JSON")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare with")
+    parser.add_argument("--verbose", action="store_true", help="Show the migrator's output")
+    args = parser.parse_args()
+
+    server_config = {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "rate_limit": args.rate_limit,
+        "rate_interval": args.rate_interval,
+    }
+    migrator_kwargs = {
+        "burst_limit": args.burst_limit,
+        "daily_limit": 10 ** 9,
+        "pool_size": args.pool_size,
+    }
+
+    process, url = start_mock_server()
+    results = []
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    print_header()
+    try:
+        context = multiprocessing.get_context("spawn")
+        for size in args.sizes:
+            for scenario in args.scenarios:
+                mock_request(url, "/__mock__/reset", {})
+                mock_request(url, "/__mock__/config", server_config)
+                mock_request(url, "/__mock__/seed", {"api_key": PROD_API_KEY, "contacts": size})
+
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_scenario, (scenario, size, url, migrator_kwargs, args.verbose))
+                results.append(result)
+                print_result(result)
+    finally:
+        process.terminate()
+        process.wait()
+
+    report = {
+        "version": get_version(),
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server_config": server_config,
+        "migrator_config": migrator_kwargs,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
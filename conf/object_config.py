@@ -1,5 +1,20 @@
 """
 Update the properties on each object that you want included in the migration. Delete objects that you do not want migrated.
+
+To migrate only some records of an object when it is the one passed to migrate_object, add "filter_groups" (and
+optionally "sorts") in the shape the Hubspot CRM search API takes them, e.g. to migrate only open deals in a pipeline:
+
+    "deals": {
+        "properties": [...],
+        "filter_groups": [
+            {
+                "filters": [
+                    {"propertyName": "pipeline", "operator": "EQ", "value": "default"},
+                    {"propertyName": "hs_is_closed", "operator": "EQ", "value": "false"},
+                ]
+            }
+        ],
+    },
 """
 
 object_config = {
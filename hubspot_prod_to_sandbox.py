@@ -1,80 +1,544 @@
 #!/usr/bin/env python
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import gzip
+import hashlib
+import inspect
 import json
+import math
 import os
+import queue
+import shutil
 import sqlite3
 import sys
+import tempfile
+import threading
 import time
-from functools import wraps
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from pprint import pprint
 
-import hubspot
-import pandas as pd
 import requests
-from hubspot.crm.associations import BatchInputPublicAssociation
-from hubspot.crm.products import (ApiException,
-                                  BatchInputSimplePublicObjectInput,
-                                  BatchReadInputSimplePublicObjectId,
-                                  PublicObjectSearchRequest,
-                                  SimplePublicObjectInput)
-from mimesis import Address, Datetime, Finance, Food, Internet, Numeric, Person
-from pandas import json_normalize
 
 from conf.object_config import object_config
 
-conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
+# hubspot and mimesis take most of the time it takes to import this module, so they are imported
+# where they are first needed, leaving `run_migrator.py --help` and runs that never call Hubspot fast.
+# pandas is only needed for the optional reporting helpers, e.g. MigrationMetrics.to_dataframe
 
 
-def show_time(func):
+# Upper bounds, in seconds, of the buckets of the API latency histograms
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def get_endpoint_name(api_method):
+    """Short name of the endpoint behind a bound hubspot API method, e.g. crm.contacts.batch_api.create"""
+    name = getattr(api_method, "__name__", type(api_method).__name__)
+    owner = getattr(api_method, "__self__", None)
+    if owner is None:
+        return name
+    module = type(owner).__module__.split(".")
+    if module[0] == "hubspot":
+        module = [part for part in module[1:] if part != "api"]
+    return ".".join(module + [name])
+
+
+def format_prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = {
+        k: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        for k, v in labels.items()
+    }
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+class MigrationMetrics:
+    """
+    Thread-safe timings and counters of one migrator, reported for each run (the outermost call of a method
+    decorated with report_run):
+    - wall time of every public method call and of each phase of the work: extract, transform, create, update,
+      association_building, association_creation, archive, sqlite and throttle (time spent waiting on the rate limiter).
+      Phases nest, create includes the SQLite write of the mappings it made, and are summed across threads,
+      so together they can add up to more than the run's wall time
+    - calls, errors, retries, 429s and a latency histogram per Hubspot endpoint
+    - records read, created, updated and archived per object, and per second of the run
+    Each run starts from zero. Its report is kept in last_report and, when report_dir is set, written there
+    as JSON and as a Prometheus text file for the node_exporter textfile collector.
+    """
+
+    def __init__(self, labels=None, report_dir=None):
+        self.labels = dict(labels or {})
+        self.report_dir = report_dir
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.active_runs = 0
+        self.last_report = None
+        self.reset()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} of {self.run['method'] if self.run else 'no run'}"
+
+    def reset(self):
+        with self.lock:
+            self.run = None
+            self.phases = {}
+            self.methods = {}
+            self.endpoints = {}
+            self.records = {}
+            self.sqlite = {}
+            self.throttle_waits = 0
+
+    def active_phases(self):
+        if not hasattr(self.local, "phases"):
+            self.local.phases = set()
+        return self.local.phases
+
+    def add_phase_time(self, phase, seconds):
+        with self.lock:
+            stats = self.phases.setdefault(phase, {"count": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """Times the block as part of phase, unless this thread is already inside it"""
+        active = self.active_phases()
+        if phase in active:
+            yield
+            return
+        active.add(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            active.discard(phase)
+            self.add_phase_time(phase, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def sqlite_operation(self, operation):
+        """Times one MappingStore call as part of the sqlite phase, calls it makes to other MappingStore methods are not counted again"""
+        if "sqlite" in self.active_phases():
+            yield
+            return
+        started = time.perf_counter()
+        with self.phase("sqlite"):
+            yield
+        with self.lock:
+            stats = self.sqlite.setdefault(operation, {"calls": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - started
+
+    def observe_throttle(self, seconds):
+        """Records time spent waiting on the rate limiter before an API call"""
+        if seconds:
+            with self.lock:
+                self.throttle_waits += 1
+            self.add_phase_time("throttle", seconds)
+
+    def observe_api_call(self, environment, endpoint, seconds, status=None, error=False, retry=False):
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                (environment, endpoint),
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "throttled": 0,
+                    "seconds": 0.0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                },
+            )
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["errors"] += bool(error)
+            stats["retries"] += bool(retry)
+            stats["throttled"] += status == 429
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+                    break
+
+    def mean_latency(self, environment):
+        """Mean seconds per API call made against environment in this run, or None before the first call"""
+        with self.lock:
+            calls = sum(
+                stats["calls"] for (env, _), stats in self.endpoints.items() if env == environment
+            )
+            seconds = sum(
+                stats["seconds"] for (env, _), stats in self.endpoints.items() if env == environment
+            )
+        return seconds / calls if calls else None
+
+    def count_records(self, hs_object, action, count):
+        """Counts records of hs_object read, created, updated or archived"""
+        if count:
+            with self.lock:
+                key = (hs_object, action)
+                self.records[key] = self.records.get(key, 0) + count
+
+    @contextlib.contextmanager
+    def method(self, name, run=False):
+        """
+        Times one call of a public method. With run=True, an outermost call starts a new run: the metrics
+        are reset first, and the run's report is written once it finishes
+        """
+        with self.lock:
+            is_run = run and self.active_runs == 0
+            if is_run:
+                self.reset()
+                self.run = {
+                    "method": name,
+                    "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                }
+            self.active_runs += run
+        started = time.perf_counter()
+        error = None
+        try:
+            yield is_run
+        except BaseException as ex:
+            error = ex
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            with self.lock:
+                self.active_runs -= run
+                stats = self.methods.setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0})
+                stats["calls"] += 1
+                stats["errors"] += error is not None
+                stats["seconds"] += seconds
+                if is_run:
+                    self.run["seconds"] = seconds
+                    self.run["error"] = None if error is None else repr(error)
+            if is_run:
+                self.last_report = self.to_dict()
+                if self.report_dir:
+                    self.write_reports(self.report_dir)
+
+    def to_dict(self):
+        """The run report, as a JSON-serializable dict"""
+        with self.lock:
+            run_seconds = (self.run or {}).get("seconds")
+            records = {}
+            for (hs_object, action), count in sorted(self.records.items()):
+                records.setdefault(hs_object, {})[action] = {
+                    "count": count,
+                    "per_second": round(count / run_seconds, 2) if run_seconds else None,
+                }
+            return {
+                "run": dict(self.run or {}),
+                "labels": dict(self.labels),
+                "phases": {
+                    phase: {"count": stats["count"], "seconds": round(stats["seconds"], 3)}
+                    for phase, stats in sorted(self.phases.items())
+                },
+                "methods": {
+                    name: {**stats, "seconds": round(stats["seconds"], 3)}
+                    for name, stats in sorted(self.methods.items())
+                },
+                "api": [
+                    {
+                        "environment": environment,
+                        "endpoint": endpoint,
+                        "calls": stats["calls"],
+                        "errors": stats["errors"],
+                        "retries": stats["retries"],
+                        "throttled": stats["throttled"],
+                        "seconds": round(stats["seconds"], 3),
+                        "latency_buckets": dict(
+                            zip(
+                                [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"],
+                                stats["buckets"] + [stats["calls"] - sum(stats["buckets"])],
+                            )
+                        ),
+                    }
+                    for (environment, endpoint), stats in sorted(self.endpoints.items())
+                ],
+                "throttle_waits": self.throttle_waits,
+                "records": records,
+                "sqlite": {
+                    operation: {**stats, "seconds": round(stats["seconds"], 3)}
+                    for operation, stats in sorted(self.sqlite.items())
+                },
+            }
+
+    def to_dataframe(self):
+        """
+        The calls, errors, retries, 429s and seconds of each endpoint in the run report as a pandas DataFrame,
+        one row per environment and endpoint. Needs the reporting extra: pip install hubspot-prod-to-sandbox[reporting]
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError(
+                "MigrationMetrics.to_dataframe needs pandas, install it with the reporting extra: "
+                "pip install hubspot-prod-to-sandbox[reporting]"
+            ) from None
+
+        return pd.DataFrame(
+            [
+                {k: v for k, v in endpoint.items() if k != "latency_buckets"}
+                for endpoint in self.to_dict()["api"]
+            ],
+            columns=["environment", "endpoint", "calls", "errors", "retries", "throttled", "seconds"],
+        )
+
+    def to_prometheus(self):
+        """The run report in the Prometheus text exposition format, every series labelled with self.labels"""
+        report = self.to_dict()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP hubspot_migrator_{name} {description}")
+            lines.append(f"# TYPE hubspot_migrator_{name} {kind}")
+            for suffix, labels, value in samples:
+                labels = format_prometheus_labels({**self.labels, **labels})
+                lines.append(f"hubspot_migrator_{name}{suffix}{labels} {value}")
+
+        run = report["run"]
+        if run.get("seconds") is not None:
+            metric("run_seconds", "gauge", "Wall time of the run",
+                   [("", {"method": run["method"]}, run["seconds"])])
+            metric("run_failed", "gauge", "1 if the run raised an exception",
+                   [("", {"method": run["method"]}, int(run["error"] is not None))])
+        metric("phase_seconds_total", "counter", "Seconds spent in each phase, summed across threads",
+               [("", {"phase": phase}, stats["seconds"]) for phase, stats in report["phases"].items()])
+        metric("method_calls_total", "counter", "Calls of each public migrator method",
+               [("", {"method": name}, stats["calls"]) for name, stats in report["methods"].items()])
+        metric("method_seconds_total", "counter", "Seconds spent in each public migrator method",
+               [("", {"method": name}, stats["seconds"]) for name, stats in report["methods"].items()])
+        for key, description in [
+            ("errors", "Hubspot API calls that raised an exception"),
+            ("retries", "Hubspot API calls that retried a call answered with a 429"),
+            ("throttled", "Hubspot API calls answered with a 429"),
+        ]:
+            metric(f"api_{key}_total", "counter", description,
+                   [("", {"environment": api["environment"], "endpoint": api["endpoint"]}, api[key])
+                    for api in report["api"]])
+        samples = []
+        for api in report["api"]:
+            labels = {"environment": api["environment"], "endpoint": api["endpoint"]}
+            cumulative = 0
+            for bound, count in api["latency_buckets"].items():
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": bound}, cumulative))
+            samples.append(("_sum", labels, api["seconds"]))
+            samples.append(("_count", labels, api["calls"]))
+        metric("api_request_seconds", "histogram", "Latency of Hubspot API calls", samples)
+        metric("records_total", "counter", "Records read, created, updated or archived",
+               [("", {"object": hs_object, "action": action}, stats["count"])
+                for hs_object, actions in report["records"].items() for action, stats in actions.items()])
+        metric("records_per_second", "gauge", "Records read, created, updated or archived per second of the run",
+               [("", {"object": hs_object, "action": action}, stats["per_second"])
+                for hs_object, actions in report["records"].items() for action, stats in actions.items()
+                if stats["per_second"] is not None])
+        metric("sqlite_seconds_total", "counter", "Seconds spent in each MappingStore operation",
+               [("", {"operation": operation}, stats["seconds"]) for operation, stats in report["sqlite"].items()])
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        write_file_atomically(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path):
+        write_file_atomically(path, self.to_prometheus())
+
+    def write_reports(self, report_dir):
+        """
+        Writes the run report to report_dir as <method>_<sandbox portal>_<time>.json, and as
+        hubspot_migrator_<sandbox portal>.prom, replaced on every run
+        """
+        os.makedirs(report_dir, exist_ok=True)
+        portal = self.labels.get("sandbox_portal", "")
+        timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        json_path = os.path.join(report_dir, f"{self.run['method']}_{portal}_{timestamp}.json")
+        prometheus_path = os.path.join(report_dir, f"hubspot_migrator_{portal}.prom")
+        self.write_json(json_path)
+        self.write_prometheus(prometheus_path)
+        print(f"Metrics written to {json_path} and {prometheus_path}")
+
+
+def write_file_atomically(path, text):
+    """Writes text to a temporary file next to path and moves it into place, so readers never see half a file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def print_elapsed(seconds):
+    m, s = divmod(seconds, 60)
+    st = "elapsed time:"
+    if m:
+        st += " " + f"{m:.0f} min"
+    if s:
+        st += " " + f"{s:.3f} sec"
+    print(st)
+
+
+def report_run(func):
     """
-    timer decorator
+    Decorator for the entry points of a migrator (works on plain functions and coroutines): each outermost call
+    is a run reported through self.metrics, see MigrationMetrics, and prints its elapsed time
     """
 
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            with self.metrics.method(func.__name__, run=True) as is_run:
+                if is_run:
+                    print(f"running {func.__name__}.. ", end="")
+                    sys.stdout.flush()
+                v = await func(self, *args, **kwargs)
+            if is_run:
+                print_elapsed(self.metrics.run["seconds"])
+            return v
+
+        async_wrapper.reports_run = True
+        return async_wrapper
+
     @wraps(func)
-    def wrapper(*args, **kwargs):
-        t0 = time.time()
-        print(f"running {func.__name__}.. ", end="")
-        sys.stdout.flush()
-        v = func(*args, **kwargs)
-        m, s = divmod(time.time() - t0, 60)
-        st = "elapsed time:"
-        if m:
-            st += " " + f"{m:.0f} min"
-        if s:
-            st += " " + f"{s:.3f} sec"
-        print(st)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.method(func.__name__, run=True) as is_run:
+            if is_run:
+                print(f"running {func.__name__}.. ", end="")
+                sys.stdout.flush()
+            v = func(self, *args, **kwargs)
+        if is_run:
+            print_elapsed(self.metrics.run["seconds"])
         return v
 
+    wrapper.reports_run = True
     return wrapper
 
 
-def is_sandbox(api_key):
-    r = requests.get("https://api.hubapi.com/integrations/v1/me?hapikey=" + api_key)
-    try:
-      return r.json()["accountType"] == "SANDBOX"
-    except KeyError as e:
-      print("KeyError with response JSON")
-      print(r.content)
-      raise
-    else:
-      raise
+def report_calls(func):
+    """Decorator timing every call of a migrator method through self.metrics, see MigrationMetrics"""
 
+    if asyncio.iscoroutinefunction(func):
 
-def is_production(api_key):
-    r = requests.get("https://api.hubapi.com/integrations/v1/me?hapikey=" + api_key)
-    try:
-      return r.json()["accountType"] == "STANDARD"
-    except KeyError as e:
-      print("KeyError with response JSON")
-      print(r.content)
-      raise
-    else:
-      raise
-      
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            with self.metrics.method(func.__name__):
+                return await func(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.method(func.__name__):
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def in_phase(phase):
+    """Decorator timing every call of a migrator method as part of phase, see MigrationMetrics.phase"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.phase(phase):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def report_sqlite_time(func):
+    """Decorator timing every call of a MappingStore method as part of the sqlite phase of its metrics, if any"""
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return func(self, *args, **kwargs)
+        with self.metrics.sqlite_operation(func.__name__):
+            return func(self, *args, **kwargs)
+
+    return wrapper
 
 
-def get_portal_id(api_key):
-    r = requests.get("https://api.hubapi.com/integrations/v1/me?hapikey=" + api_key)
-    return r.json()["portalId"]
+def decorate_public_methods(decorator, exclude=()):
+    """
+    Class decorator applying decorator to every public method defined on the class, except the methods named in
+    exclude, generators (whose time is spent by their callers) and methods already decorated with report_run
+    """
+
+    def decorate(cls):
+        for name, attr in list(vars(cls).items()):
+            if (
+                name.startswith("_")
+                or name in exclude
+                or not inspect.isfunction(attr)
+                or inspect.isgeneratorfunction(attr)
+                or getattr(attr, "reports_run", False)
+            ):
+                continue
+            setattr(cls, name, decorator(attr))
+        return cls
+
+    return decorate
+
+
+# Base URL of the Hubspot API, override with the HUBSPOT_API_HOST environment variable (or the host argument of
+# HubspotSandboxMigrator) to point the migrator at another server, such as the mock server in benchmarks/
+HUBSPOT_API_HOST = os.environ.get("HUBSPOT_API_HOST", "https://api.hubapi.com")
+
+# /integrations/v1/me responses by API key and host, fetched once per key for the life of the process
+account_identities = {}
+account_identities_lock = threading.Lock()
+
+
+def request_account_identity(url):
+    r = requests.get(url)
+    r.raise_for_status()
+    return r
+
+
+def get_account_identity(api_key, refresh=False, host=None, call=None):
+    """
+    Account details (accountType, portalId, ...) of the Hubspot instance an API key belongs to
+    call: Function the request is made through as call(api_method, **kwargs), e.g. a partial of
+    HubspotSandboxMigrator.call_api so that it is paced by the rate limiter and retried on 429s
+    """
+    host = host or HUBSPOT_API_HOST
+    call = call or (lambda api_method, **kwargs: api_method(**kwargs))
+    with account_identities_lock:
+        if refresh or (host, api_key) not in account_identities:
+            r = call(
+                request_account_identity,
+                url=host + "/integrations/v1/me?hapikey=" + api_key,
+            )
+            identity = r.json()
+            try:
+                identity["accountType"], identity["portalId"]
+            except KeyError:
+                print("KeyError with response JSON")
+                print(r.content)
+                raise
+            account_identities[(host, api_key)] = identity
+        return account_identities[(host, api_key)]
+
+
+def is_sandbox(api_key, host=None, call=None):
+    return get_account_identity(api_key, host=host, call=call)["accountType"] == "SANDBOX"
+
+
+def is_production(api_key, host=None, call=None):
+    return get_account_identity(api_key, host=host, call=call)["accountType"] == "STANDARD"
+
+
+def get_portal_id(api_key, host=None, call=None):
+    return get_account_identity(api_key, host=host, call=call)["portalId"]
 
 
 def test_object_config(object_config):
@@ -85,1015 +549,4066 @@ def test_object_config(object_config):
     )
 
 
+# Most parameters a statement can bind in SQLite builds before 3.32, which are still shipped with some Pythons
+SQLITE_MAX_VARIABLES = 999
+
+
+def str2bool(v):
+    """argparse type for the boolean flags of the run_*.py scripts, e.g. --fake-data True"""
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
 def chunks(l, n):
     """Yield successive n-sized chunks from l."""
     for i in range(0, len(l), n):
         yield l[i : i + n]
 
 
-class HubspotSandboxMigrator:
-    """Class for migrating data from Hubspot prod to Hubspot sandbox, given API keys for both"""
-
-    def __init__(self, prod_api_key, sandbox_api_key):
-        self.prod_api_key = prod_api_key
-        self.sandbox_api_key = sandbox_api_key
-        self.object_config = object_config
+def iter_in_background(iterable, maxsize=4):
+    """
+    Runs an iterator on a background thread and yields its items through a queue of at most maxsize items,
+    so the producer can only run maxsize items ahead of the consumer. Exceptions are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize)
+    done = object()
+    stopped = threading.Event()
 
-        if not is_sandbox(sandbox_api_key):
-            raise ValueError(
-                f"Sandbox API Key provided is not for a sandbox Hubspot instance!"
-            )
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
 
-        if not is_production(prod_api_key):
-            raise ValueError(
-                f"Prod API Key provided is not for a production Hubspot instance!"
-            )
+    def produce():
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    return
+                put((item, None))
+        except Exception as ex:
+            put((done, ex))
+            return
+        put((done, None))
 
-        if not test_object_config(object_config):
-            raise ValueError(
-                f"Every object in the Object Config must have a list or properties associated with it. Please review the example object_config."
-            )
+    threading.Thread(target=produce, daemon=True).start()
 
-        self.prod_portal_id = get_portal_id(prod_api_key)
-        self.sandbox_portal_id = get_portal_id(sandbox_api_key)
+    try:
+        while True:
+            item, ex = items.get()
+            if ex is not None:
+                raise ex
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
 
-    def __repr__(self):
-        return f"{self.__class__.__name__} for Sandbox Instance {self.sandbox_portal_id} and Prod Instance {self.prod_portal_id}"
 
-    def get_hubspot_client(self, hs_object, environment="sandbox"):
+READ_ONLY_PROPERTIES = ["hs_object_id", "lastmodifieddate", "hs_lastmodifieddate", "createdate"]
 
-        if environment == "sandbox":
-            hs_client = hubspot.Client.create(api_key=self.sandbox_api_key)
-        elif environment in ["prod", "production"]:
-            hs_client = hubspot.Client.create(api_key=self.prod_api_key)
-
-        if hs_object == "companies":
-            hs_object_client = hs_client.crm.companies
-        elif hs_object == "deals":
-            hs_object_client = hs_client.crm.deals
-        elif hs_object == "contacts":
-            hs_object_client = hs_client.crm.contacts
-        elif hs_object == "products":
-            hs_object_client = hs_client.crm.products
-        elif hs_object == "line_items":
-            hs_object_client = hs_client.crm.line_items
-        elif hs_object == "pipelines":
-            hs_object_client = hs_client.crm.pipelines
-
-        return hs_object_client
 
-    def get_record_by_id(self, environment, hs_object, object_id):
-        
-        time.sleep(.4)
+def strip_read_only_properties(properties):
+    """Remove properties that Hubspot sets itself and rejects on create"""
+    for p in READ_ONLY_PROPERTIES:
+        properties.pop(p, None)
+    return properties
 
-        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
 
-        associations = [obj for obj in object_config.keys() if obj != hs_object]
-        properties = object_config[hs_object]["properties"]
+def check_row_width(rows, columns, table):
+    """rows as a list of tuples, each of which must hold one value for each of the columns of table"""
+    rows = [tuple(row) for row in rows]
+    if any(len(row) != len(columns) for row in rows):
+        raise ValueError(
+            f"Rows for insertion into the {table} table must have {len(columns)} values: {columns}"
+        )
+    return rows
 
-        if hs_object == "companies":
-            api_response = hs_object_client.basic_api.get_by_id(
-                company_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "deals":
-            api_response = hs_object_client.basic_api.get_by_id(
-                deal_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "contacts":
-            api_response = hs_object_client.basic_api.get_by_id(
-                contact_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "line_items":
-            api_response = hs_object_client.basic_api.get_by_id(
-                line_item_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "products":
-            api_response = hs_object_client.basic_api.get_by_id(
-                product_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "tickets":
-            api_response = hs_object_client.basic_api.get_by_id(
-                ticket_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        elif hs_object == "quotes":
-            api_response = hs_object_client.basic_api.get_by_id(
-                quote_id=object_id,
-                archived=False,
-                associations=associations,
-                properties=properties,
-            )
-        else:
-            print(
-                f"""No Get Object by ID method incorporated for objects of type {hs_object}.
-    Only the following objects are currently supported: companies, deals, contacts, line_items, products, tickets, quotes
-                    """
-            )
-            return []
 
-        return api_response.to_dict()
+def match_batch_results(object_records, results):
+    """
+    Pair each record created by a batch create with the prod record it came from.
+    Hubspot does not guarantee that batch results come back in input order, so results are
+    matched on the property values that were sent, then on those values trimmed and lowercased
+    for anything Hubspot normalized on the way in. Records sent with the same values are interchangeable,
+    as are the sandbox records made from them. A result that still has no match is paired in input order
+    with the prod records left, which can be wrong: those results are flagged with matched_by_order
+    and a warning is printed, unless only one result and one prod record are left.
+    Returns the results with a prod_id key added.
+    """
+    property_names = sorted({k for rec in object_records for k in rec["properties"]})
 
-    def delete_record_by_id(self, hs_object, object_id):
-        """Only available for sandbox"""
-        time.sleep(.4)
+    def fingerprint(properties):
+        return tuple(
+            "" if properties.get(k) is None else str(properties.get(k))
+            for k in property_names
+        )
 
-        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+    def normalized_fingerprint(properties):
+        return tuple(value.strip().lower() for value in fingerprint(properties))
+
+    leftovers = list(results)
+    matched = []
+    unmatched_records = list(object_records)
+    for key in [fingerprint, normalized_fingerprint]:
+        unmatched_prod_ids = {}
+        for rec in unmatched_records:
+            unmatched_prod_ids.setdefault(key(rec["properties"]), []).append(rec["id"])
+
+        results_left = []
+        for result in leftovers:
+            prod_ids = unmatched_prod_ids.get(key(result.get("properties") or {}))
+            if prod_ids:
+                result["prod_id"] = prod_ids.pop(0)
+                matched.append(result)
+            else:
+                results_left.append(result)
+        leftovers = results_left
+
+        still_unmatched = {i for ids in unmatched_prod_ids.values() for i in ids}
+        unmatched_records = [
+            rec for rec in unmatched_records if rec["id"] in still_unmatched
+        ]
+
+    if leftovers and not (len(leftovers) == 1 and len(unmatched_records) == 1):
+        print(
+            f"Warning: {len(leftovers)} batch create results did not match the properties sent, "
+            "pairing them with their prod records in input order"
+        )
+        for result in leftovers:
+            result["matched_by_order"] = True
+    for result, rec in zip(leftovers, unmatched_records):
+        result["prod_id"] = rec["id"]
+        matched.append(result)
 
-        if hs_object == "companies":
-            api_response = hs_object_client.basic_api.archive(company_id=object_id)
-        elif hs_object == "deals":
-            api_response = hs_object_client.basic_api.archive(deal_id=object_id)
-        elif hs_object == "contacts":
-            api_response = hs_object_client.basic_api.archive(contact_id=object_id)
-        elif hs_object == "line_items":
-            api_response = hs_object_client.basic_api.archive(line_item_id=object_id)
-        elif hs_object == "products":
-            api_response = hs_object_client.basic_api.archive(product_id=object_id)
-        elif hs_object == "tickets":
-            api_response = hs_object_client.basic_api.archive(ticket_id=object_id)
-        elif hs_object == "quotes":
-            api_response = hs_object_client.basic_api.archive(quote_id=object_id)
+    return matched
 
-        else:
-            print(
-                f"""No Delete Object by ID method incorporated for objects of type {hs_object}.
-    Only the following objects are currently supported: companies, deals, contacts, line_items, products, tickets, quotes
-                    """
-            )
-            return []
 
-        return True
+HUBSPOT_API_LIMITS = {
+    "free": {"burst_limit": 100, "burst_interval": 10, "daily_limit": 250000},
+    "starter": {"burst_limit": 100, "burst_interval": 10, "daily_limit": 250000},
+    "professional": {"burst_limit": 150, "burst_interval": 10, "daily_limit": 500000},
+    "enterprise": {"burst_limit": 150, "burst_interval": 10, "daily_limit": 500000},
+    "api_add_on": {"burst_limit": 200, "burst_interval": 10, "daily_limit": 1000000},
+}
 
-    def get_object_records(
-        self, hs_object, limit, properties, associations=[], environment="prod"
-    ):
+# The CRM search endpoints have a limit of their own per API key on top of the tier's limits, whatever the tier
+HUBSPOT_SEARCH_LIMITS = {"burst_limit": 4, "burst_interval": 1, "daily_limit": math.inf}
 
-        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
 
-        if limit > 100:
-            page_limit = 100
-        else:
-            page_limit = limit
+class RateLimiter:
+    """
+    Token bucket for every call made with one API key against one portal.
+    Starts from the burst and daily limits of the Hubspot tier, follows the X-HubSpot-RateLimit-* headers
+    on each response, halves its rate on a 429 and climbs back towards the burst limit as calls succeed.
+    follow_headers: Set to False for buckets such as the search one, whose limits the headers do not describe
+    """
 
-        all_records = []
-        i = 0
-        pages = True
+    def __init__(self, burst_limit=100, burst_interval=10, daily_limit=250000, follow_headers=True):
+        self.follow_headers = follow_headers
+        self.burst_limit = burst_limit
+        self.burst_interval = burst_interval
+        self.max_rate = burst_limit / burst_interval
+        self.rate = self.max_rate
+        self.tokens = float(burst_limit)
+        self.daily_limit = daily_limit
+        self.daily_remaining = daily_limit
+        self.day = time.strftime("%Y-%m-%d")
+        self.paused_until = 0.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
 
-        while pages:
-            if i == 0:
-                api_response = hs_object_client.basic_api.get_page(
-                    limit=page_limit,
-                    archived=False,
-                    properties=properties,
-                    associations=associations,
+    def __repr__(self):
+        return f"{self.__class__.__name__} at {self.rate:.1f}/sec of {self.max_rate:.1f}/sec, {self.daily_remaining} calls left today"
+
+    def reserve(self):
+        """Take a token, returning the number of seconds to wait before using it"""
+        with self.lock:
+            today = time.strftime("%Y-%m-%d")
+            if today != self.day:
+                self.day = today
+                self.daily_remaining = self.daily_limit
+            if self.daily_remaining <= 0:
+                raise RuntimeError(
+                    f"Daily Hubspot API limit of {self.daily_limit} calls has been reached"
                 )
-                if api_response.to_dict()["results"]:
-                    all_records.extend(api_response.to_dict()["results"])
-                    i += 1
-                else:
-                    pages = False
+            self.daily_remaining -= 1
 
-                if len(all_records) >= limit:
-                    pages = False
-            else:
-                time.sleep(0.5)
-                try:
-                    api_response = prod_client.crm.companies.basic_api.get_page(
-                        limit=page_limit,
-                        archived=False,
-                        properties=properties,
-                        associations=associations,
-                        after=api_response.paging.next.after,
-                    )
-                    if api_response.to_dict()["results"]:
-                        all_records.extend(api_response.to_dict()["results"])
-                        i += 1
-                    else:
-                        pages = False
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst_limit, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+
+            return max(self.paused_until - now, -self.tokens / self.rate, 0)
+
+    def wait(self):
+        """Take a token, sleeping until it can be used. Returns the number of seconds slept"""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def _apply_headers(self, headers):
+        if not self.follow_headers:
+            return
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        try:
+            if "x-hubspot-ratelimit-max" in headers:
+                self.burst_limit = int(headers["x-hubspot-ratelimit-max"])
+            if "x-hubspot-ratelimit-interval-milliseconds" in headers:
+                self.burst_interval = (
+                    int(headers["x-hubspot-ratelimit-interval-milliseconds"]) / 1000
+                )
+            self.max_rate = self.burst_limit / self.burst_interval
+            if "x-hubspot-ratelimit-remaining" in headers:
+                self.tokens = min(
+                    self.tokens, float(headers["x-hubspot-ratelimit-remaining"])
+                )
+            if "x-hubspot-ratelimit-daily" in headers:
+                self.daily_limit = int(headers["x-hubspot-ratelimit-daily"])
+            if "x-hubspot-ratelimit-daily-remaining" in headers:
+                self.daily_remaining = int(headers["x-hubspot-ratelimit-daily-remaining"])
+        except ValueError:
+            pass
 
-                    if len(all_records) >= limit:
-                        pages = False
-                except:
-                    pages = False
-            if i % 10 == 0:
-                print(i * 100, "objects downloaded")
+    def succeeded(self, headers=None):
+        with self.lock:
+            self._apply_headers(headers)
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def throttled(self, headers=None):
+        """Back off after a 429"""
+        with self.lock:
+            self._apply_headers(headers)
+            self.rate = max(self.rate / 2, self.max_rate / 20)
+            self.tokens = min(self.tokens, 0.0)
+            retry_after = {k.lower(): v for k, v in (headers or {}).items()}.get(
+                "retry-after"
+            )
+            try:
+                pause = float(retry_after)
+            except (TypeError, ValueError):
+                pause = self.burst_interval / 10
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
 
-        return all_records[:limit]
 
-    def batch_create_records(self, list_of_object_properties):
-        """Only available for sandbox"""
+# Every API key belongs to a single portal, so the limiters are shared by API key
+rate_limiters = {}
+search_rate_limiters = {}
+rate_limiters_lock = threading.Lock()
 
-        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
 
-        results = []
+def get_rate_limiter(api_key, **limits):
+    """Return the RateLimiter shared by every migrator using this API key"""
+    with rate_limiters_lock:
+        if api_key not in rate_limiters:
+            rate_limiters[api_key] = RateLimiter(**limits)
+        return rate_limiters[api_key]
 
-        record_chunk_list = chunks(list_of_object_properties, 10)
 
-        for chunk in record_chunk_list:
-            time.sleep(.4)
-            batch_input_simple_public_object_input = BatchInputSimplePublicObjectInput(
-                inputs=chunk
+def get_search_rate_limiter(api_key):
+    """Return the RateLimiter for the CRM search calls of every migrator using this API key"""
+    with rate_limiters_lock:
+        if api_key not in search_rate_limiters:
+            search_rate_limiters[api_key] = RateLimiter(
+                follow_headers=False, **HUBSPOT_SEARCH_LIMITS
             )
-            try:
-                api_response = hs_object_client.batch_api.create(
-                    batch_input_simple_public_object_input=batch_input_simple_public_object_input
-                )
-                #             pprint(api_response)
-                results.extend(api_response.to_dict()["results"])
-            except ApiException as e:
-                print("Exception when calling batch_api->create: %s\n" % e)
-
-        return results
+        return search_rate_limiters[api_key]
 
-    def create_sandbox_record_from_prod_record(self, hs_object, properties, prod_id):
-        
-        time.sleep(.4)
-        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
-        portal_id = self.sandbox_portal_id
 
-        simple_public_object_input = SimplePublicObjectInput(properties=properties)
+def is_search_endpoint(endpoint):
+    return endpoint.endswith("search_api.do_search")
 
-        if "hs_object_id" in properties:
-            properties.pop("hs_object_id")
-        if "lastmodifieddate" in properties:
-            properties.pop("lastmodifieddate")
-        if "hs_lastmodifieddate" in properties:
-            properties.pop("hs_lastmodifieddate")
-        if "createdate" in properties:
-            properties.pop("createdate")
 
-        try:
-            api_response = hs_object_client.basic_api.create(
-                simple_public_object_input=simple_public_object_input
-            )
-            result = api_response.to_dict()
+def get_error_status(ex):
+    """HTTP status of an exception raised by a hubspot API method or by requests"""
+    status = getattr(ex, "status", None)
+    if status is None:
+        status = getattr(getattr(ex, "response", None), "status_code", None)
+    return status
 
-            sandbox_id = result["id"]
 
-            result["prod_id"] = prod_id
+def get_error_headers(ex):
+    headers = getattr(ex, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(ex, "response", None), "headers", None)
+    return headers
 
-            conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-            try:
-                cur = conn.cursor()
-                cur.execute(
-                    f"INSERT INTO object_mappings_{portal_id} VALUES ({sandbox_id}, {prod_id}, '{hs_object}')"
-                )
-                conn.commit()
-                conn.close()
-            except:
-                conn.close()
-                raise
 
-        except Exception as ex:
-            print(ex)
-            print(f"Skipping the creation of {hs_object} with Prod ID {prod_id}")
-            result = {}
-            pass
+def call_with_headers(api_method, **kwargs):
+    """
+    Calls api_method, returning (its response, the headers of that response). Bound hubspot API methods are called
+    through their *_with_http_info variant, which returns the headers along with the response, as the last_response
+    of their api_client is shared with every other thread using the client. Other functions give no headers.
+    """
+    with_http_info = getattr(
+        getattr(api_method, "__self__", None),
+        f"{getattr(api_method, '__name__', '')}_with_http_info",
+        None,
+    )
+    if with_http_info is None:
+        return api_method(**kwargs), {}
+    api_response, _, headers = with_http_info(_return_http_data_only=False, **kwargs)
+    return api_response, headers
 
-        return result
 
-    def get_associated_records(self, hs_object, properties):
+# Singular names Hubspot uses for each CRM object in association type strings such as "line_item_to_deal"
+HUBSPOT_OBJECT_SINGULARS = {
+    "companies": "company",
+    "contacts": "contact",
+    "deals": "deal",
+    "line_items": "line_item",
+    "products": "product",
+    "quotes": "quote",
+    "tickets": "ticket",
+}
 
-        environment = "prod"
 
-        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
-        portal_id = self.sandbox_portal_id
+def build_association_type_index(object_singulars=HUBSPOT_OBJECT_SINGULARS):
+    """
+    {hs_association_string: (from_object, to_object, reverse_hs_association_string)} for every pair of objects,
+    in both the primary ("contact_to_company") and unlabeled ("contact_to_company_unlabeled") forms
+    """
+    index = {}
+    for from_object, from_singular in object_singulars.items():
+        for to_object, to_singular in object_singulars.items():
+            for suffix in ["", "_unlabeled"]:
+                index[f"{from_singular}_to_{to_singular}{suffix}"] = (
+                    from_object,
+                    to_object,
+                    f"{to_singular}_to_{from_singular}{suffix}",
+                )
+    return index
 
-        object_results = []
 
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        ids_to_get_df = pd.read_sql_query(
-            f"""SELECT DISTINCT 
-                                                prod_to_id as id
-                                            FROM prod_associations_{portal_id} 
-                                            WHERE to_object = '{hs_object}'
-                                            """,
-            conn,
-        )
+ASSOCIATION_TYPES = build_association_type_index()
 
-        if ids_to_get_df.empty == False:
-            for oid in ids_to_get_df["id"].tolist():
-                result = self.get_record_by_id(environment, hs_object, oid)
-                object_results.append(result)
-        else:
 
-            ids_to_get_df = pd.read_sql_query(
-                f"""SELECT DISTINCT 
-                                                prod_to_id as id
-                                            FROM prod_associations_{portal_id} 
-                                            WHERE to_object = '{' '.join(hs_object.split('_'))}'
-                                            """,
-                conn,
-            )
-            if ids_to_get_df.empty == False:
-                object_results = []
+def iter_associated_record_keys(hs_object, records):
+    """(hs_object, prod_id) of every record the associations of records of hs_object point to"""
+    for rec in records:
+        for association_key, association_results in (rec.get("associations") or {}).items():
+            for result in association_results.get("results") or []:
+                _, to_object, _ = ASSOCIATION_TYPES.get(
+                    result["type"], (hs_object, association_key.replace(" ", "_"), None)
+                )
+                yield to_object, result["id"]
 
-                for oid in ids_to_get_df["id"].tolist():
-                    result = get_record_by_id(environment, hs_object, oid)
-                    object_results.append(result)
 
-            else:
-                print(f"No records of type {hs_object} found")
-                object_results = []
+# Associations away from the anchor records a walk goes by default, see start_association_walk
+DEFAULT_WALK_DEPTH = 2
 
-        return object_results
 
-    def setup_sqlite(self):
-        portal_id = self.sandbox_portal_id
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
-        cur.execute(
-            f"""CREATE TABLE IF NOT EXISTS object_mappings_{portal_id}
-                    (sandbox_id BIGINT PRIMARY KEY NOT NULL, 
-                     prod_id BIGINT, 
-                     hs_object VARCHAR(256)
-                     )"""
-        )
-
-        cur.execute(
-            f"""CREATE TABLE IF NOT EXISTS prod_associations_{portal_id}
-                    (prod_from_id BIGINT, 
-                     prod_to_id BIGINT,
-                     from_object VARCHAR(256),
-                     to_object VARCHAR(256),
-                     hs_association_string VARCHAR(256)
-                     )"""
-        )
-
-        cur.execute(
-            f"""CREATE TABLE IF NOT EXISTS sandbox_associations_{portal_id}
-                    (sandbox_from_id BIGINT, 
-                     sandbox_to_id BIGINT,
-                     from_object VARCHAR(256),
-                     to_object VARCHAR(256),
-                     hs_association_string VARCHAR(256)
-                     )"""
-        )
-
-        conn.commit()
-        conn.close()
+class AssociationGraphWalk:
+    """
+    Breadth-first walk of the association graph of prod records, out from the records of an anchor object to the
+    records associated with them, at most max_depth associations away and max_records associated records in all.
+    Every (hs_object, prod_id) reached is kept in a visited set, so a record reached along several paths, or from
+    several object types, is queued and fetched once. Records to fetch come out one depth at a time, in a batch
+    per object type, see iter_frontiers.
+    """
 
-    def clear_sqlite(self):
-        portal_id = self.sandbox_portal_id
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
+    def __init__(self, hs_objects, max_depth=DEFAULT_WALK_DEPTH, max_records=None):
+        """
+        hs_objects: Object types the walk goes into, in the order their records are fetched at each depth
+        max_depth: Number of associations away from the anchor records the walk goes, None for no limit
+        max_records: Number of associated records the walk queues before it stops, None for no limit
+        """
+        self.hs_objects = list(hs_objects)
+        self.max_depth = max_depth
+        self.max_records = max_records
+        self.visited = set()
+        self.frontiers = {}
+        self.records_queued = 0
+        self.lock = threading.Lock()
 
-        cur.execute(f"DROP TABLE IF EXISTS object_mappings_{portal_id}")
-        cur.execute(f"DROP TABLE IF EXISTS prod_associations_{portal_id}")
-        cur.execute(f"DROP TABLE IF EXISTS sandbox_associations_{portal_id}")
+    def __repr__(self):
+        return f"{self.__class__.__name__} that has reached {len(self.visited)} records, {self.records_queued} of them associated"
 
-        conn.commit()
-        conn.close()
-        self.setup_sqlite()
+    def visit(self, hs_object, prod_ids):
+        """Marks records as reached without queuing them, e.g. the anchor records"""
+        with self.lock:
+            self.visited.update((hs_object, str(prod_id)) for prod_id in prod_ids)
 
-    def insert_mappings(self, df):
+    def add_neighbours(self, neighbours, depth):
         """
-        df must have three columns:
-        sandbox_id: id of the object in sandbox
-        prod_id: id of the corresponding object in prod
-        hs_object: string of the object type that was created
+        Queues for depth + 1 the records in neighbours, (hs_object, prod_id) pairs associated with records
+        reached at depth, that are of an object type the walk goes into and have not been reached yet
         """
-        portal_id = self.sandbox_portal_id
-
-        try:
-            assert list(df.columns) == ["sandbox_id", "prod_id", "hs_object"]
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+        with self.lock:
+            for hs_object, prod_id in neighbours:
+                key = ("_".join(hs_object.split(" ")), str(prod_id))
+                if key[0] not in self.hs_objects or key in self.visited:
+                    continue
+                if self.max_records is not None and self.records_queued >= self.max_records:
+                    print(f"Reached the budget of {self.max_records} associated records, leaving the rest out")
+                    self.max_depth = depth
+                    return
+                self.visited.add(key)
+                self.frontiers.setdefault(depth + 1, {}).setdefault(key[0], []).append(key[1])
+                self.records_queued += 1
+
+    def add_records(self, hs_object, records, depth):
+        """Marks records of hs_object as reached at depth and queues the records their associations point to"""
+        self.visit(hs_object, [rec["id"] for rec in records])
+        self.add_neighbours(iter_associated_record_keys(hs_object, records), depth)
+
+    def iter_pages(self, hs_object, pages, depth):
+        """Passes pages of records of hs_object reached at depth through add_records"""
+        for records in pages:
+            self.add_records(hs_object, records, depth)
+            yield records
+
+    def iter_frontiers(self):
+        """
+        Generator over (depth, hs_object, prod IDs) of the records queued, depth by depth and within a depth in
+        the order of hs_objects. Consume it as the walk goes: fetching the records of one depth queues the next.
+        """
+        depth = 1
+        while True:
+            with self.lock:
+                frontier = self.frontiers.pop(depth, None)
+            if not frontier:
+                return
+            for hs_object in self.hs_objects:
+                if frontier.get(hs_object):
+                    yield depth, hs_object, frontier[hs_object]
+            depth += 1
+
+
+@decorate_public_methods(report_sqlite_time)
+class MappingStore:
+    """
+    SQLite store for the object mappings and associations of one sandbox portal,
+    along with the checkpoints and per-record status that let an interrupted migration resume
+    the fake data generated for each prod record, and the last-modified watermarks of sync_object.
+    The property schemas of each portal are cached in a table shared by every store in the file, keyed by portal ID.
+    Holds one connection in WAL mode for the lifetime of the migrator, shared across threads behind a lock.
+    Writes go through executemany, one transaction per batch.
+    Every public method is timed as part of the sqlite phase of metrics, when given a MigrationMetrics.
+    """
+
+    def __init__(self, portal_id, path="hubspot_migration_mappings.sqlite", metrics=None):
+        self.portal_id = portal_id
+        self.path = path
+        self.metrics = metrics
+        self.object_mappings = f"object_mappings_{portal_id}"
+        self.prod_associations = f"prod_associations_{portal_id}"
+        self.sandbox_associations = f"sandbox_associations_{portal_id}"
+        self.migration_checkpoints = f"migration_checkpoints_{portal_id}"
+        self.record_status = f"record_status_{portal_id}"
+        self.fake_data = f"fake_data_{portal_id}"
+        self.sync_watermarks = f"sync_watermarks_{portal_id}"
+        self.sync_watermark_records = f"sync_watermark_records_{portal_id}"
+        self.property_schemas = "property_schemas"
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.setup()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} for Sandbox Instance {self.portal_id} at {self.path}"
+
+    def setup(self):
+        with self.lock, self.conn:
+            if any(
+                name == "sandbox_id" and pk
+                for _, name, _, _, _, pk in self.conn.execute(
+                    f"PRAGMA table_info({self.object_mappings})"
+                ).fetchall()
+            ):
+                # files written when mappings were keyed by sandbox_id, which kept one of the prod products
+                # sharing a sandbox product, are rebuilt with the mappings keyed by prod record
+                self.conn.execute(
+                    f"ALTER TABLE {self.object_mappings} RENAME TO {self.object_mappings}_by_sandbox_id"
+                )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.object_mappings}
+                        (sandbox_id BIGINT NOT NULL,
+                         prod_id BIGINT NOT NULL,
+                         hs_object VARCHAR(256) NOT NULL,
+                         PRIMARY KEY (hs_object, prod_id)
+                         )"""
+            )
+            if self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (f"{self.object_mappings}_by_sandbox_id",),
+            ).fetchall():
+                self.conn.execute(
+                    f"""INSERT OR REPLACE INTO {self.object_mappings}
+                        SELECT sandbox_id, prod_id, hs_object FROM {self.object_mappings}_by_sandbox_id
+                        WHERE prod_id IS NOT NULL AND hs_object IS NOT NULL"""
+                )
+                self.conn.execute(f"DROP TABLE {self.object_mappings}_by_sandbox_id")
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.prod_associations}
+                        (prod_from_id BIGINT, 
+                         prod_to_id BIGINT,
+                         from_object VARCHAR(256),
+                         to_object VARCHAR(256),
+                         hs_association_string VARCHAR(256)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.sandbox_associations}
+                        (sandbox_from_id BIGINT, 
+                         sandbox_to_id BIGINT,
+                         from_object VARCHAR(256),
+                         to_object VARCHAR(256),
+                         hs_association_string VARCHAR(256)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.migration_checkpoints}
+                        (hs_object VARCHAR(256) NOT NULL,
+                         phase VARCHAR(256) NOT NULL,
+                         after VARCHAR(256),
+                         records_done BIGINT,
+                         completed BOOLEAN,
+                         updated_at REAL,
+                         PRIMARY KEY (hs_object, phase)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.record_status}
+                        (hs_object VARCHAR(256) NOT NULL,
+                         prod_id BIGINT NOT NULL,
+                         status VARCHAR(32),
+                         PRIMARY KEY (hs_object, prod_id)
+                         )"""
+            )
+            if not any(
+                name == "seed"
+                for _, name, *_ in self.conn.execute(f"PRAGMA table_info({self.fake_data})").fetchall()
+            ):
+                # values stored before the seed was part of the key cannot be told apart by seed, so they are
+                # dropped and generated again, to the same values for the seed they were generated with
+                self.conn.execute(f"DROP TABLE IF EXISTS {self.fake_data}")
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.fake_data}
+                        (seed BIGINT NOT NULL,
+                         hs_object VARCHAR(256) NOT NULL,
+                         prod_id BIGINT NOT NULL,
+                         property VARCHAR(256) NOT NULL,
+                         value TEXT,
+                         PRIMARY KEY (seed, hs_object, prod_id, property)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.sync_watermarks}
+                        (hs_object VARCHAR(256) PRIMARY KEY NOT NULL,
+                         watermark BIGINT,
+                         updated_at REAL
+                         )"""
+            )
+            # prod records last modified at the watermark that have already been synced
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.sync_watermark_records}
+                        (hs_object VARCHAR(256) NOT NULL,
+                         prod_id BIGINT NOT NULL,
+                         PRIMARY KEY (hs_object, prod_id)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.property_schemas}
+                        (portal_id BIGINT NOT NULL,
+                         hs_object VARCHAR(256) NOT NULL,
+                         properties TEXT,
+                         fetched_at REAL,
+                         PRIMARY KEY (portal_id, hs_object)
+                         )"""
+            )
+            self.conn.execute(
+                f"""CREATE INDEX IF NOT EXISTS ix_{self.object_mappings}_sandbox_id
+                        ON {self.object_mappings} (sandbox_id)"""
+            )
+            self.conn.execute(
+                f"""CREATE INDEX IF NOT EXISTS ix_{self.prod_associations}_type
+                        ON {self.prod_associations} (hs_association_string, prod_from_id, prod_to_id)"""
+            )
+            self.conn.execute(
+                f"""CREATE INDEX IF NOT EXISTS ix_{self.prod_associations}_to_object
+                        ON {self.prod_associations} (to_object, prod_to_id)"""
+            )
+            self.conn.execute(
+                f"""CREATE INDEX IF NOT EXISTS ix_{self.prod_associations}_edge
+                        ON {self.prod_associations} (prod_from_id, prod_to_id)"""
+            )
+            self.conn.execute(
+                f"""CREATE INDEX IF NOT EXISTS ix_{self.sandbox_associations}_type
+                        ON {self.sandbox_associations} (hs_association_string)"""
+            )
+            if not self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                (f"ux_{self.sandbox_associations}_edge",),
+            ).fetchall():
+                # files written before the constraint existed can hold the same association more than once
+                self.conn.execute(
+                    f"""DELETE FROM {self.sandbox_associations} WHERE rowid NOT IN (
+                            SELECT MIN(rowid) FROM {self.sandbox_associations}
+                            GROUP BY sandbox_from_id, sandbox_to_id, hs_association_string
+                        )"""
+                )
+                self.conn.execute(
+                    f"""CREATE UNIQUE INDEX ux_{self.sandbox_associations}_edge
+                            ON {self.sandbox_associations} (sandbox_from_id, sandbox_to_id, hs_association_string)"""
+                )
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.object_mappings}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.prod_associations}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.sandbox_associations}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.migration_checkpoints}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.record_status}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.fake_data}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.sync_watermarks}")
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.sync_watermark_records}")
+        self.setup()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    def insert_mappings(self, rows):
+        """
+        rows of (sandbox_id, prod_id, hs_object), each prod record is marked as created in the same transaction.
+        Mappings are keyed by prod record, as several prod products can share one sandbox product.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.object_mappings} VALUES (?, ?, ?)", rows
+            )
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.record_status} VALUES (?, ?, 'created')",
+                [(hs_object, prod_id) for _, prod_id, hs_object in rows],
+            )
+
+    def _insert_prod_associations(self, rows):
+        """
+        Inserts association rows that are not stored yet, either as is or as their reverse
+        (a company_to_contact row for a stored contact_to_company one), since Hubspot creates both directions at once.
+        Must be called inside a transaction.
+        """
+        self.conn.executemany(
+            f"""INSERT INTO {self.prod_associations}
+                SELECT ?1, ?2, ?3, ?4, ?5
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {self.prod_associations}
+                    WHERE prod_from_id = ?1 AND prod_to_id = ?2
+                      AND from_object = ?3 AND to_object = ?4 AND hs_association_string = ?5
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM {self.prod_associations}
+                    WHERE prod_from_id = ?2 AND prod_to_id = ?1
+                      AND from_object = ?4 AND to_object = ?3 AND hs_association_string = ?6
+                )""",
+            [
+                (*row, ASSOCIATION_TYPES.get(row[4], (None, None, None))[2])
+                for row in rows
+            ],
+        )
+
+    def insert_prod_associations(self, rows):
+        """rows of (prod_from_id, prod_to_id, from_object, to_object, hs_association_string)"""
+        with self.lock, self.conn:
+            self._insert_prod_associations(rows)
+
+    def insert_sandbox_associations(self, rows):
+        """rows of (sandbox_from_id, sandbox_to_id, from_object, to_object, hs_association_string), those already stored are skipped"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO {self.sandbox_associations} VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def complete_records(self, hs_object, prod_ids, association_rows):
+        """
+        Stores the prod associations (rows as in insert_prod_associations) of records that have been created
+        in sandbox and marks the records as associated, in one transaction
+        """
+        with self.lock, self.conn:
+            self._insert_prod_associations(association_rows)
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.record_status} VALUES (?, ?, 'associated')",
+                [(hs_object, prod_id) for prod_id in prod_ids],
+            )
+
+    def get_record_ids(self, hs_object, statuses, prod_ids=None):
+        """Prod IDs (as strings) of hs_object records whose status is one of statuses, optionally only among prod_ids"""
+        sql = f"""SELECT prod_id FROM {self.record_status}
+                  WHERE hs_object = ? AND status IN ({','.join('?' * len(statuses))})"""
+        parameters = (hs_object, *statuses)
+        if prod_ids is not None:
+            if not prod_ids:
+                return []
+            sql += f" AND prod_id IN ({','.join('?' * len(prod_ids))})"
+            parameters += tuple(prod_ids)
+        return [str(row[0]) for row in self.query(sql, parameters)]
+
+    def get_checkpoint(self, hs_object, phase):
+        """(after, records_done, completed) saved for a phase of the migration of hs_object, or None"""
+        rows = self.query(
+            f"""SELECT after, records_done, completed FROM {self.migration_checkpoints}
+                WHERE hs_object = ? AND phase = ?""",
+            (hs_object, phase),
+        )
+        if not rows:
+            return None
+        after, records_done, completed = rows[0]
+        return after, records_done or 0, bool(completed)
+
+    def save_checkpoint(
+        self, hs_object, phase, after=None, records_done=0, completed=False, prod_ids=()
+    ):
+        """
+        Saves the paging cursor and progress of a phase of the migration of hs_object.
+        prod_ids are marked as fetched in the same transaction, so a page is never checkpointed
+        without its records.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.record_status} VALUES (?, ?, 'fetched')",
+                [(hs_object, prod_id) for prod_id in prod_ids],
+            )
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.migration_checkpoints} VALUES (?, ?, ?, ?, ?, ?)",
+                (hs_object, phase, after, records_done, completed, time.time()),
+            )
+
+    def get_fake_values(self, hs_object, prod_ids, seed=0):
+        """
+        {(prod_id, property): value} of the fake data stored for prod records of hs_object, prod_id as a string,
+        as generated with seed
+        """
+        if not prod_ids:
+            return {}
+        return {
+            (str(prod_id), property): value
+            for prod_id, property, value in self.query(
+                f"""SELECT prod_id, property, value FROM {self.fake_data}
+                    WHERE seed = ? AND hs_object = ? AND prod_id IN ({','.join('?' * len(prod_ids))})""",
+                (seed, hs_object, *prod_ids),
+            )
+        }
+
+    def insert_fake_values(self, rows):
+        """rows of (seed, hs_object, prod_id, property, value)"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.fake_data} VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def get_watermark(self, hs_object):
+        """Last-modified date, in epoch milliseconds, up to which hs_object has been synced, or None"""
+        rows = self.query(
+            f"SELECT watermark FROM {self.sync_watermarks} WHERE hs_object = ?",
+            (hs_object,),
+        )
+        return rows[0][0] if rows else None
+
+    def get_watermark_ids(self, hs_object):
+        """Prod IDs, as strings, of the records of hs_object last modified at the watermark that have already been synced"""
+        return {
+            str(prod_id)
+            for prod_id, in self.query(
+                f"SELECT prod_id FROM {self.sync_watermark_records} WHERE hs_object = ?",
+                (hs_object,),
+            )
+        }
+
+    def save_watermark(self, hs_object, watermark, replace=True, prod_ids=()):
+        """
+        prod_ids: The records of hs_object last modified at watermark that have been synced, see get_watermark_ids.
+        With replace=False, an existing watermark for hs_object is kept, along with its records
+        """
+        with self.lock, self.conn:
+            saved = self.conn.execute(
+                f"""INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO {self.sync_watermarks}
+                    VALUES (?, ?, ?)""",
+                (hs_object, watermark, time.time()),
+            ).rowcount
+            if not saved:
+                return
+            self.conn.execute(
+                f"DELETE FROM {self.sync_watermark_records} WHERE hs_object = ?",
+                (hs_object,),
+            )
+            self.conn.executemany(
+                f"INSERT INTO {self.sync_watermark_records} VALUES (?, ?)",
+                [(hs_object, int(prod_id)) for prod_id in prod_ids],
+            )
+
+    def get_property_schema(self, portal_id, hs_object, max_age=None):
+        """{property name: writable} cached for hs_object in portal_id, or None if it is not cached or older than max_age seconds"""
+        rows = self.query(
+            f"""SELECT properties, fetched_at FROM {self.property_schemas}
+                WHERE portal_id = ? AND hs_object = ?""",
+            (portal_id, hs_object),
+        )
+        if not rows or (max_age is not None and time.time() - rows[0][1] > max_age):
+            return None
+        return json.loads(rows[0][0])
+
+    def save_property_schema(self, portal_id, hs_object, schema):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.property_schemas} VALUES (?, ?, ?, ?)",
+                (portal_id, hs_object, json.dumps(schema), time.time()),
+            )
+
+    def delete_property_schemas(self, portal_id, hs_object=None):
+        """Every cached schema of portal_id, or only the one of hs_object"""
+        with self.lock, self.conn:
+            if hs_object is None:
+                self.conn.execute(
+                    f"DELETE FROM {self.property_schemas} WHERE portal_id = ?",
+                    (portal_id,),
+                )
+            else:
+                self.conn.execute(
+                    f"DELETE FROM {self.property_schemas} WHERE portal_id = ? AND hs_object = ?",
+                    (portal_id, hs_object),
+                )
+
+    def reset_checkpoints(self, hs_object):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"DELETE FROM {self.migration_checkpoints} WHERE hs_object = ?",
+                (hs_object,),
+            )
+
+    def delete_mappings(self, sandbox_ids):
+        """One DELETE statement per 500 sandbox IDs, in a single transaction"""
+        with self.lock, self.conn:
+            for chunk in chunks(list(sandbox_ids), 500):
+                self.conn.execute(
+                    f"""DELETE FROM {self.object_mappings}
+                        WHERE sandbox_id IN ({','.join('?' * len(chunk))})""",
+                    [int(sandbox_id) for sandbox_id in chunk],
+                )
+
+    def get_mappings(self, include_products=True):
+        """(sandbox_id, prod_id, hs_object) rows"""
+        if include_products:
+            return self.query(f"SELECT * FROM {self.object_mappings}")
+        return self.query(
+            f"SELECT * FROM {self.object_mappings} WHERE hs_object != 'products'"
+        )
+
+    def get_sandbox_ids(self, hs_object, prod_ids):
+        """{prod_id: sandbox_id} as strings for the prod records of hs_object among prod_ids that have a mapping"""
+        if not prod_ids:
+            return {}
+        return {
+            str(prod_id): str(sandbox_id)
+            for sandbox_id, prod_id in self.query(
+                f"""SELECT sandbox_id, prod_id FROM {self.object_mappings}
+                    WHERE hs_object = ? AND prod_id IN ({','.join('?' * len(prod_ids))})""",
+                (hs_object, *prod_ids),
+            )
+        }
+
+    def get_associated_prod_ids(self, to_objects):
+        """Distinct prod IDs on the right-hand side of prod associations to any of to_objects"""
+        return [
+            row[0]
+            for row in self.query(
+                f"""SELECT DISTINCT prod_to_id FROM {self.prod_associations}
+                    WHERE to_object IN ({','.join('?' * len(to_objects))})""",
+                tuple(to_objects),
+            )
+        ]
+
+    def get_association_types(self, table):
+        """Distinct (hs_association_string, from_object, to_object) in prod_associations or sandbox_associations"""
+        return self.query(
+            f"""SELECT DISTINCT hs_association_string, from_object, to_object
+                FROM {table}_{self.portal_id}"""
+        )
+
+    def get_sandbox_associations_to_create(self, hs_association_string):
+        """
+        Prod associations of one type translated to sandbox IDs, for the records that have been migrated,
+        leaving out the associations already created in sandbox
+        """
+        return self.query(
+            f"""SELECT b.sandbox_id as sandbox_from_id,
+                       c.sandbox_id as sandbox_to_id,
+                       a.from_object,
+                       a.to_object,
+                       a.hs_association_string
+                FROM {self.prod_associations} as a
+                INNER JOIN {self.object_mappings} as b
+                    ON b.hs_object = a.from_object AND b.prod_id = a.prod_from_id
+                INNER JOIN {self.object_mappings} as c
+                    ON c.hs_object = a.to_object AND c.prod_id = a.prod_to_id
+                LEFT JOIN {self.sandbox_associations} as d
+                    ON d.sandbox_from_id = b.sandbox_id AND d.sandbox_to_id = c.sandbox_id
+                   AND d.hs_association_string = a.hs_association_string
+                WHERE a.hs_association_string = ? AND d.sandbox_from_id IS NULL""",
+            (hs_association_string,),
+        )
+
+    def get_associated_record_keys(self, hs_object, prod_ids):
+        """
+        (hs_object, prod_id) of the records on the other side of the stored prod associations of prod_ids, in either
+        direction. Each prod ID is bound twice, so they are queried in chunks that stay within SQLITE_MAX_VARIABLES.
+        """
+        keys = {}
+        for chunk in chunks(list(prod_ids), (SQLITE_MAX_VARIABLES - 2) // 2):
+            placeholders = ",".join("?" * len(chunk))
+            keys.update(
+                dict.fromkeys(
+                    self.query(
+                        f"""SELECT to_object, prod_to_id FROM {self.prod_associations}
+                            WHERE from_object = ? AND prod_from_id IN ({placeholders})
+                            UNION
+                            SELECT from_object, prod_from_id FROM {self.prod_associations}
+                            WHERE to_object = ? AND prod_to_id IN ({placeholders})""",
+                        (hs_object, *chunk, hs_object, *chunk),
+                    )
+                )
+            )
+        return list(keys)
+
+    def count_sandbox_associations_to_create(self):
+        """{(from_object, to_object, hs_association_string): count} of get_sandbox_associations_to_create for every type"""
+        return {
+            (from_object, to_object, hs_association_string): count
+            for from_object, to_object, hs_association_string, count in self.query(
+                f"""SELECT a.from_object, a.to_object, a.hs_association_string, COUNT(*)
+                    FROM {self.prod_associations} as a
+                    INNER JOIN {self.object_mappings} as b
+                        ON b.hs_object = a.from_object AND b.prod_id = a.prod_from_id
+                    INNER JOIN {self.object_mappings} as c
+                        ON c.hs_object = a.to_object AND c.prod_id = a.prod_to_id
+                    LEFT JOIN {self.sandbox_associations} as d
+                        ON d.sandbox_from_id = b.sandbox_id AND d.sandbox_to_id = c.sandbox_id
+                       AND d.hs_association_string = a.hs_association_string
+                    WHERE d.sandbox_from_id IS NULL
+                    GROUP BY a.from_object, a.to_object, a.hs_association_string"""
+            )
+        }
+
+    def get_sandbox_associations(self, hs_association_string):
+        return self.query(
+            f"SELECT * FROM {self.sandbox_associations} WHERE hs_association_string = ?",
+            (hs_association_string,),
+        )
+
+    def delete_sandbox_associations(self, hs_association_string):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"DELETE FROM {self.sandbox_associations} WHERE hs_association_string = ?",
+                (hs_association_string,),
+            )
+
+
+# Last-modified date property of each object, for objects where it is not hs_lastmodifieddate
+LAST_MODIFIED_PROPERTIES = {"contacts": "lastmodifieddate"}
+
+# Hubspot search returns at most this many results for one query
+SEARCH_RESULTS_LIMIT = 10000
+
+# Filters Hubspot search accepts in one filter group, and in all the filter groups of one query
+SEARCH_FILTERS_PER_GROUP_LIMIT = 6
+SEARCH_FILTERS_LIMIT = 18
+
+
+def add_search_filter(filter_groups, search_filter):
+    """
+    filter_groups with search_filter ANDed into each of them, or a group of its own when there are none.
+    Raises ValueError when a group, or the query, has no room left for it under Hubspot's search limits.
+    """
+    new_filter_groups = [
+        {**group, "filters": list(group.get("filters", [])) + [search_filter]}
+        for group in filter_groups or [{"filters": []}]
+    ]
+    if any(len(group["filters"]) > SEARCH_FILTERS_PER_GROUP_LIMIT for group in new_filter_groups):
+        raise ValueError(
+            f"The migrator adds a {search_filter['propertyName']} filter to every filter group, so each group can have "
+            f"at most {SEARCH_FILTERS_PER_GROUP_LIMIT - 1} filters of its own: {filter_groups}"
+        )
+    if sum(len(group["filters"]) for group in new_filter_groups) > SEARCH_FILTERS_LIMIT:
+        raise ValueError(
+            f"The migrator adds a {search_filter['propertyName']} filter to every filter group, so the filter groups "
+            f"can have at most {SEARCH_FILTERS_LIMIT - len(new_filter_groups)} filters between them: {filter_groups}"
+        )
+    return new_filter_groups
+
+# Seconds a portal's property schema is cached for before it is fetched from Hubspot again
+PROPERTY_SCHEMA_TTL = 24 * 60 * 60
+
+
+def get_modified_timestamp(record):
+    """Last-modified date of a record returned by the hubspot client, in epoch milliseconds"""
+    return int(record["updated_at"].timestamp() * 1000)
+
+
+# Properties replaced with fake data, with how to generate each from a mimesis Person and Address
+FAKE_DATA_PROPERTIES = {
+    "firstname": lambda person, address: person.first_name(),
+    "first_name": lambda person, address: person.first_name(),
+    "lastname": lambda person, address: person.last_name(),
+    "last_name": lambda person, address: person.last_name(),
+    "email": lambda person, address: person.email(),
+    "address": lambda person, address: (
+        str(address.street_number())
+        + " "
+        + str(address.street_name())
+        + " "
+        + str(address.street_suffix())
+    ),
+    "city": lambda person, address: address.city(),
+    "zip": lambda person, address: address.zip_code(),
+    "post_code": lambda person, address: address.zip_code(),
+    "postal_code": lambda person, address: address.zip_code(),
+    "zip_code": lambda person, address: address.zip_code(),
+    "phone": lambda person, address: person.telephone(),
+    "phonenumber": lambda person, address: person.telephone(),
+    "phone_number": lambda person, address: person.telephone(),
+}
+
+# Properties replaced with fake data on one object only
+FAKE_DATA_OBJECT_PROPERTIES = {
+    "contacts": {"name": lambda person, address: person.name()},
+}
+
+
+class FakeDataGenerator:
+    """
+    Replaces personally identifiable properties of prod records with fake data, a batch of records at a time.
+    Each value is generated from a seed derived from (hs_object, prod_id, property), so a prod record gets
+    the same fake identity on every run. mimesis providers are created once per thread and reseeded per value.
+    With a MappingStore, generated values are also kept in its fake_data table, keyed by seed as well,
+    and read back instead of regenerated.
+    """
+
+    def __init__(self, mapping_store=None, seed=0, locale="en"):
+        """
+        mapping_store: MappingStore to memoize generated values in, or None to always generate them
+        seed: Changes every fake identity generated, while keeping them deterministic
+        """
+        self.mapping_store = mapping_store
+        self.seed = seed
+        self.locale = locale
+        self.providers = threading.local()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} with seed {self.seed}"
+
+    def get_providers(self):
+        if not hasattr(self.providers, "person"):
+            from mimesis import Address, Person
+
+            self.providers.person = Person(self.locale)
+            self.providers.address = Address(self.locale)
+        return self.providers.person, self.providers.address
+
+    def get_fake_properties(self, hs_object):
+        return {**FAKE_DATA_PROPERTIES, **FAKE_DATA_OBJECT_PROPERTIES.get(hs_object, {})}
+
+    def get_value_seed(self, hs_object, prod_id, property):
+        key = f"{self.seed}:{hs_object}:{prod_id}:{property}".encode()
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+    def generate_value(self, hs_object, prod_id, property, generate):
+        person, address = self.get_providers()
+        if prod_id is None:
+            person.reseed(None)
+            address.reseed(None)
+        else:
+            value_seed = self.get_value_seed(hs_object, prod_id, property)
+            person.reseed(value_seed)
+            address.reseed(value_seed)
+        return generate(person, address)
+
+    def fake_records(self, hs_object, object_records):
+        """Replaces the properties in FAKE_DATA_PROPERTIES of prod records (dicts with "id" and "properties") in place"""
+        fake_properties = self.get_fake_properties(hs_object)
+
+        stored_values = {}
+        if self.mapping_store is not None:
+            stored_values = self.mapping_store.get_fake_values(
+                hs_object, [rec["id"] for rec in object_records], self.seed
+            )
+
+        new_values = []
+        for rec in object_records:
+            properties = rec["properties"]
+            for property in properties.keys() & fake_properties.keys():
+                key = (str(rec["id"]), property)
+                if key not in stored_values:
+                    stored_values[key] = self.generate_value(
+                        hs_object, rec["id"], property, fake_properties[property]
+                    )
+                    new_values.append((self.seed, hs_object, rec["id"], property, stored_values[key]))
+                properties[property] = stored_values[key]
+
+        if self.mapping_store is not None and new_values:
+            self.mapping_store.insert_fake_values(new_values)
+
+        return object_records
+
+    def fake_properties(self, hs_object, property_json, prod_id=None):
+        """Fake data for the properties of one record, random rather than deterministic if prod_id is None"""
+        fake_properties = self.get_fake_properties(hs_object)
+        for property in property_json.keys() & fake_properties.keys():
+            property_json[property] = self.generate_value(
+                hs_object, prod_id, property, fake_properties[property]
+            )
+        return property_json
+
+
+# CRM APIs the migrator uses, with the ID parameter their basic_api takes for record level calls
+HUBSPOT_CRM_APIS = {
+    "companies": "company_id",
+    "contacts": "contact_id",
+    "deals": "deal_id",
+    "line_items": "line_item_id",
+    "products": "product_id",
+    "quotes": "quote_id",
+    "tickets": "ticket_id",
+    "associations": None,
+    "pipelines": None,
+    "properties": None,
+}
+
+
+class CachedApiFactory:
+    """
+    api_factory for hubspot.Client that builds each API (crm.contacts.basic_api, crm.associations.batch_api, ...)
+    once and points all of them at one keep-alive connection pool of pool_size connections,
+    so connections and TLS sessions are reused across every call made with the client.
+    The pool is built by the REST client of the first API from that API's Configuration, so its proxy,
+    verify_ssl, CA certificates and retries are honoured as they would be without the factory.
+    host: Base URL the APIs call instead of the one they are generated with
+    """
+
+    def __init__(self, pool_size=10, host=None):
+        self.host = host
+        self.pool_size = pool_size
+        self.pool_manager = None
+        self.apis = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, api_client_package, api_name, config):
+        key = (api_client_package.__name__, api_name)
+        with self.lock:
+            if key not in self.apis:
+                from hubspot.discovery.discovery_base import DiscoveryBase
+
+                api = DiscoveryBase._default_api_factory(
+                    api_client_package, api_name, config
+                )
+                rest_client = api.api_client.rest_client
+                if self.pool_manager is None:
+                    self.pool_manager = type(rest_client)(
+                        api.api_client.configuration, maxsize=self.pool_size
+                    ).pool_manager
+                rest_client.pool_manager = self.pool_manager
+                if self.host:
+                    api.api_client.configuration.host = self.host
+                self.apis[key] = api
+            return self.apis[key]
+
+
+def create_hubspot_client(api_key, pool_size=10, host=None):
+    """hubspot.Client whose APIs are built once and share a connection pool, see CachedApiFactory"""
+    import hubspot
+
+    return hubspot.Client.create(
+        api_key=api_key,
+        api_factory=CachedApiFactory(pool_size, host or HUBSPOT_API_HOST),
+    )
+
+
+# Files of a snapshot directory, see HubspotSandboxMigrator.export_snapshot
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def get_snapshot_records_path(path, hs_object):
+    return os.path.join(path, f"{hs_object}.jsonl.gz")
+
+
+def write_snapshot_records(path, hs_object, pages, on_page=None, append=False):
+    """
+    Streams pages of records into the gzipped JSON Lines file of hs_object in the snapshot at path,
+    one record per line, and returns the number of records written.
+    The file is written under a temporary name and moved into place once complete.
+    on_page: Called with each page before it is written
+    append: Add the records to the end of the file instead, as another gzip member
+    """
+    records_path = get_snapshot_records_path(path, hs_object)
+    records_written = 0
+    with gzip.open(records_path + ".tmp", "wt", encoding="utf-8") as f:
+        for records in pages:
+            if on_page is not None:
+                on_page(records)
+            for rec in records:
+                updated_at = rec.get("updated_at")
+                f.write(
+                    json.dumps(
+                        {
+                            "id": rec["id"],
+                            "properties": rec["properties"],
+                            "associations": rec.get("associations"),
+                            "updated_at": updated_at.isoformat() if updated_at else None,
+                        },
+                        default=str,
+                    )
+                )
+                f.write("\n")
+            records_written += len(records)
+    if append and os.path.exists(records_path):
+        with open(records_path, "ab") as f, open(records_path + ".tmp", "rb") as member:
+            shutil.copyfileobj(member, f)
+        os.remove(records_path + ".tmp")
+    else:
+        os.replace(records_path + ".tmp", records_path)
+    return records_written
+
+
+def iter_snapshot_records(path, hs_object, properties=None, page_size=100):
+    """
+    Generator over pages of up to page_size records of hs_object read back from the snapshot at path, one line at
+    a time, in the same shape the hubspot client returns them. With properties, every other property is dropped.
+    """
+    records = []
+    with gzip.open(get_snapshot_records_path(path, hs_object), "rt", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec["updated_at"]:
+                rec["updated_at"] = datetime.datetime.fromisoformat(rec["updated_at"])
+            if properties is not None:
+                rec["properties"] = {
+                    k: v for k, v in rec["properties"].items() if k in properties
+                }
+            records.append(rec)
+            if len(records) == page_size:
+                yield records
+                records = []
+    if records:
+        yield records
+
+
+def read_snapshot_manifest(path):
+    manifest_path = os.path.join(path, SNAPSHOT_MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise ValueError(
+            f"No snapshot found at {path}, or its export did not finish"
+        )
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Snapshot at {path} has format {manifest.get('format')}, expected {SNAPSHOT_FORMAT_VERSION}"
+        )
+    return manifest
+
+
+# Helpers called once per record or per API request, left out of the method timings of MigrationMetrics: timing
+# them would cost more than their work, and the requests themselves are already timed by endpoint
+UNTIMED_MIGRATOR_METHODS = (
+    "call_api",
+    "get_hubspot_client",
+    "is_mapped",
+    "replace_with_fake_data",
+    "get_object_properties_list",
+    "get_migratable_properties",
+    "get_property_schema",
+    "get_product_match_keys",
+    "find_product_mapping",
+    "run_blocking",
+)
+
+
+@decorate_public_methods(report_calls, exclude=UNTIMED_MIGRATOR_METHODS)
+class HubspotSandboxMigrator:
+    """
+    Class for migrating data from Hubspot prod to Hubspot sandbox, given API keys for both.
+    Every public method but the helpers in UNTIMED_MIGRATOR_METHODS reports its timings through self.metrics,
+    see MigrationMetrics.
+    """
+
+    def __init__(
+        self,
+        prod_api_key,
+        sandbox_api_key,
+        hubspot_tier="starter",
+        burst_limit=None,
+        daily_limit=None,
+        pool_size=10,
+        fake_data_seed=0,
+        memoize_fake_data=True,
+        schema_ttl=PROPERTY_SCHEMA_TTL,
+        host=None,
+        metrics_dir=None,
+    ):
+        """
+        hubspot_tier: Hubspot subscription tier whose API limits apply, one of ['free','starter','professional','enterprise','api_add_on']
+        burst_limit: Override the number of calls allowed per 10 seconds for the tier
+        daily_limit: Override the number of calls allowed per day for the tier
+        pool_size: Number of keep-alive connections kept open to Hubspot per environment
+        fake_data_seed: Seed for the fake data, the same prod record always gets the same fake data for a given seed
+        memoize_fake_data: Keep the fake data generated in SQLite and read it back on later runs instead of generating it again
+        schema_ttl: Seconds the property schemas of both portals are cached for, see invalidate_property_schemas
+        host: Base URL of the Hubspot API, defaults to HUBSPOT_API_HOST
+        metrics_dir: Directory the metrics of each run are written to as JSON and Prometheus text, see MigrationMetrics
+        """
+        self.prod_api_key = prod_api_key
+        self.sandbox_api_key = sandbox_api_key
+        self.object_config = object_config
+        self.schema_ttl = schema_ttl
+        self.host = host
+
+        if hubspot_tier not in HUBSPOT_API_LIMITS:
+            raise ValueError(
+                f"Unknown Hubspot tier {hubspot_tier}. Should be one of {list(HUBSPOT_API_LIMITS.keys())}"
+            )
+
+        limits = dict(HUBSPOT_API_LIMITS[hubspot_tier])
+        if burst_limit:
+            limits["burst_limit"] = burst_limit
+        if daily_limit:
+            limits["daily_limit"] = daily_limit
+
+        self.rate_limiters = {
+            "prod": get_rate_limiter(prod_api_key, **limits),
+            "sandbox": get_rate_limiter(sandbox_api_key, **limits),
+        }
+        self.search_rate_limiters = {
+            "prod": get_search_rate_limiter(prod_api_key),
+            "sandbox": get_search_rate_limiter(sandbox_api_key),
+        }
+
+        # The portal labels are added once the account identities below have been fetched through call_api
+        self.metrics = MigrationMetrics(report_dir=metrics_dir)
+
+        if not is_sandbox(sandbox_api_key, host, partial(self.call_api, "sandbox")):
+            raise ValueError(
+                f"Sandbox API Key provided is not for a sandbox Hubspot instance!"
+            )
+
+        if not is_production(prod_api_key, host, partial(self.call_api, "prod")):
+            raise ValueError(
+                f"Prod API Key provided is not for a production Hubspot instance!"
+            )
+
+        if not test_object_config(object_config):
+            raise ValueError(
+                f"Every object in the Object Config must have a list or properties associated with it. Please review the example object_config."
+            )
+
+        self.prod_portal_id = get_portal_id(prod_api_key, host)
+        self.sandbox_portal_id = get_portal_id(sandbox_api_key, host)
+        self.metrics.labels.update(
+            {
+                "prod_portal": self.prod_portal_id,
+                "sandbox_portal": self.sandbox_portal_id,
+            }
+        )
+
+        self.pool_size = pool_size
+        self.hubspot_clients = {
+            "prod": create_hubspot_client(prod_api_key, pool_size, host),
+            "sandbox": create_hubspot_client(sandbox_api_key, pool_size, host),
+        }
+
+        self.mapping_store = MappingStore(self.sandbox_portal_id, metrics=self.metrics)
+        self.fake_data_generator = FakeDataGenerator(
+            self.mapping_store if memoize_fake_data else None, seed=fake_data_seed
+        )
+        self.load_mapped_prod_ids()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} for Sandbox Instance {self.sandbox_portal_id} and Prod Instance {self.prod_portal_id}"
+
+    def call_api(self, environment, api_method, max_retries=5, **kwargs):
+        """
+        Every Hubspot API call goes through here so that it is paced by the rate limiter for the
+        environment's API key. CRM searches are also paced by the search limiter of the API key.
+        429 responses slow the limiters down and are retried.
+        The latency, errors and retries of each call are recorded in self.metrics.
+        """
+        if environment in ["prod", "production"]:
+            environment = "prod"
+        else:
+            environment = "sandbox"
+        rate_limiter = self.rate_limiters[environment]
+        endpoint = get_endpoint_name(api_method)
+        search_rate_limiter = (
+            self.search_rate_limiters[environment] if is_search_endpoint(endpoint) else None
+        )
+
+        for attempt in range(max_retries + 1):
+            throttle_seconds = rate_limiter.wait()
+            if search_rate_limiter:
+                throttle_seconds += search_rate_limiter.wait()
+            self.metrics.observe_throttle(throttle_seconds)
+            started = time.perf_counter()
+            try:
+                api_response, headers = call_with_headers(api_method, **kwargs)
+            except Exception as ex:
+                self.metrics.observe_api_call(
+                    environment,
+                    endpoint,
+                    time.perf_counter() - started,
+                    status=get_error_status(ex),
+                    error=True,
+                    retry=attempt > 0,
+                )
+                if get_error_status(ex) == 429 and attempt < max_retries:
+                    print(f"Rate limited by Hubspot, retrying ({attempt + 1}/{max_retries})")
+                    if search_rate_limiter:
+                        search_rate_limiter.throttled(get_error_headers(ex))
+                    else:
+                        rate_limiter.throttled(get_error_headers(ex))
+                    continue
+                raise
+            self.metrics.observe_api_call(
+                environment, endpoint, time.perf_counter() - started, retry=attempt > 0
+            )
+            rate_limiter.succeeded(headers)
+            if search_rate_limiter:
+                search_rate_limiter.succeeded()
+            return api_response
+
+    def get_hubspot_client(self, hs_object, environment="sandbox"):
+
+        if environment in ["prod", "production"]:
+            hs_client = self.hubspot_clients["prod"]
+        else:
+            hs_client = self.hubspot_clients["sandbox"]
+
+        if hs_object not in HUBSPOT_CRM_APIS:
+            raise ValueError(
+                f"No Hubspot client incorporated for objects of type {hs_object}. Should be one of {list(HUBSPOT_CRM_APIS.keys())}"
+            )
+
+        return getattr(hs_client.crm, hs_object)
+
+    def get_record_by_id(self, environment, hs_object, object_id):
+
+        if not HUBSPOT_CRM_APIS.get(hs_object):
+            print(
+                f"""No Get Object by ID method incorporated for objects of type {hs_object}.
+    Only the following objects are currently supported: companies, deals, contacts, line_items, products, tickets, quotes
+                    """
+            )
+            return []
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
+
+        associations = [obj for obj in object_config.keys() if obj != hs_object]
+        properties = object_config[hs_object]["properties"]
+
+        with self.metrics.phase("extract"):
+            api_response = self.call_api(
+                environment,
+                hs_object_client.basic_api.get_by_id,
+                archived=False,
+                associations=associations,
+                properties=properties,
+                **{HUBSPOT_CRM_APIS[hs_object]: object_id},
+            )
+            record = api_response.to_dict()
+
+        self.metrics.count_records(hs_object, "read", 1)
+        return record
+
+    @in_phase("archive")
+    def delete_record_by_id(self, hs_object, object_id):
+        """Only available for sandbox"""
+
+        if not HUBSPOT_CRM_APIS.get(hs_object):
+            print(
+                f"""No Delete Object by ID method incorporated for objects of type {hs_object}.
+    Only the following objects are currently supported: companies, deals, contacts, line_items, products, tickets, quotes
+                    """
+            )
+            return []
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        self.call_api(
+            "sandbox",
+            hs_object_client.basic_api.archive,
+            **{HUBSPOT_CRM_APIS[hs_object]: object_id},
+        )
+
+        return True
+
+    def iter_object_pages(
+        self,
+        hs_object,
+        limit,
+        properties,
+        associations=[],
+        environment="prod",
+        after=None,
+        on_page=None,
+    ):
+        """
+        Generator over pages of up to 100 records of any object type, following the paging cursor
+        until `limit` records have been yielded (or every record, if limit is None)
+        after: Paging cursor to start from
+        on_page: Called with each page and the cursor of the page after it (None on the last page) before the page is yielded
+        """
+        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
+
+        page_limit = 100 if limit is None else min(limit, 100)
+        records_downloaded = 0
+        pages_downloaded = 0
+
+        while limit is None or records_downloaded < limit:
+            page_kwargs = {"after": after} if after else {}
+            with self.metrics.phase("extract"):
+                api_response = self.call_api(
+                    environment,
+                    hs_object_client.basic_api.get_page,
+                    limit=page_limit,
+                    archived=False,
+                    properties=properties,
+                    associations=associations,
+                    **page_kwargs,
+                )
+                records = api_response.to_dict()["results"]
+            if limit is not None:
+                records = records[: limit - records_downloaded]
+            if not records:
+                break
+
+            records_downloaded += len(records)
+            pages_downloaded += 1
+            self.metrics.count_records(hs_object, "read", len(records))
+            if pages_downloaded % 10 == 0:
+                print(records_downloaded, "objects downloaded")
+
+            if api_response.paging is None or api_response.paging.next is None:
+                after = None
+            else:
+                after = api_response.paging.next.after
+
+            if on_page is not None:
+                on_page(records, after)
+
+            yield records
+
+            if after is None:
+                break
+
+    def iter_search_pages(
+        self,
+        hs_object,
+        limit,
+        properties,
+        filter_groups=[],
+        sorts=[],
+        associations=[],
+        environment="prod",
+        after=None,
+        on_page=None,
+    ):
+        """
+        Generator over pages of up to 100 records of hs_object that match filter_groups, found with the search API
+        so that only the records wanted are read. Takes the same limit, after and on_page as iter_object_pages.
+        filter_groups and sorts are in the search API's shape, e.g.
+        [{"filters": [{"propertyName": "pipeline", "operator": "EQ", "value": "default"}]}]
+        Without sorts records come in ID order and every page asks for the IDs after the last one seen, which
+        keeps paging past the 10,000 results one search can return; the cursor is that last ID. With sorts,
+        paging follows Hubspot's cursor and stops at 10,000 records.
+        Search results have no associations, so those are read for each page with the associations batch_api.
+        """
+        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
+
+        by_id = not sorts
+        if by_id:
+            sorts = [{"propertyName": "hs_object_id", "direction": "ASCENDING"}]
+            # fail before the first page rather than on the second, when the hs_object_id filter is added
+            add_search_filter(filter_groups, {"propertyName": "hs_object_id", "operator": "GT", "value": "0"})
+
+        records_downloaded = 0
+        pages_downloaded = 0
+
+        while limit is None or records_downloaded < limit:
+            page_limit = 100 if limit is None else min(limit - records_downloaded, 100)
+            if by_id:
+                page_filter_groups = filter_groups
+                if after:
+                    after_filter = {
+                        "propertyName": "hs_object_id",
+                        "operator": "GT",
+                        "value": str(after),
+                    }
+                    page_filter_groups = add_search_filter(filter_groups, after_filter)
+                page_after = 0
+            else:
+                page_filter_groups = filter_groups
+                page_after = int(after or 0)
+                if page_after >= SEARCH_RESULTS_LIMIT:
+                    print(
+                        f"Search returns at most {SEARCH_RESULTS_LIMIT} sorted {hs_object}, skipping the rest of them"
+                    )
+                    break
+                page_limit = min(page_limit, SEARCH_RESULTS_LIMIT - page_after)
+
+            from hubspot.crm.products import PublicObjectSearchRequest
+
+            public_object_search_request = PublicObjectSearchRequest(
+                filter_groups=page_filter_groups,
+                sorts=sorts,
+                properties=properties,
+                limit=page_limit,
+                after=page_after,
+            )
+            with self.metrics.phase("extract"):
+                api_response = self.call_api(
+                    environment,
+                    hs_object_client.search_api.do_search,
+                    public_object_search_request=public_object_search_request,
+                )
+                records = api_response.to_dict()["results"]
+            if not records:
+                break
+
+            records_downloaded += len(records)
+            pages_downloaded += 1
+            self.metrics.count_records(hs_object, "read", len(records))
+            if pages_downloaded % 10 == 0:
+                print(records_downloaded, "objects downloaded")
+
+            if api_response.paging is None or api_response.paging.next is None:
+                after = None
+            elif by_id:
+                after = records[-1]["id"]
+            else:
+                after = api_response.paging.next.after
+
+            if associations:
+                self.read_associations(environment, hs_object, records, associations)
+
+            if on_page is not None:
+                on_page(records, after)
+
+            yield records
+
+            if after is None:
+                break
+
+    def get_object_records(
+        self, hs_object, limit, properties, associations=[], environment="prod"
+    ):
+        return [
+            rec
+            for records in self.iter_object_pages(
+                hs_object, limit, properties, associations, environment
+            )
+            for rec in records
+        ]
+
+    def batch_create_records(self, hs_object, object_records, chunk_size=100):
+        """
+        Only available for sandbox.
+        Creates sandbox copies of prod records (dicts with "id" and "properties") in batches of up to 100
+        and records each chunk in object_mappings in a single transaction.
+        """
+        results = []
+
+        for chunk in chunks(object_records, chunk_size):
+            results.extend(self.create_record_chunk(hs_object, chunk))
+
+        print(len(results), f"{hs_object} created in Sandbox")
+        return results
+
+    @in_phase("create")
+    def create_record_chunk(self, hs_object, chunk):
+        """Creates up to 100 sandbox records with one batch_api.create call, see batch_create_records"""
+        from hubspot.crm.products import (BatchInputSimplePublicObjectInput,
+                                          SimplePublicObjectInput)
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        inputs = [
+            SimplePublicObjectInput(
+                properties=strip_read_only_properties(rec["properties"])
+            )
+            for rec in chunk
+        ]
+        batch_input_simple_public_object_input = BatchInputSimplePublicObjectInput(
+            inputs=inputs
+        )
+        try:
+            api_response = self.call_api(
+                "sandbox",
+                hs_object_client.batch_api.create,
+                batch_input_simple_public_object_input=batch_input_simple_public_object_input,
+            )
+        except Exception as ex:
+            print("Exception when calling batch_api->create: %s\n" % ex)
+            print(
+                f"Creating {len(chunk)} {hs_object} one at a time to isolate the failing records"
+            )
+            results = []
+            for rec in chunk:
+                result = self.create_sandbox_record_from_prod_record(
+                    hs_object, rec["properties"], rec["id"]
+                )
+                if result:
+                    results.append(result)
+            return results
+
+        results = match_batch_results(chunk, api_response.to_dict()["results"])
+        matched_by_order = sum(1 for result in results if result.get("matched_by_order"))
+        if matched_by_order:
+            self.metrics.count_records(hs_object, "matched_by_order", matched_by_order)
+
+        self.save_mappings(
+            [(result["id"], result["prod_id"], hs_object) for result in results]
+        )
+        self.metrics.count_records(hs_object, "created", len(results))
+
+        return results
+
+    def batch_update_records(self, hs_object, object_records, sandbox_ids, chunk_size=100):
+        """
+        Only available for sandbox.
+        Copies the properties of prod records (dicts with "id" and "properties") onto the sandbox records
+        they are mapped to in sandbox_ids ({prod_id: sandbox_id}), in batches of up to 100.
+        Returns the prod records updated.
+        """
+        from hubspot.crm.products import BatchInputSimplePublicObjectBatchInput
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        updated_records = []
+        for chunk in chunks(object_records, chunk_size):
+            batch_input_simple_public_object_batch_input = BatchInputSimplePublicObjectBatchInput(
+                inputs=[
+                    {
+                        "id": sandbox_ids[rec["id"]],
+                        "properties": strip_read_only_properties(dict(rec["properties"])),
+                    }
+                    for rec in chunk
+                ]
+            )
+            try:
+                with self.metrics.phase("update"):
+                    self.call_api(
+                        "sandbox",
+                        hs_object_client.batch_api.update,
+                        batch_input_simple_public_object_batch_input=batch_input_simple_public_object_batch_input,
+                    )
+                updated_records.extend(chunk)
+                self.metrics.count_records(hs_object, "updated", len(chunk))
+            except Exception as ex:
+                print("Exception when calling batch_api->update: %s\n" % ex)
+
+        print(len(updated_records), f"{hs_object} updated in Sandbox")
+        return updated_records
+
+    def iter_modified_records(
+        self, hs_object, properties, since=None, environment="prod", filter_groups=[]
+    ):
+        """
+        Generator over pages of up to 100 records of hs_object modified at or after `since` (epoch milliseconds),
+        oldest first, found with the search API. Search stops at 10,000 results per query, so when that is reached
+        the query starts again from the last-modified date of the last record seen.
+        filter_groups: Search API filter groups the records must also match, as in iter_search_pages
+        """
+        from hubspot.crm.products import PublicObjectSearchRequest
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
+        modified_property = LAST_MODIFIED_PROPERTIES.get(hs_object, "hs_lastmodifieddate")
+        # past 10,000 results the query restarts with a modified-since filter, so there must be room for one
+        add_search_filter(filter_groups, {"propertyName": modified_property, "operator": "GTE", "value": "0"})
+
+        after = 0
+        while True:
+            page_filter_groups = filter_groups
+            if since is not None:
+                page_filter_groups = add_search_filter(
+                    filter_groups,
+                    {
+                        "propertyName": modified_property,
+                        "operator": "GTE",
+                        "value": str(since),
+                    },
+                )
+            public_object_search_request = PublicObjectSearchRequest(
+                filter_groups=page_filter_groups,
+                sorts=[{"propertyName": modified_property, "direction": "ASCENDING"}],
+                properties=properties,
+                limit=100,
+                after=after,
+            )
+            with self.metrics.phase("extract"):
+                api_response = self.call_api(
+                    environment,
+                    hs_object_client.search_api.do_search,
+                    public_object_search_request=public_object_search_request,
+                )
+                records = api_response.to_dict()["results"]
+            if records:
+                self.metrics.count_records(hs_object, "read", len(records))
+                yield records
+
+            if api_response.paging is None or api_response.paging.next is None:
+                break
+            after = int(api_response.paging.next.after)
+
+            if after + 100 > SEARCH_RESULTS_LIMIT:
+                last_modified = get_modified_timestamp(records[-1])
+                if since is not None and last_modified <= since:
+                    print(
+                        f"More than {SEARCH_RESULTS_LIMIT} {hs_object} were modified at {last_modified}, skipping the rest of them"
+                    )
+                    last_modified = since + 1
+                since, after = last_modified, 0
+
+    @in_phase("create")
+    def create_sandbox_record_from_prod_record(self, hs_object, properties, prod_id):
+        from hubspot.crm.products import SimplePublicObjectInput
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        simple_public_object_input = SimplePublicObjectInput(
+            properties=strip_read_only_properties(properties)
+        )
+
+        try:
+            api_response = self.call_api(
+                "sandbox",
+                hs_object_client.basic_api.create,
+                simple_public_object_input=simple_public_object_input,
+            )
+            result = api_response.to_dict()
+
+            sandbox_id = result["id"]
+
+            result["prod_id"] = prod_id
+
+            self.save_mappings([(sandbox_id, prod_id, hs_object)])
+            self.metrics.count_records(hs_object, "created", 1)
+
+        except Exception as ex:
+            print(ex)
+            print(f"Skipping the creation of {hs_object} with Prod ID {prod_id}")
+            result = {}
+            pass
+
+        return result
+
+    def batch_read_records(
+        self, environment, hs_object, object_ids, properties, associations=[], chunk_size=100
+    ):
+        """
+        Generator that reads records by ID in chunks of up to 100 with batch_api.read, yielding each chunk
+        as soon as it arrives. Records come back in the same shape as get_record_by_id.
+        """
+        for chunk in chunks(object_ids, chunk_size):
+            records = self.read_record_chunk(
+                environment, hs_object, chunk, properties, associations
+            )
+            if records:
+                yield records
+
+    @in_phase("extract")
+    def read_record_chunk(
+        self, environment, hs_object, object_ids, properties, associations=[]
+    ):
+        """
+        Reads up to 100 records with one batch_api.read call, see batch_read_records.
+        The batch read endpoint does not return associations, so those are read for the same IDs
+        with the associations batch_api. Errors left after call_api's retries are raised, so a chunk that
+        could not be read is never taken for records that were read and checkpointed as done.
+        """
+        from hubspot.crm.products import BatchReadInputSimplePublicObjectId
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment=environment)
+
+        inputs = [{"id": str(oid)} for oid in object_ids]
+        api_response = self.call_api(
+            environment,
+            hs_object_client.batch_api.read,
+            batch_read_input_simple_public_object_id=BatchReadInputSimplePublicObjectId(
+                properties=properties, inputs=inputs
+            ),
+            archived=False,
+        )
+
+        records = api_response.to_dict()["results"]
+        self.read_associations(environment, hs_object, records, associations)
+        self.metrics.count_records(hs_object, "read", len(records))
+
+        return records
+
+    @in_phase("extract")
+    def read_associations(self, environment, hs_object, records, associations):
+        """
+        Adds the associations of records to each of the object types in associations, read with one
+        associations batch_api.read call per type, in the same shape basic_api.get_page returns them.
+        Errors are raised, as records missing their associations would be marked associated all the same.
+        """
+        from hubspot.crm.associations import BatchInputPublicObjectId
+
+        hs_associations_client = self.get_hubspot_client(
+            "associations", environment=environment
+        )
+
+        inputs = [{"id": str(rec["id"])} for rec in records]
+        records_by_id = {rec["id"]: rec for rec in records}
+
+        for to_object in associations:
+            association_response = self.call_api(
+                environment,
+                hs_associations_client.batch_api.read,
+                from_object_type=hs_object,
+                to_object_type=to_object,
+                batch_input_public_object_id=BatchInputPublicObjectId(inputs=inputs),
+            )
+
+            for result in association_response.to_dict()["results"]:
+                rec = records_by_id.get(result["_from"]["id"])
+                if rec is None:
+                    continue
+                if not rec.get("associations"):
+                    rec["associations"] = {}
+                rec["associations"][to_object] = {
+                    "results": [
+                        {"id": to["id"], "type": to["type"]} for to in result["to"]
+                    ]
+                }
+
+
+    def get_associated_record_ids(self, hs_object):
+        """Distinct prod IDs of hs_object that are associated with records already pulled from prod"""
+        return self.mapping_store.get_associated_prod_ids(
+            [hs_object, " ".join(hs_object.split("_"))]
+        )
+
+    def iter_associated_records(self, hs_object, properties):
+        """Generator over chunks of prod records of hs_object that are associated with records already pulled from prod"""
+        ids_to_get = self.get_associated_record_ids(hs_object)
+
+        if not ids_to_get:
+            print(f"No records of type {hs_object} found")
+            return
+
+        associations = [obj for obj in object_config.keys() if obj != hs_object]
+
+        yield from self.batch_read_records(
+            "prod", hs_object, ids_to_get, properties, associations
+        )
+
+    def get_associated_records(self, hs_object, properties, batch=True):
+
+        environment = "prod"
+
+        if batch:
+            return [
+                rec
+                for chunk in self.iter_associated_records(hs_object, properties)
+                for rec in chunk
+            ]
+
+        object_results = []
+
+        ids_to_get = self.get_associated_record_ids(hs_object)
+
+        if ids_to_get:
+            for oid in ids_to_get:
+                result = self.get_record_by_id(environment, hs_object, oid)
+                object_results.append(result)
+        else:
+            print(f"No records of type {hs_object} found")
+
+        return object_results
+
+    def setup_sqlite(self):
+        self.mapping_store.setup()
+
+    def clear_sqlite(self):
+        self.mapping_store.clear()
+        self.mapped_prod_ids = {}
+
+    def load_mapped_prod_ids(self):
+        """Loads the prod IDs that already have a sandbox copy into memory, as {hs_object: set of integer prod IDs}"""
+        self.mapped_prod_ids = {}
+        for _, prod_id, hs_obj in self.mapping_store.get_mappings():
+            self.mapped_prod_ids.setdefault(hs_obj, set()).add(int(prod_id))
+
+    def save_mappings(self, rows):
+        """Stores rows of (sandbox_id, prod_id, hs_object) in object_mappings and in the in-memory set of mapped prod IDs"""
+        self.mapping_store.insert_mappings(rows)
+        for _, prod_id, hs_obj in rows:
+            self.mapped_prod_ids.setdefault(hs_obj, set()).add(int(prod_id))
+
+    def is_mapped(self, hs_object, prod_id):
+        return int(prod_id) in self.mapped_prod_ids.get(hs_object, ())
+
+    def insert_mappings(self, rows):
+        """
+        rows must be tuples of three values:
+        sandbox_id: id of the object in sandbox
+        prod_id: id of the corresponding object in prod
+        hs_object: string of the object type that was created
+        """
+        portal_id = self.sandbox_portal_id
+
+        rows = check_row_width(
+            rows, ["sandbox_id", "prod_id", "hs_object"], "object_mappings"
+        )
+        self.save_mappings(rows)
+
+        print(len(rows), f"records uploaded to object_mappings_{portal_id} table")
+
+    def insert_prod_associations(self, rows):
+        """
+        rows must be tuples of five values:
+        prod_from_id: integer id of the left-hand object on the association in prod
+        prod_to_id: integer id of the right-hand object on the association in prod
+        from_object: object type of the left-hand object on the association in prod
+        to_object: object type of the right-hand object on the association in prod
+        hs_association_string: string that Hubspot expects when creating an association
+        """
+        portal_id = self.sandbox_portal_id
+
+        rows = check_row_width(
+            rows,
+            [
+                "prod_from_id",
+                "prod_to_id",
+                "from_object",
+                "to_object",
+                "hs_association_string",
+            ],
+            "prod_associations",
+        )
+        if not rows:
+            return
+
+        self.mapping_store.insert_prod_associations(rows)
+
+        print(len(rows), f"records uploaded to prod_associations_{portal_id} table")
+
+    def insert_sandbox_associations(self, rows):
+        """
+        rows must be tuples of five values:
+        sandbox_from_id: integer id of the left-hand object on the association in prod
+        sandbox_to_id: integer id of the right-hand object on the association in prod
+        from_object: object type of the left-hand object on the association in prod
+        to_object: object type of the right-hand object on the association in prod
+        hs_association_string: string that Hubspot expects when creating an association
+        """
+        rows = check_row_width(
+            rows,
+            [
+                "sandbox_from_id",
+                "sandbox_to_id",
+                "from_object",
+                "to_object",
+                "hs_association_string",
+            ],
+            "sandbox_associations",
+        )
+        self.mapping_store.insert_sandbox_associations(rows)
+
+        print(len(rows), "records uploaded to sandbox associations table")
+
+    def get_object_properties_list(self, object_records):
+        """
+        The properties of object_records as [{"properties": {...}}, ...], leaving out the ones Hubspot sets itself.
+        Every record gets every property found on any of them, None where it had no value.
+        """
+        columns = [
+            p
+            for p in dict.fromkeys(p for o in object_records for p in o["properties"])
+            if p not in ["hs_object_id", "lastmodifieddate", "createdate"]
+        ]
+        return [
+            {"properties": {p: o["properties"].get(p) for p in columns}}
+            for o in object_records
+        ]
+
+    def get_object_properties(self, hs_object):
+        return self.get_migratable_properties(
+            hs_object, self.object_config[hs_object]["properties"]
+        )
+
+    def get_property_schema(self, hs_object, environment="prod", refresh=False):
+        """
+        {property name: writable} for hs_object in the environment's portal, from the schema cache unless
+        it is older than schema_ttl. Calculated and read-only properties are not writable.
+        """
+        if environment in ["prod", "production"]:
+            portal_id = self.prod_portal_id
+        else:
+            portal_id = self.sandbox_portal_id
+
+        schema = None
+        if not refresh:
+            schema = self.mapping_store.get_property_schema(
+                portal_id, hs_object, self.schema_ttl
+            )
+        if schema is None:
+            hs_properties_client = self.get_hubspot_client(
+                "properties", environment=environment
+            )
+            results = self.call_api(
+                environment,
+                hs_properties_client.core_api.get_all,
+                object_type=hs_object,
+                archived=False,
+            ).results
+            schema = {
+                p.name: not (
+                    p.calculated
+                    or (p.modification_metadata and p.modification_metadata.read_only_value)
+                )
+                for p in results
+            }
+            self.mapping_store.save_property_schema(portal_id, hs_object, schema)
+        return schema
+
+    def get_properties(self, hs_object):
+        """
+        Deprecated, use get_property_schema. The definitions of the properties of hs_object in prod, as a pandas DataFrame.
+        Needs the reporting extra: pip install hubspot-prod-to-sandbox[reporting]
+        """
+        warnings.warn(
+            "get_properties is deprecated, use get_property_schema instead",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError(
+                "get_properties needs pandas, install it with the reporting extra: "
+                "pip install hubspot-prod-to-sandbox[reporting]"
+            ) from None
+
+        hs_properties_client = self.get_hubspot_client("properties", environment="prod")
+        return pd.DataFrame(
+            self.call_api(
+                "prod",
+                hs_properties_client.core_api.get_all,
+                object_type=hs_object,
+                archived=False,
+            ).to_dict()["results"]
+        )
+
+    def invalidate_property_schemas(self, hs_object=None):
+        """Drop the cached property schemas of both portals, for hs_object or every object, e.g. after adding a property in Hubspot"""
+        for portal_id in [self.prod_portal_id, self.sandbox_portal_id]:
+            self.mapping_store.delete_property_schemas(portal_id, hs_object)
+
+    def get_migratable_properties(self, hs_object, properties, prod_schema=None):
+        """
+        The entries of properties that exist in prod and can be written in sandbox, in their original order.
+        Writing any other property fails Hubspot's validation, so they are dropped before records are read.
+        prod_schema: The prod schema to check against instead of the cached one, e.g. a snapshot's
+        """
+        if prod_schema is None:
+            prod_schema = self.get_property_schema(hs_object, "prod")
+        sandbox_schema = self.get_property_schema(hs_object, "sandbox")
+
+        missing_in_prod = [p for p in properties if p not in prod_schema]
+        missing_in_sandbox = [p for p in properties if p not in sandbox_schema]
+        read_only_in_sandbox = [
+            p for p in properties if p in sandbox_schema and not sandbox_schema[p]
+        ]
+        if missing_in_prod:
+            print(f"Properties {missing_in_prod} are not on {hs_object} in prod and will be ignored")
+        if missing_in_sandbox:
+            print(f"Properties {missing_in_sandbox} are not on {hs_object} in sandbox and will be ignored")
+        if read_only_in_sandbox:
+            print(f"Properties {read_only_in_sandbox} are read-only on {hs_object} in sandbox and will be ignored")
+
+        return [
+            p
+            for p in properties
+            if p in prod_schema and sandbox_schema.get(p)
+        ]
+
+    def get_exportable_properties(self, hs_object, properties):
+        """
+        The entries of properties that exist in prod, in their original order. A snapshot can be loaded into any
+        sandbox, so which of them each sandbox can write is left to load_snapshot, see get_migratable_properties.
+        """
+        prod_schema = self.get_property_schema(hs_object, "prod")
+        missing_in_prod = [p for p in properties if p not in prod_schema]
+        if missing_in_prod:
+            print(f"Properties {missing_in_prod} are not on {hs_object} in prod and will be ignored")
+        properties = [p for p in properties if p in prod_schema]
+        if not properties:
+            raise ValueError(
+                f"None of the properties provided exist on object {hs_object} in prod"
+            )
+        return properties
+
+    @in_phase("association_building")
+    def get_prod_associations(self, object_records, hs_object=None):
+        """
+        Associations of prod records as rows of (prod_from_id, prod_to_id, from_object, to_object,
+        hs_association_string), the columns of prod_associations.
+        Association types are resolved to their objects through ASSOCIATION_TYPES, falling back to hs_object
+        and the association key for labelled types it does not know. An association listed more than once,
+        or in both directions, is kept once.
+        """
+        print("Getting Prod Associations")
+        rows = []
+        seen = set()
+
+        for obj in object_records:
+            for association_key, association_results in (
+                obj.get("associations") or {}
+            ).items():
+                for result in association_results.get("results") or []:
+                    hs_association_string = result["type"]
+                    from_object, to_object, reverse_string = ASSOCIATION_TYPES.get(
+                        hs_association_string,
+                        (hs_object, association_key.replace(" ", "_"), None),
+                    )
+                    if from_object is None:
+                        continue
+
+                    edge = (from_object, obj["id"], to_object, result["id"])
+                    if (*edge, hs_association_string) in seen:
+                        continue
+                    seen.add((*edge, hs_association_string))
+                    if reverse_string:
+                        seen.add(
+                            (to_object, result["id"], from_object, obj["id"], reverse_string)
+                        )
+
+                    rows.append(
+                        (obj["id"], result["id"], from_object, to_object, hs_association_string)
+                    )
+
+        return rows
+
+    def find_product_mapping(self, product_name):
+        from hubspot.crm.products import PublicObjectSearchRequest
+
+        hs_object = "products"
+        sandbox_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        public_object_search_request = PublicObjectSearchRequest(
+            filter_groups=[
+                {
+                    "filters": [
+                        {
+                            "value": product_name,
+                            "propertyName": "name",
+                            "operator": "EQ",
+                        }
+                    ]
+                }
+            ],
+            limit=1,
+        )
+        try:
+            api_response = self.call_api(
+                "sandbox",
+                sandbox_client.search_api.do_search,
+                public_object_search_request=public_object_search_request,
+            )
+            result = api_response.to_dict()["results"][0]
+        except Exception as ex:
+            print(ex)
+            print(
+                f"No Product Exists in Sandbox for Production Product: {product_name}"
+            )
+            result = {}
+
+        return result
+
+    def get_product_match_keys(self, properties):
+        """Keys a product is matched on between prod and sandbox, most specific first: SKU, then name"""
+        return [
+            (p, properties[p]) for p in ["hs_sku", "name"] if properties.get(p)
+        ]
+
+    def build_product_index(self, environment, properties):
+        """{match key: product ID} over the full product catalogue of one portal, see get_product_match_keys"""
+        product_index = {}
+        for records in self.iter_object_pages(
+            "products", None, properties, environment=environment
+        ):
+            for rec in records:
+                for key in self.get_product_match_keys(rec["properties"]):
+                    product_index.setdefault(key, rec["id"])
+        return product_index
+
+    def create_product_mapping(self, prod_products=None):
+        """
+        Maps every prod product to a sandbox product. The sandbox catalogue is indexed in memory by SKU and name,
+        prod products are matched against it, and those missing from sandbox are created in batches.
+        Mappings are kept in object_mappings, so later runs only reconcile prod products that are new
+        (matched or created as above) or changed since the last run (updated in sandbox).
+        prod_products: The prod catalogue to map, e.g. from a snapshot, instead of reading it from prod
+        Returns all product mappings as {prod_id: sandbox_id}.
+        """
+        hs_object = "products"
+
+        properties = list(
+            dict.fromkeys(object_config[hs_object]["properties"] + ["name", "hs_sku"])
+        )
+
+        product_mapping_dict = {
+            str(prod_id): str(sandbox_id)
+            for sandbox_id, prod_id, hs_obj in self.mapping_store.get_mappings()
+            if hs_obj == hs_object
+        }
+
+        checkpoint = self.mapping_store.get_checkpoint(hs_object, "product_index")
+        last_synced = checkpoint[0] if checkpoint else None
+
+        if prod_products is None:
+            prod_products = self.get_object_records(
+                hs_object, None, properties, environment="prod"
+            )
+        updated_at = {
+            rec["id"]: rec["updated_at"].isoformat() if rec.get("updated_at") else ""
+            for rec in prod_products
+        }
+
+        new_products = [
+            rec for rec in prod_products if rec["id"] not in product_mapping_dict
+        ]
+        changed_products = [
+            rec
+            for rec in prod_products
+            if rec["id"] in product_mapping_dict
+            and last_synced is not None
+            and updated_at[rec["id"]] > last_synced
+        ]
+
+        if new_products:
+            sandbox_index = self.build_product_index("sandbox", properties)
+
+            matched_mappings = []
+            products_to_create = {}
+            for rec in new_products:
+                match_keys = self.get_product_match_keys(rec["properties"])
+                sandbox_id = next(
+                    (sandbox_index[key] for key in match_keys if key in sandbox_index),
+                    None,
+                )
+                if sandbox_id is not None:
+                    product_mapping_dict[rec["id"]] = sandbox_id
+                    matched_mappings.append((sandbox_id, rec["id"], hs_object))
+                else:
+                    # products sharing a SKU or name are created once and mapped to the same sandbox product
+                    key = match_keys[0] if match_keys else ("id", rec["id"])
+                    products_to_create.setdefault(key, []).append(rec)
+
+            results = self.batch_create_records(
+                hs_object, [records[0] for records in products_to_create.values()]
+            )
+            created_ids = {result["prod_id"]: result["id"] for result in results}
+            for records in products_to_create.values():
+                sandbox_id = created_ids.get(records[0]["id"])
+                if sandbox_id is None:
+                    continue
+                product_mapping_dict[records[0]["id"]] = sandbox_id
+                for rec in records[1:]:
+                    product_mapping_dict[rec["id"]] = sandbox_id
+                    matched_mappings.append((sandbox_id, rec["id"], hs_object))
+
+            self.save_mappings(matched_mappings)
+            print(
+                len(matched_mappings),
+                f"records uploaded to object_mappings_{self.sandbox_portal_id} table",
+            )
+
+        if changed_products:
+            self.batch_update_records(
+                hs_object, changed_products, product_mapping_dict
+            )
+
+        self.mapping_store.save_checkpoint(
+            hs_object,
+            "product_index",
+            after=max(updated_at.values(), default=last_synced),
+            records_done=len(prod_products),
+            completed=True,
+        )
+
+        return product_mapping_dict
+
+    def get_records_to_delete(self, remove_products=False):
+        """Sandbox records created by the migrator as {hs_object: [sandbox_id, ...]}"""
+        records_to_delete = {}
+        for sandbox_id, prod_id, hs_obj in self.mapping_store.get_mappings(
+            include_products=remove_products
+        ):
+            records_to_delete.setdefault(hs_obj, {})[sandbox_id] = None
+
+        # prod products sharing a sandbox product each have a mapping to it
+        return {hs_obj: list(sandbox_ids) for hs_obj, sandbox_ids in records_to_delete.items()}
+
+    def delete_mappings(self, sandbox_ids):
+        self.mapping_store.delete_mappings(sandbox_ids)
+
+    @in_phase("archive")
+    def archive_record_chunk(self, hs_object, sandbox_ids):
+        """
+        Archives up to 100 sandbox records with one batch_api.archive call and deletes their mappings
+        in one statement. Returns the sandbox IDs archived.
+        """
+        from hubspot.crm.products import BatchInputSimplePublicObjectId
+
+        hs_object_client = self.get_hubspot_client(hs_object, environment="sandbox")
+
+        batch_input_simple_public_object_id = BatchInputSimplePublicObjectId(
+            inputs=[{"id": str(sandbox_id)} for sandbox_id in sandbox_ids]
+        )
+        try:
+            self.call_api(
+                "sandbox",
+                hs_object_client.batch_api.archive,
+                batch_input_simple_public_object_id=batch_input_simple_public_object_id,
+            )
         except Exception as ex:
+            print("Exception when calling batch_api->archive: %s\n" % ex)
             print(
-                "Dataframe Columns are not correctly named for insertion into object_mappings table. Should be ['sandbox_id','prod_id','hs_object']"
+                f"Archiving {len(sandbox_ids)} {hs_object} one at a time to isolate the failing records"
             )
-            raise
+            archived_ids = []
+            for sandbox_id in sandbox_ids:
+                try:
+                    self.delete_record_by_id(hs_object, sandbox_id)
+                    archived_ids.append(sandbox_id)
+                except Exception as ex:
+                    print(ex)
+                    print(f"Skipping the deletion of {hs_object} with Sandbox ID {sandbox_id}")
+            sandbox_ids = archived_ids
+
+        self.delete_mappings(sandbox_ids)
+        self.metrics.count_records(hs_object, "archived", len(sandbox_ids))
+
+        return sandbox_ids
+
+    def archive_records(self, hs_object, sandbox_ids, chunk_size=100):
+        """Only available for sandbox. Archives sandbox records in batches of up to 100, see archive_record_chunk"""
+        archived_ids = []
+
+        for chunk in chunks(sandbox_ids, chunk_size):
+            archived_ids.extend(self.archive_record_chunk(hs_object, chunk))
+
+        print(len(archived_ids), f"{hs_object} deleted from Sandbox")
+        return archived_ids
+
+    @report_run
+    def clean_up(self, remove_products=False):
+        records_to_delete = self.get_records_to_delete(remove_products)
+
+        deleted_records = []
+
+        if records_to_delete:
+            with ThreadPoolExecutor(
+                max_workers=min(len(records_to_delete), self.pool_size)
+            ) as executor:
+                for archived_ids in executor.map(
+                    self.archive_records,
+                    records_to_delete.keys(),
+                    records_to_delete.values(),
+                ):
+                    deleted_records.extend(archived_ids)
+
+        self.delete_all_associations()
+
+        print(len(deleted_records), "records deleted from Sandbox")
+        self.finish_clean_up(records_to_delete, deleted_records)
+
+    def finish_clean_up(self, records_to_delete, deleted_records):
+        """
+        Drops the SQLite tables once every record clean_up set out to delete has been archived. Otherwise the mappings
+        of the records left are kept, so that running clean_up again retries them, and a RuntimeError is raised.
+        """
+        records_left = sum(len(sandbox_ids) for sandbox_ids in records_to_delete.values()) - len(deleted_records)
+        if records_left:
+            raise RuntimeError(
+                f"{records_left} records could not be archived from Sandbox. "
+                "Their mappings are kept, run clean_up again to retry them"
+            )
+        self.clear_sqlite()
+
+    def get_association_types(self, table="prod_associations"):
+        return [
+            {
+                "hs_association_string": hs_association_string,
+                "from_object": from_object,
+                "to_object": to_object,
+            }
+            for hs_association_string, from_object, to_object in self.mapping_store.get_association_types(
+                table
+            )
+        ]
+
+    @report_run
+    def create_all_associations(self):
+        """Creates the associations of every type in prod_associations, with association types running concurrently"""
+        association_types = self.get_association_types("prod_associations")
+
+        if association_types:
+            with ThreadPoolExecutor(
+                max_workers=min(len(association_types), self.pool_size)
+            ) as executor:
+                list(executor.map(self.create_associations_of_type, association_types))
+
+        return True
+
+    def create_associations_of_type(self, association_row, chunk_size=100):
+        print(
+            f"Inserting associations of type {association_row['hs_association_string']}"
+        )
 
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
-        df.to_sql(
-            f"object_mappings_{portal_id}", con=conn, if_exists="append", index=False
+        associations = self.mapping_store.get_sandbox_associations_to_create(
+            association_row["hs_association_string"]
         )
-        conn.commit()
-        conn.close()
 
-        print(len(df), f"records uploaded to object_mappings_{portal_id} table")
+        created_associations = []
+        for chunk in chunks(associations, chunk_size):
+            created_associations.extend(
+                self.create_association_chunk(association_row, chunk)
+            )
+
+        print(
+            len(created_associations), "records uploaded to sandbox associations table"
+        )
+        return created_associations
 
-    def insert_prod_associations(self, df):
+    @in_phase("association_creation")
+    def create_association_chunk(self, association_row, associations):
         """
-        df must have five columns:
-        prod_from_id: integer id of the left-hand object on the association in prod
-        prod_to_id: integer id of the right-hand object on the association in prod
-        from_object: object type of the left-hand object on the association in prod
-        to_object: object type of the right-hand object on the association in prod
-        hs_association_string: string that Hubspot expects when creating an association
+        Creates up to 100 associations of one type with one batch_api.create call and records in sandbox_associations
+        the ones Hubspot reports as created. Associations listed in the errors of a partly failed (207) batch are left out.
+        A chunk rejected as invalid (400) is split in half and each half retried, down to single associations,
+        so only the associations Hubspot rejects are left out. Any other error is raised.
         """
-        portal_id = self.sandbox_portal_id
+        from hubspot.crm.associations import BatchInputPublicAssociation
 
+        input_sandbox_associations = []
+
+        for sandbox_from_id, sandbox_to_id, _, _, hs_association_string in associations:
+            new_rec = {
+                "from": {"id": sandbox_from_id},
+                "to": {"id": sandbox_to_id},
+                "type": hs_association_string,
+            }
+            input_sandbox_associations.append(new_rec)
+
+        sandbox_client = self.get_hubspot_client("associations", environment="sandbox")
+
+        batch_input_public_association = BatchInputPublicAssociation(
+            inputs=input_sandbox_associations
+        )
         try:
-            assert list(df.columns) == [
-                "prod_from_id",
-                "prod_to_id",
-                "from_object",
-                "to_object",
-                "hs_association_string",
+            api_response = self.call_api(
+                "sandbox",
+                sandbox_client.batch_api.create,
+                from_object_type=association_row["from_object"],
+                to_object_type=association_row["to_object"],
+                batch_input_public_association=batch_input_public_association,
+            )
+        except Exception as e:
+            if getattr(e, "status", None) != 400:
+                raise
+            print("Exception when calling batch_api->create: %s\n" % e)
+            if len(associations) == 1:
+                print(f"Skipping the creation of association {associations[0]}")
+                return []
+            half = len(associations) // 2
+            return self.create_association_chunk(
+                association_row, associations[:half]
+            ) + self.create_association_chunk(association_row, associations[half:])
+
+        for error in getattr(api_response, "errors", None) or []:
+            print(f"Association of type {association_row['hs_association_string']} not created: {error.message}")
+        created_pairs = {
+            pair
+            for result in getattr(api_response, "results", None) or []
+            for pair in [
+                (str(result._from.id), str(result.to.id)),
+                (str(result.to.id), str(result._from.id)),
             ]
-        except Exception as ex:
+        }
+        associations = [
+            row for row in associations if (str(row[0]), str(row[1])) in created_pairs
+        ]
+
+        self.mapping_store.insert_sandbox_associations(associations)
+        self.metrics.count_records("associations", "created", len(associations))
+        return associations
+
+    def delete_all_associations(self):
+        for association_row in self.get_association_types("sandbox_associations"):
+            self.delete_associations_of_type(association_row)
+
+        return True
+
+    @in_phase("archive")
+    def delete_associations_of_type(self, association_row):
+        from hubspot.crm.associations import BatchInputPublicAssociation
+
+        print(
+            f"Deleting associations of type {association_row['hs_association_string']}"
+        )
+
+        associations = self.mapping_store.get_sandbox_associations(
+            association_row["hs_association_string"]
+        )
+
+        input_sandbox_associations = []
+        for sandbox_from_id, sandbox_to_id, _, _, hs_association_string in associations:
+            new_rec = {
+                "from": {"id": sandbox_from_id},
+                "to": {"id": sandbox_to_id},
+                "type": hs_association_string,
+            }
+            input_sandbox_associations.append(new_rec)
+
+        sandbox_client = self.get_hubspot_client("associations", environment="sandbox")
+        batch_input_public_association = BatchInputPublicAssociation(
+            inputs=input_sandbox_associations
+        )
+        try:
+            self.call_api(
+                "sandbox",
+                sandbox_client.batch_api.archive,
+                from_object_type=association_row["from_object"],
+                to_object_type=association_row["to_object"],
+                batch_input_public_association=batch_input_public_association,
+            )
+        except Exception as e:
+            print("Exception when calling batch_api->archive: %s\n" % e)
+
+        self.mapping_store.delete_sandbox_associations(
+            association_row["hs_association_string"]
+        )
+        self.metrics.count_records("associations", "archived", len(associations))
+        print(f"{len(associations)} Associations deleted")
+
+    def replace_with_fake_data(self, property_json, hs_object, prod_id=None):
+        """Fake data for one record's properties, see FakeDataGenerator. Pass prod_id to make it deterministic"""
+        return self.fake_data_generator.fake_properties(
+            hs_object, property_json, prod_id
+        )
+
+    def confirm_environments(self):
+        print("Confirming that Sandbox API Key is for a Hubspot Sandbox Instance")
+        try:
+            assert is_sandbox(self.sandbox_api_key, self.host)
+        except Exception:
+            print(
+                "API Key provided for Sandbox is not actually a Sandbox Hubspot Instance"
+            )
+            raise
+
+        print("Confirming that Prod API Key is for a Hubspot Production Instance")
+        try:
+            assert is_production(self.prod_api_key, self.host)
+        except Exception:
             print(
-                "Dataframe Columns are not correctly named for insertion into object_mappings table. Should be ['prod_from_id','prod_to_id','from_object','to_object','hs_association_string']"
+                "API Key provided for Prod is not actually a Production Hubspot Instance"
             )
             raise
 
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
-        df.to_sql(
-            f"prod_associations_{portal_id}", con=conn, if_exists="append", index=False
-        )
-        conn.commit()
-        conn.close()
+    def confirm_properties(self, hs_object, properties):
+        """The properties to migrate, those of properties that exist in both portals, see get_migratable_properties"""
+        print("Confirming that Properties Provided Match Object Properties")
+        properties = self.get_migratable_properties(hs_object, properties)
+        if not properties:
+            raise ValueError(
+                f"None of the properties provided can be migrated on object {hs_object}"
+            )
+        return properties
+
+    def get_product_mapping_dict(self, prod_products=None):
+        return {
+            str(prod_id): str(sandbox_id)
+            for prod_id, sandbox_id in self.create_product_mapping(prod_products).items()
+        }
+
+    @in_phase("transform")
+    def prepare_records(
+        self, hs_object, object_records, fake_data=False, product_mapping_dict=None
+    ):
+        """Applies fake data and remaps line item products on prod records before they are created in sandbox"""
+        if fake_data:
+            self.fake_data_generator.fake_records(hs_object, object_records)
+
+        if hs_object == "line_items":
+            for rec in object_records:
+                properties = rec["properties"]
+                properties["hs_product_id"] = product_mapping_dict[
+                    properties["hs_product_id"]
+                ]
+
+        return object_records
+
+    def iter_migration_pages(
+        self,
+        hs_object,
+        limit,
+        properties,
+        associations=[],
+        resume=False,
+        filter_groups=[],
+        sorts=[],
+    ):
+        """
+        Generator over pages of prod records of hs_object for migrate_object that checkpoints as it goes:
+        each page is marked as fetched and the paging cursor moved past it in one transaction.
+        With resume, records an earlier run fetched but did not finish are read again first,
+        then paging continues from the saved cursor.
+        With filter_groups or sorts, records are found with the search API, see iter_search_pages.
+        """
+        checkpoint = None
+        if resume:
+            checkpoint = self.mapping_store.get_checkpoint(hs_object, "pages")
+        after, records_fetched, completed = checkpoint or (None, 0, False)
+
+        if resume:
+            unfinished_ids = self.mapping_store.get_record_ids(
+                hs_object, ["fetched", "created"]
+            )
+            if unfinished_ids:
+                print(f"Resuming {len(unfinished_ids)} unfinished {hs_object}")
+                yield from self.batch_read_records(
+                    "prod", hs_object, unfinished_ids, properties, associations
+                )
+
+        if completed or (limit is not None and records_fetched >= limit):
+            return
+
+        def checkpoint_page(records, next_after):
+            nonlocal records_fetched
+            records_fetched += len(records)
+            self.mapping_store.save_checkpoint(
+                hs_object,
+                "pages",
+                after=next_after,
+                records_done=records_fetched,
+                completed=next_after is None
+                or (limit is not None and records_fetched >= limit),
+                prod_ids=[rec["id"] for rec in records],
+            )
+
+        if filter_groups or sorts:
+            yield from self.iter_search_pages(
+                hs_object,
+                None if limit is None else limit - records_fetched,
+                properties,
+                filter_groups,
+                sorts,
+                associations,
+                environment="prod",
+                after=after,
+                on_page=checkpoint_page,
+            )
+            return
+
+        yield from self.iter_object_pages(
+            hs_object,
+            None if limit is None else limit - records_fetched,
+            properties,
+            associations,
+            environment="prod",
+            after=after,
+            on_page=checkpoint_page,
+        )
+
+    def split_mapped_records(self, hs_object, object_records):
+        """(records with no sandbox copy yet, records already mapped to a sandbox record)"""
+        records_to_create = []
+        mapped_records = []
+        for rec in object_records:
+            if self.is_mapped(hs_object, rec["id"]):
+                mapped_records.append(rec)
+            else:
+                records_to_create.append(rec)
+        return records_to_create, mapped_records
+
+    def update_mapped_records(self, hs_object, mapped_records):
+        """Batch updates the sandbox copies of records already mapped, see batch_update_records"""
+        sandbox_ids = self.mapping_store.get_sandbox_ids(
+            hs_object, [rec["id"] for rec in mapped_records]
+        )
+        return self.batch_update_records(hs_object, mapped_records, sandbox_ids)
+
+    def start_association_walk(
+        self, hs_object, max_depth=DEFAULT_WALK_DEPTH, max_records=None, include_anchor=False
+    ):
+        """
+        AssociationGraphWalk out from records of hs_object into every object in the object config but products,
+        max_depth associations away (None for no limit). The walk never comes back into hs_object, so limit alone
+        bounds the hs_object records migrated, unless include_anchor: then it also follows associations back into
+        other records of hs_object, e.g. the other contacts of the companies of the contacts migrated.
+        """
+        hs_objects = [hs_obj for hs_obj in object_config if hs_obj != "products"]
+        if not include_anchor:
+            hs_objects.remove(hs_object)
+        return AssociationGraphWalk(hs_objects, max_depth, max_records)
+
+    def get_walk_ids_to_read(self, walk, depth, hs_object, prod_ids, update_existing=False):
+        """
+        The prod_ids of hs_object reached at depth of walk that need reading from prod. Records an earlier run
+        already copied to sandbox along with their associations are left out, unless update_existing, and the records
+        associated with them are queued from prod_associations instead.
+        """
+        if update_existing:
+            return prod_ids
+        finished_ids = [
+            oid
+            for oid in self.mapping_store.get_record_ids(hs_object, ["associated"], prod_ids)
+            if self.is_mapped(hs_object, oid)
+        ]
+        walk.add_neighbours(
+            self.mapping_store.get_associated_record_keys(hs_object, finished_ids), depth
+        )
+        finished_ids = set(finished_ids)
+        return [oid for oid in prod_ids if str(oid) not in finished_ids]
+
+    def iter_walk_pages(
+        self, walk, depth, hs_object, prod_ids, properties, update_existing=False, chunk_size=500
+    ):
+        """
+        Generator over pages of the prod records of hs_object reached at depth of walk, read with batch_read_records,
+        queuing the records associated with them for the next depth. See get_walk_ids_to_read for the records left out.
+        """
+        associations = [obj for obj in object_config.keys() if obj != hs_object]
+        for chunk in chunks(prod_ids, chunk_size):
+            ids_to_read = self.get_walk_ids_to_read(
+                walk, depth, hs_object, chunk, update_existing
+            )
+            yield from walk.iter_pages(
+                hs_object,
+                self.batch_read_records(
+                    "prod", hs_object, ids_to_read, properties, associations
+                ),
+                depth,
+            )
+
+    def seed_resumed_walk(self, walk, hs_object):
+        """
+        Queues the records associated with the records of hs_object an interrupted migration already finished,
+        which a resumed migration does not read again. Nothing is queued once the walk itself has completed,
+        as its records would otherwise be taken for anchors and walked one level too deep.
+        """
+        if self.is_phase_completed(hs_object, "walk"):
+            return
+        finished_ids = self.mapping_store.get_record_ids(hs_object, ["associated"])
+        walk.visit(hs_object, finished_ids)
+        walk.add_neighbours(
+            self.mapping_store.get_associated_record_keys(hs_object, finished_ids), 0
+        )
+
+    def complete_records(self, hs_object, object_records):
+        """
+        Stores the prod associations of records that have been created in sandbox and marks them as associated.
+        Records with no sandbox copy, because their create failed, keep their status so a resumed migration retries them.
+        """
+        object_records = [rec for rec in object_records if self.is_mapped(hs_object, rec["id"])]
+        associations = self.get_prod_associations(object_records, hs_object)
+        self.mapping_store.complete_records(
+            hs_object,
+            [rec["id"] for rec in object_records],
+            associations,
+        )
+        print(
+            len(associations),
+            f"records uploaded to prod_associations_{self.sandbox_portal_id} table",
+        )
+
+    def is_phase_completed(self, hs_object, phase):
+        checkpoint = self.mapping_store.get_checkpoint(hs_object, phase)
+        return checkpoint is not None and checkpoint[2]
+
+    def complete_phase(self, hs_object, phase):
+        self.mapping_store.save_checkpoint(hs_object, phase, completed=True)
+
+    def get_association_types_to_create(self, hs_object, resume=False):
+        """Association types in prod_associations, leaving out those already created in this migration when resuming"""
+        return [
+            association_row
+            for association_row in self.get_association_types("prod_associations")
+            if not (
+                resume
+                and self.is_phase_completed(
+                    hs_object,
+                    f"associations:{association_row['hs_association_string']}",
+                )
+            )
+        ]
+
+    def create_checkpointed_associations(self, hs_object, association_row):
+        self.create_associations_of_type(association_row)
+        self.complete_phase(
+            hs_object, f"associations:{association_row['hs_association_string']}"
+        )
+
+    def save_initial_watermarks(self, hs_object, include_associations=False):
+        """
+        Starts the sync_object watermark of hs_object (and of its associated objects) at the time a migration
+        starts, so a later sync picks up every change made after the records were copied
+        """
+        started_at = int(time.time() * 1000)
+        hs_objects = [hs_object]
+        if include_associations:
+            hs_objects += self.get_associated_object_types(hs_object)
+        for hs_obj in hs_objects:
+            self.mapping_store.save_watermark(hs_obj, started_at, replace=False)
+
+    def get_associated_object_types(self, hs_object):
+        """Objects in the object config to pull in when migrating hs_object with its associations, in migration order"""
+        return [
+            hs_obj
+            for hs_obj in object_config
+            if hs_obj != "products" and hs_obj != hs_object
+        ]
+
+    def migrate_pages(
+        self,
+        hs_object,
+        pages,
+        fake_data=False,
+        product_mapping_dict=None,
+        queue_size=4,
+        update_existing=False,
+    ):
+        """
+        Streams pages of prod records through three stages connected by bounded queues:
+        fetching from prod and transforming (fake data, product remapping) each run on a background thread,
+        while batched sandbox creation runs here. Creation starts with the first page and at most
+        queue_size pages wait between stages, so memory stays flat however many records are migrated.
+        Records that already have a sandbox copy are not created again, and with update_existing their copy is updated.
+        Returns the number of records created.
+        """
+        fetched_pages = iter_in_background(pages, queue_size)
+        prepared_pages = iter_in_background(
+            (
+                self.prepare_records(
+                    hs_object, object_records, fake_data, product_mapping_dict
+                )
+                for object_records in fetched_pages
+            ),
+            queue_size,
+        )
+
+        records_created = 0
+        for object_records in prepared_pages:
+            records_to_create, mapped_records = self.split_mapped_records(
+                hs_object, object_records
+            )
+            if records_to_create:
+                records_created += len(
+                    self.batch_create_records(hs_object, records_to_create)
+                )
+            if update_existing and mapped_records:
+                self.update_mapped_records(hs_object, mapped_records)
+
+            self.complete_records(hs_object, object_records)
+
+        return records_created
+
+    def plan_product_mapping(self, api_calls):
+        """
+        Adds the API calls of get_product_mapping_dict to api_calls, reading only product IDs: a page of the prod
+        catalogue per 100 products, and if any prod products are not mapped yet, a page of the sandbox catalogue
+        per 100 products and at most one create per 100 new products. Returns the number of new prod products.
+        """
+        prod_ids = [
+            rec["id"]
+            for records in self.iter_object_pages("products", None, ["hs_object_id"], environment="prod")
+            for rec in records
+        ]
+        api_calls[("prod", "crm.products.basic_api.get_page")] += max(math.ceil(len(prod_ids) / 100), 1)
+
+        new_products = [oid for oid in prod_ids if not self.is_mapped("products", oid)]
+        if new_products:
+            sandbox_products = sum(
+                len(records)
+                for records in self.iter_object_pages("products", None, ["hs_object_id"], environment="sandbox")
+            )
+            api_calls[("sandbox", "crm.products.basic_api.get_page")] += max(math.ceil(sandbox_products / 100), 1)
+            api_calls[("sandbox", "crm.products.batch_api.create")] += math.ceil(len(new_products) / 100)
+        return len(new_products)
+
+    @report_run
+    def plan_migration(
+        self,
+        hs_object,
+        include_associations=False,
+        limit=100,
+        update_existing=False,
+        filter_groups=None,
+        sorts=None,
+        max_depth=DEFAULT_WALK_DEPTH,
+        max_records=None,
+        include_anchor=False,
+    ):
+        """
+        Dry run of migrate_object with the same arguments: reads only the IDs and associations of the records
+        it would migrate, builds their record and association graph in memory and writes nothing, to the sandbox
+        or to the mapping tables. Prints and returns the plan:
+        - records: per object, the prod records found, how many would be created, and how many already have a
+          sandbox copy (updated with update_existing, skipped otherwise)
+        - associations: per association type, the associations between records that would be mapped
+        - api_calls: per environment and endpoint, the calls the batched migration would make, and their
+          total per environment against what is left of the daily limit
+        - estimated_seconds: per environment, the longer of the time the rate limiter needs to allow those
+          calls and the time they take at the latency measured while planning. The total adds both environments
+          up, an upper bound since reading prod and writing to sandbox overlap
+        Products are counted as created when they are not mapped yet, although some may be matched in sandbox.
+        """
+        assert hs_object in object_config.keys()
+
+        if filter_groups is None:
+            filter_groups = object_config[hs_object].get("filter_groups", [])
+        if sorts is None:
+            sorts = object_config[hs_object].get("sorts", [])
+
+        self.load_mapped_prod_ids()
+
+        api_calls = collections.Counter()
+        records = {}
+        planned_ids = set()
+        edges = set()
+        walk = self.start_association_walk(
+            hs_object, max_depth, max_records, include_anchor
+        )
+
+        def add_records(hs_obj, object_records):
+            """Adds a page of records and their associations to the graph, with the sandbox writes migrate_pages would make for it"""
+            counts = records.setdefault(hs_obj, {"found": 0, "to_create": 0, "mapped": 0})
+            mapped = [rec for rec in object_records if self.is_mapped(hs_obj, rec["id"])]
+            counts["found"] += len(object_records)
+            counts["to_create"] += len(object_records) - len(mapped)
+            counts["mapped"] += len(mapped)
+            api_calls[("sandbox", f"crm.{hs_obj}.batch_api.create")] += math.ceil(
+                (len(object_records) - len(mapped)) / 100
+            )
+            if update_existing:
+                api_calls[("sandbox", f"crm.{hs_obj}.batch_api.update")] += math.ceil(len(mapped) / 100)
+            planned_ids.update((hs_obj, str(rec["id"])) for rec in object_records)
+
+            for edge in self.get_prod_associations(object_records, hs_obj):
+                prod_from_id, prod_to_id, from_object, to_object, hs_association_string = edge
+                reverse_string = ASSOCIATION_TYPES.get(hs_association_string, (None, None, None))[2]
+                reverse_edge = (to_object, str(prod_to_id), from_object, str(prod_from_id), reverse_string)
+                if reverse_edge not in edges:
+                    edges.add((from_object, str(prod_from_id), to_object, str(prod_to_id), hs_association_string))
+
+        print(f"Planning the migration of {hs_object}")
+        associations = [k for k in object_config.keys() if k != hs_object]
+        if filter_groups or sorts:
+            pages = self.iter_search_pages(
+                hs_object, limit, ["hs_object_id"], filter_groups, sorts, associations
+            )
+            page_calls = {f"crm.{hs_object}.search_api.do_search": 1, "crm.associations.batch_api.read": len(associations)}
+        else:
+            pages = self.iter_object_pages(hs_object, limit, ["hs_object_id"], associations)
+            page_calls = {f"crm.{hs_object}.basic_api.get_page": 1}
+        for object_records in pages:
+            for endpoint, calls in page_calls.items():
+                api_calls[("prod", endpoint)] += calls
+            add_records(hs_object, object_records)
+            if include_associations:
+                walk.add_records(hs_object, object_records, 0)
+
+        # the same walk migrate_object takes, reading only the associations of the records it reaches
+        for depth, hs_obj, prod_ids in walk.iter_frontiers():
+            associations = [obj for obj in object_config.keys() if obj != hs_obj]
+            for chunk in chunks(prod_ids, 500):
+                ids_to_read = self.get_walk_ids_to_read(walk, depth, hs_obj, chunk, update_existing)
+                for read_chunk in chunks(ids_to_read, 100):
+                    object_records = [{"id": oid} for oid in read_chunk]
+                    self.read_associations("prod", hs_obj, object_records, associations)
+                    api_calls[("prod", f"crm.{hs_obj}.batch_api.read")] += 1
+                    api_calls[("prod", "crm.associations.batch_api.read")] += len(associations)
+                    add_records(hs_obj, object_records)
+                    walk.add_records(hs_obj, object_records, depth)
+
+        for hs_obj in records:
+            for environment, portal_id in [("prod", self.prod_portal_id), ("sandbox", self.sandbox_portal_id)]:
+                if self.mapping_store.get_property_schema(portal_id, hs_obj, self.schema_ttl) is None:
+                    api_calls[(environment, "crm.properties.core_api.get_all")] += 1
+
+        if "line_items" in records:
+            records["products"] = {
+                "found": None,
+                "to_create": self.plan_product_mapping(api_calls),
+                "mapped": None,
+            }
+
+        association_counts = collections.Counter()
+        if include_associations:
+            # associations are created for every prod association stored with both records mapped, those of
+            # earlier runs included, and for the new associations of the records this migration creates
+            association_counts.update(self.mapping_store.count_sandbox_associations_to_create())
+            for from_object, prod_from_id, to_object, prod_to_id, hs_association_string in edges:
+                ends = [(from_object, prod_from_id), (to_object, prod_to_id)]
+                if all(self.is_mapped(*end) for end in ends):
+                    continue
+                if all(end in planned_ids or self.is_mapped(*end) for end in ends):
+                    association_counts[(from_object, to_object, hs_association_string)] += 1
+            for (from_object, to_object, _), count in association_counts.items():
+                api_calls[("sandbox", "crm.associations.batch_api.create")] += math.ceil(count / 100)
+
+        calls_per_environment = collections.Counter()
+        search_calls_per_environment = collections.Counter()
+        for (environment, endpoint), calls in api_calls.items():
+            calls_per_environment[environment] += calls
+            if is_search_endpoint(endpoint):
+                search_calls_per_environment[environment] += calls
+
+        mean_latency = self.metrics.mean_latency("prod") or 0.0
+        estimated_seconds = {}
+        for environment in ["prod", "sandbox"]:
+            rate_limiter = self.rate_limiters[environment]
+            calls = calls_per_environment[environment]
+            rate_seconds = max(calls - rate_limiter.burst_limit, 0) / rate_limiter.max_rate
+            search_rate_limiter = self.search_rate_limiters[environment]
+            search_calls = search_calls_per_environment[environment]
+            rate_seconds = max(
+                rate_seconds,
+                max(search_calls - search_rate_limiter.burst_limit, 0) / search_rate_limiter.max_rate,
+            )
+            latency_seconds = calls * (self.metrics.mean_latency(environment) or mean_latency)
+            estimated_seconds[environment] = round(max(rate_seconds, latency_seconds), 1)
+        estimated_seconds["total"] = round(sum(estimated_seconds.values()), 1)
+
+        plan = {
+            "hs_object": hs_object,
+            "include_associations": include_associations,
+            "limit": limit,
+            "records": records,
+            "associations": {
+                hs_association_string: count
+                for (_, _, hs_association_string), count in sorted(association_counts.items())
+            },
+            "api_calls": {
+                f"{environment} {endpoint}": calls
+                for (environment, endpoint), calls in sorted(api_calls.items())
+                if calls
+            },
+            "calls_per_environment": {
+                environment: {
+                    "calls": calls_per_environment[environment],
+                    "daily_remaining": self.rate_limiters[environment].daily_remaining,
+                }
+                for environment in ["prod", "sandbox"]
+            },
+            "estimated_seconds": estimated_seconds,
+        }
+        self.print_plan(plan)
+        return plan
+
+    def print_plan(self, plan):
+        print(f"\nPlan for migrating {plan['hs_object']}")
+        print(f"{'object':<15}{'found':>10}{'to create':>12}{'mapped':>10}")
+        for hs_obj, counts in plan["records"].items():
+            found = "" if counts["found"] is None else counts["found"]
+            mapped = "" if counts["mapped"] is None else counts["mapped"]
+            print(f"{hs_obj:<15}{found:>10}{counts['to_create']:>12}{mapped:>10}")
+        for hs_association_string, count in plan["associations"].items():
+            print(f"{count} {hs_association_string} associations")
+        print("API calls:")
+        for endpoint, calls in plan["api_calls"].items():
+            print(f"  {endpoint}: {calls}")
+        for environment, calls in plan["calls_per_environment"].items():
+            print(
+                f"{calls['calls']} {environment} calls, of {calls['daily_remaining']} left today"
+            )
+        m, s = divmod(plan["estimated_seconds"]["total"], 60)
+        print(f"Estimated duration: {m:.0f} min {s:.0f} sec")
+
+    @report_run
+    def migrate_object(
+        self,
+        hs_object,
+        properties=[],
+        include_associations=False,
+        limit=100,
+        fake_data=False,
+        resume=False,
+        update_existing=False,
+        filter_groups=None,
+        sorts=None,
+        max_depth=DEFAULT_WALK_DEPTH,
+        max_records=None,
+        include_anchor=False,
+    ):
+
+        """
+        hs_object: Which HS Object you are migrating, can be any of ['companies','deals','contacts','line_items','products']
+        properties: If you want to not use the object_config, you can identify the list of properties you want migrated here
+        include_associations: if you want all associated records in the tree migrated (i.e. all companies and deals associated with the contacts migrated), then select True
+        limit: Maximum number of records to migrate, make this None if you intend to migrate all items
+        fake_data: If you want personally identifiable information like name, address, email, phone to be replaced with fake data, select True
+        resume: If an earlier migration of hs_object was interrupted, select True to skip the work it finished and continue from its last checkpoint
+        update_existing: Records an earlier run already copied to sandbox are skipped, select True to update their sandbox copies instead
+        filter_groups: Search API filter groups that select which records of hs_object are migrated, defaults to the object_config's "filter_groups"
+        sorts: Search API sorts for the order records of hs_object are migrated in, defaults to the object_config's "sorts"
+        max_depth: With include_associations, how many associations away from the hs_object records migrated their associated records are followed, None for no limit.
+            The default of 2 brings in, for contacts, their companies and deals and the line items of those deals
+        max_records: With include_associations, the most associated records to migrate, None for no limit
+        include_anchor: With include_associations, select True for the walk to also bring in other hs_object records, e.g. the other contacts of those companies. See start_association_walk
+        """
+        assert hs_object in object_config.keys()
+
+        if not properties:
+            try:
+                #                 print(f"No properties provided. Attempting to utilize default properties for {hs_object}")
+                properties = object_config[hs_object]["properties"]
+            except Exception:
+                print("Unable to use default properties for object provided")
+                raise
+
+        if filter_groups is None:
+            filter_groups = object_config[hs_object].get("filter_groups", [])
+        if sorts is None:
+            sorts = object_config[hs_object].get("sorts", [])
+
+        self.confirm_environments()
+        properties = self.confirm_properties(hs_object, properties)
+
+        self.setup_sqlite()
+        if resume:
+            print(f"Resuming migration of {hs_object} from its last checkpoint")
+        else:
+            self.mapping_store.reset_checkpoints(hs_object)
+        self.save_initial_watermarks(hs_object, include_associations)
+        self.load_mapped_prod_ids()
+
+        product_mapping_dict = None
+        if hs_object == "line_items":
+            product_mapping_dict = self.get_product_mapping_dict()
+
+        print(f"Migrating {hs_object} from Production to Sandbox")
+
+        associations = [k for k in object_config.keys() if k != hs_object]
+
+        pages = self.iter_migration_pages(
+            hs_object,
+            limit,
+            properties,
+            associations,
+            resume,
+            filter_groups,
+            sorts,
+        )
+        if include_associations:
+            walk = self.start_association_walk(
+                hs_object, max_depth, max_records, include_anchor
+            )
+            if resume:
+                self.seed_resumed_walk(walk, hs_object)
+            pages = walk.iter_pages(hs_object, pages, 0)
+
+        records_migrated = self.migrate_pages(
+            hs_object,
+            pages,
+            fake_data,
+            product_mapping_dict,
+            update_existing=update_existing,
+        )
+
+        if include_associations:
+            for depth, hs_obj, prod_ids in walk.iter_frontiers():
+                if hs_obj == "line_items" and product_mapping_dict is None:
+                    product_mapping_dict = self.get_product_mapping_dict()
+
+                print(
+                    f"Migrating {len(prod_ids)} {hs_obj} {depth} association(s) away from the {hs_object} from Production to Sandbox"
+                )
+
+                self.migrate_pages(
+                    hs_obj,
+                    self.iter_walk_pages(
+                        walk,
+                        depth,
+                        hs_obj,
+                        prod_ids,
+                        self.get_object_properties(hs_obj),
+                        update_existing,
+                    ),
+                    fake_data,
+                    product_mapping_dict,
+                    update_existing=update_existing,
+                )
+            self.complete_phase(hs_object, "walk")
+
+            association_types = self.get_association_types_to_create(
+                hs_object, resume
+            )
+            if association_types:
+                with ThreadPoolExecutor(
+                    max_workers=min(len(association_types), self.pool_size)
+                ) as executor:
+                    list(
+                        executor.map(
+                            partial(self.create_checkpointed_associations, hs_object),
+                            association_types,
+                        )
+                    )
+
+        if include_associations:
+            print(
+                f"Successfully migrated {records_migrated} {hs_object} and their associated objects"
+            )
+        else:
+            print(f"Successfully migrated {records_migrated} {hs_object}")
+
+    @report_run
+    def sync_object(self, hs_object, properties=[], fake_data=False, filter_groups=None):
+        """
+        Brings sandbox up to date with the changes made to hs_object in prod since the last sync (or since it
+        was first migrated). Modified records are found with the search API, oldest first; those that already
+        have a mapping are batch updated in sandbox and the rest batch created, so the API calls made scale
+        with what changed rather than with the size of the portal. Associations are not synced.
+        The search reads records modified at the watermark again, as others may have been modified in the same
+        millisecond since, so the records already synced at the watermark are kept with it and skipped.
+
+        hs_object: Which HS Object you are syncing, can be any of ['companies','deals','contacts','line_items','products']
+        properties: If you want to not use the object_config, you can identify the list of properties you want synced here
+        fake_data: If you want personally identifiable information like name, address, email, phone to be replaced with fake data, select True
+        filter_groups: Search API filter groups the changed records must match to be synced, defaults to the object_config's "filter_groups"
+            so that a sync of a filtered migration only brings in records the migration would have
+        """
+        assert hs_object in object_config.keys()
+
+        if not properties:
+            properties = object_config[hs_object]["properties"]
+        if filter_groups is None:
+            filter_groups = object_config[hs_object].get("filter_groups", [])
 
-        print(len(df), f"records uploaded to prod_associations_{portal_id} table")
+        self.confirm_environments()
+        properties = self.confirm_properties(hs_object, properties)
 
-    def insert_sandbox_associations(self, df):
-        """
-        df must have five columns:
-        sandbox_from_id: integer id of the left-hand object on the association in prod
-        sandbox_to_id: integer id of the right-hand object on the association in prod
-        from_object: object type of the left-hand object on the association in prod
-        to_object: object type of the right-hand object on the association in prod
-        hs_association_string: string that Hubspot expects when creating an association
-        """
-        portal_id = self.sandbox_portal_id
+        self.setup_sqlite()
 
-        try:
-            assert list(df.columns) == [
-                "sandbox_from_id",
-                "sandbox_to_id",
-                "from_object",
-                "to_object",
-                "hs_association_string",
+        watermark = self.mapping_store.get_watermark(hs_object)
+        if watermark is None:
+            print(f"No watermark found for {hs_object}, syncing every record")
+        synced_at_watermark = self.mapping_store.get_watermark_ids(hs_object)
+
+        product_mapping_dict = None
+        if hs_object == "line_items":
+            product_mapping_dict = self.get_product_mapping_dict()
+
+        print(f"Syncing {hs_object} from Production to Sandbox")
+
+        records_updated = 0
+        records_created = 0
+        for object_records in self.iter_modified_records(
+            hs_object, properties, since=watermark, filter_groups=filter_groups
+        ):
+            modified = {rec["id"]: get_modified_timestamp(rec) for rec in object_records}
+            page_watermark = max(modified.values())
+            object_records = [
+                rec
+                for rec in object_records
+                if modified[rec["id"]] != watermark or rec["id"] not in synced_at_watermark
             ]
-        except Exception as ex:
-            print(
-                "Dataframe Columns are not correctly named for insertion into object_mappings table. Should be ['sandbox_from_id','sandbox_to_id','from_object','to_object','hs_association_string']"
-            )
-            raise
 
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
-        df.to_sql(
-            f"sandbox_associations_{portal_id}",
-            con=conn,
-            if_exists="append",
-            index=False,
-        )
-        conn.commit()
-        conn.close()
+            object_records = self.prepare_records(
+                hs_object, object_records, fake_data, product_mapping_dict
+            )
+            sandbox_ids = self.mapping_store.get_sandbox_ids(
+                hs_object, [rec["id"] for rec in object_records]
+            )
 
-        print(len(df), "records uploaded to sandbox associations table")
+            records_to_update = [rec for rec in object_records if rec["id"] in sandbox_ids]
+            records_to_create = [
+                rec for rec in object_records if rec["id"] not in sandbox_ids
+            ]
+            if records_to_update:
+                records_updated += len(
+                    self.batch_update_records(hs_object, records_to_update, sandbox_ids)
+                )
+            if records_to_create:
+                records_created += len(
+                    self.batch_create_records(hs_object, records_to_create)
+                )
 
-    def get_object_properties_list(self, object_records):
-        object_properties_df = pd.DataFrame([o["properties"] for o in object_records])
-        if "hs_object_id" in list(object_properties_df.columns):
-            object_properties_df = object_properties_df.drop(["hs_object_id"], axis=1)
-        if "lastmodifieddate" in list(object_properties_df.columns):
-            object_properties_df = object_properties_df.drop(
-                ["lastmodifieddate"], axis=1
+            if page_watermark != watermark:
+                watermark, synced_at_watermark = page_watermark, set()
+            synced_at_watermark.update(
+                prod_id for prod_id, modified_at in modified.items() if modified_at == watermark
+            )
+            self.mapping_store.save_watermark(
+                hs_object, watermark, prod_ids=synced_at_watermark
             )
-        if "createdate" in list(object_properties_df.columns):
-            object_properties_df = object_properties_df.drop(["createdate"], axis=1)
 
-        object_properties_list = json.loads(
-            object_properties_df.to_json(orient="records")
+        print(
+            f"Successfully synced {hs_object}: {records_updated} updated and {records_created} created in Sandbox"
         )
-        object_properties_list = [{"properties": r} for r in object_properties_list]
 
-        return object_properties_list
-
-    def get_object_properties(self, hs_object):
-        return self.object_config[hs_object]["properties"]
+    @report_run
+    def export_snapshot(
+        self,
+        path,
+        hs_object,
+        properties=[],
+        include_associations=False,
+        limit=100,
+        fake_data=False,
+        filter_groups=None,
+        sorts=None,
+        max_depth=DEFAULT_WALK_DEPTH,
+        max_records=None,
+        include_anchor=False,
+    ):
+        """
+        Extracts the records migrate_object would read from prod, once, into a snapshot directory at path that
+        load_snapshot can copy into any number of sandboxes without calling prod again. Each object is streamed
+        page by page into its own gzipped JSON Lines file with the records' associations, so memory stays flat
+        however many records are exported. A manifest with the properties and prod property schema of each
+        object is written last; a directory without one is an export that did not finish.
+        Every property that exists in prod is exported, whether this sandbox can write it or not, as load_snapshot
+        sends each sandbox the properties it can write.
+        Snapshots hold prod data as it is, select fake_data to replace personally identifiable information before it is written.
+
+        Takes the same arguments as migrate_object.
+        """
+        assert hs_object in object_config.keys()
 
-    def get_properties(self, hs_object):
-        hs_client = hubspot.Client.create(api_key=self.prod_api_key)
-        return pd.DataFrame(
-            hs_client.crm.properties.core_api.get_all(
-                object_type=hs_object, archived=False
-            ).to_dict()["results"]
+        if not properties:
+            properties = object_config[hs_object]["properties"]
+        if filter_groups is None:
+            filter_groups = object_config[hs_object].get("filter_groups", [])
+        if sorts is None:
+            sorts = object_config[hs_object].get("sorts", [])
+
+        self.confirm_environments()
+        properties = self.get_exportable_properties(hs_object, properties)
+
+        os.makedirs(path, exist_ok=True)
+        exported_at = int(time.time() * 1000)
+        walk = self.start_association_walk(
+            hs_object, max_depth, max_records, include_anchor
         )
 
-    def get_prod_associations(self, object_records):
-        print("Getting Prod Associations")
-        all_associations = []
-        for obj in object_records:
-            try:
-                for k in obj["associations"].keys():
-                    for result in obj["associations"][k]["results"]:
-                        all_associations.append(
-                            {
-                                "prod_from_id": obj["id"],
-                                "prod_to_id": result["id"],
-                                "from_object": result["type"]
-                                .split("_to_")[0]
-                                .replace("y", "ie")
-                                .replace("_unlabeled","")
-                                + "s"
-                                ,
-                                "to_object": result["type"]
-                                .split("_to_")[1]
-                                .replace("y", "ie")
-                                .replace("_unlabeled","")
-                                + "s"
-                                ,
-                                "hs_association_string": result["type"],
-                            }
-                        )
-            except:
-                continue
-
-        prod_associations_df = pd.DataFrame(all_associations)
-        return prod_associations_df
+        def prepare_page(hs_obj, depth, records):
+            if include_associations:
+                walk.add_records(hs_obj, records, depth)
+            if fake_data:
+                self.fake_data_generator.fake_records(hs_obj, records)
 
-    def find_product_mapping(self, product_name):
-        hs_object = "products"
-        sandbox_client = self.get_hubspot_client(hs_object, environment="sandbox")
+        print(f"Exporting {hs_object} from Production to {path}")
 
-        public_object_search_request = PublicObjectSearchRequest(
-            filter_groups=[
-                {
-                    "filters": [
-                        {
-                            "value": product_name,
-                            "propertyName": "name",
-                            "operator": "EQ",
-                        }
-                    ]
-                }
-            ],
-            limit=1,
-        )
-        try:
-            time.sleep(.4)
-            api_response = sandbox_client.search_api.do_search(
-                public_object_search_request=public_object_search_request
-            )
-            result = api_response.to_dict()["results"][0]
-        except Exception as ex:
-            print(ex)
-            print(
-                f"No Product Exists in Sandbox for Production Product: {product_name}"
+        associations = [k for k in object_config.keys() if k != hs_object]
+        if filter_groups or sorts:
+            pages = self.iter_search_pages(
+                hs_object, limit, properties, filter_groups, sorts, associations
             )
-            result = {}
+        else:
+            pages = self.iter_object_pages(hs_object, limit, properties, associations)
 
-        return result
+        objects = {
+            hs_object: {
+                "properties": properties,
+                "records": write_snapshot_records(
+                    path, hs_object, pages, partial(prepare_page, hs_object, 0)
+                ),
+            }
+        }
 
-    def create_product_mapping(self):
-        hs_object = "products"
+        if include_associations:
+            for depth, hs_obj, prod_ids in walk.iter_frontiers():
+                print(
+                    f"Exporting {len(prod_ids)} {hs_obj} {depth} association(s) away from Production to {path}"
+                )
 
-        prod_client = self.get_hubspot_client(hs_object, environment="prod")
+                associations = [obj for obj in object_config.keys() if obj != hs_obj]
+                # records of an object already exported, reached at another depth, go on the end of its file
+                append = hs_obj in objects
+                if not append:
+                    objects[hs_obj] = {
+                        "properties": self.get_exportable_properties(
+                            hs_obj, self.object_config[hs_obj]["properties"]
+                        ),
+                        "records": 0,
+                    }
+                objects[hs_obj]["records"] += write_snapshot_records(
+                    path,
+                    hs_obj,
+                    self.batch_read_records(
+                        "prod",
+                        hs_obj,
+                        prod_ids,
+                        objects[hs_obj]["properties"],
+                        associations,
+                    ),
+                    partial(prepare_page, hs_obj, depth),
+                    append=append,
+                )
 
-        sandbox_client = self.get_hubspot_client(hs_object, environment="sandbox")
+        if "line_items" in objects:
+            print(f"Exporting the product catalogue from Production to {path}")
+            properties = list(
+                dict.fromkeys(object_config["products"]["properties"] + ["name", "hs_sku"])
+            )
+            objects["products"] = {
+                "properties": properties,
+                "records": write_snapshot_records(
+                    path,
+                    "products",
+                    self.iter_object_pages("products", None, properties),
+                ),
+            }
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "prod_portal_id": self.prod_portal_id,
+            "hs_object": hs_object,
+            "exported_at": exported_at,
+            "fake_data": fake_data,
+            "objects": objects,
+            "property_schemas": {
+                hs_obj: self.get_property_schema(hs_obj, "prod") for hs_obj in objects
+            },
+        }
+        with open(os.path.join(path, SNAPSHOT_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        print(
+            "Successfully exported "
+            + ", ".join(f"{info['records']} {hs_obj}" for hs_obj, info in objects.items())
+            + f" to {path}"
+        )
+        return manifest
 
-        try:
-            api_response = prod_client.basic_api.get_page(limit=100, archived=False)
-            results_json = api_response.to_dict()["results"]
-        except ApiException as e:
-            print("Exception when calling basic_api->get_page: %s\n" % e)
-
-        sandbox_responses = []
-
-        for j in results_json:
-            result = self.find_product_mapping(j["properties"]["name"])
-            if result:
-                result["prod_id"] = j["id"]
-                sandbox_responses.append(result)
-            else:
-                prod_id = j["id"]
-                properties = j["properties"]
-                properties.pop("hs_object_id")
-                simple_public_object_input = SimplePublicObjectInput(
-                    properties=properties
-                )
-                try:
-                    time.sleep(.25)
-                    api_response = sandbox_client.basic_api.create(
-                        simple_public_object_input=simple_public_object_input
-                    )
-                    result = api_response.to_dict()
-                    result["prod_id"] = prod_id
-                    sandbox_responses.append(result)
-                except ApiException as e:
-                    print("Exception when calling basic_api->create: %s\n" % e)
+    @report_run
+    def load_snapshot(self, path, fake_data=False, update_existing=False):
+        """
+        Copies a snapshot written by export_snapshot into sandbox through the same pipeline as migrate_object,
+        reading records from the snapshot files instead of prod. Only properties the sandbox can write are sent,
+        and records already copied to this sandbox are skipped (or updated, with update_existing).
+        The sync_object watermarks start at the time of the export, so a later sync catches up on what changed since.
+
+        path: Directory the snapshot was exported to
+        fake_data: If you want personally identifiable information like name, address, email, phone to be replaced with fake data, select True
+        update_existing: Records an earlier run already copied to sandbox are skipped, select True to update their sandbox copies instead
+        """
+        manifest = read_snapshot_manifest(path)
+        if manifest["prod_portal_id"] != self.prod_portal_id:
+            raise ValueError(
+                f"Snapshot at {path} was exported from Prod Instance {manifest['prod_portal_id']}, not {self.prod_portal_id}"
+            )
 
-        sandbox_mappings_df = pd.DataFrame(sandbox_responses)
+        self.confirm_environments()
 
-        sandbox_mappings_df["hs_object"] = hs_object
+        self.setup_sqlite()
+        self.load_mapped_prod_ids()
+
+        hs_object = manifest["hs_object"]
+        objects = manifest["objects"]
+        for hs_obj in objects:
+            self.mapping_store.save_watermark(
+                hs_obj, manifest["exported_at"], replace=False
+            )
 
-        sandbox_mappings_df = sandbox_mappings_df[["id", "prod_id", "hs_object"]]
+        product_mapping_dict = None
+        if "products" in objects:
+            product_mapping_dict = self.get_product_mapping_dict(
+                [rec for records in iter_snapshot_records(path, "products") for rec in records]
+            )
 
-        sandbox_mappings_df.columns = ["sandbox_id", "prod_id", "hs_object"]
+        records_loaded = {}
+        for hs_obj, info in objects.items():
+            if hs_obj == "products":
+                continue
 
-        self.insert_mappings(sandbox_mappings_df)
-        return sandbox_mappings_df
+            print(f"Loading {hs_obj} from {path} to Sandbox")
 
-    def clean_up(self, remove_products=False):
-        portal_id = self.sandbox_portal_id
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
-        if remove_products:
-            records_to_delete_df = pd.read_sql_query(
-                f"""SELECT *
-                                                    FROM object_mappings_{portal_id} 
-                                                    """,
-                conn,
+            properties = self.get_migratable_properties(
+                hs_obj, info["properties"], manifest["property_schemas"][hs_obj]
             )
-        else:
-            records_to_delete_df = pd.read_sql_query(
-                f"""SELECT *
-                                                    FROM object_mappings_{portal_id} 
-                                                    WHERE hs_object != 'products'
-                                                    """,
-                conn,
+            records_loaded[hs_obj] = self.migrate_pages(
+                hs_obj,
+                iter_snapshot_records(path, hs_obj, properties),
+                fake_data,
+                product_mapping_dict,
+                update_existing=update_existing,
             )
-        hs_objects = records_to_delete_df["hs_object"].unique().tolist()
 
-        deleted_records = []
+        if len(objects) > 1:
+            self.create_all_associations()
 
-        for hs_obj in hs_objects:
-            hs_object_client = self.get_hubspot_client(hs_obj, environment="sandbox")
-            records_df = records_to_delete_df[
-                records_to_delete_df["hs_object"] == hs_obj
-            ]
-            for index, row in records_df.iterrows():
-                sandbox_id = row["sandbox_id"]
-                response = self.delete_record_by_id(hs_obj, sandbox_id)
-                deleted_records.append(response)
-                try:
-                    cur.execute(
-                        f"DELETE FROM object_mappings_{portal_id} WHERE sandbox_id = {sandbox_id}"
-                    )
-                    conn.commit()
-                except:
-                    conn.commit()
-                    conn.close()
-                    raise
+        print(
+            "Successfully loaded "
+            + ", ".join(f"{count} {hs_obj}" for hs_obj, count in records_loaded.items())
+            + f" from {path}, anchored on {hs_object}"
+        )
 
-        self.delete_all_associations()
 
-        conn.close()
-        self.clear_sqlite()
-        print(len(deleted_records), "records deleted from Sandbox")
+@decorate_public_methods(report_calls, exclude=UNTIMED_MIGRATOR_METHODS)
+class AsyncHubspotSandboxMigrator(HubspotSandboxMigrator):
+    """
+    Asyncio variant of HubspotSandboxMigrator, where migrate_object and clean_up are coroutines.
+    The hubspot client is blocking, so API calls run on a thread pool with up to `concurrency` requests
+    in flight at once, still paced by the shared rate limiters. SQLite mappings are written the same way
+    as in HubspotSandboxMigrator.
+
+    From a notebook: await migrator.migrate_object(...)
+    From a script: asyncio.run(migrator.migrate_object(...))
+    Call close() when done, or use it as `async with AsyncHubspotSandboxMigrator(...) as migrator:`,
+    to shut its thread pool down.
+    """
 
-    def create_all_associations(self):
-        portal_id = self.sandbox_portal_id
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
+    def __init__(self, prod_api_key, sandbox_api_key, concurrency=10, **kwargs):
+        """
+        concurrency: Maximum number of Hubspot requests in flight at once
+        Other keyword arguments are passed to HubspotSandboxMigrator
+        """
+        kwargs.setdefault("pool_size", concurrency)
+        super().__init__(prod_api_key, sandbox_api_key, **kwargs)
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
 
-        final_associations = []
+    async def __aenter__(self):
+        return self
 
-        distinct_association_types_df = pd.read_sql_query(
-            f"""SELECT DISTINCT 
-                                                                hs_association_string, 
-                                                                from_object, 
-                                                                to_object 
-                                                                FROM prod_associations_{portal_id}""",
-            conn,
-        )
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
 
-        for ix, association_row in distinct_association_types_df.iterrows():
-            print(
-                f"Inserting associations of type {association_row['hs_association_string']}"
-            )
-            associations_df = pd.read_sql_query(
-                f"""SELECT b.sandbox_id as sandbox_from_id,
-                                                     c.sandbox_id as sandbox_to_id,
-                                                     from_object,
-                                                     to_object,
-                                                     hs_association_string
-                                                    FROM prod_associations_{portal_id} as a
-                                                    INNER JOIN object_mappings_{portal_id} as b ON a.prod_from_id = b.prod_id
-                                                    INNER JOIN object_mappings_{portal_id} as c ON a.prod_to_id = c.prod_id
-                                                    WHERE hs_association_string = '{association_row['hs_association_string']}'
-                                """,
-                conn,
-            )
-
-            input_sandbox_associations = []
-
-            for index, row in associations_df.iterrows():
-                new_rec = {
-                    "from": {"id": row["sandbox_from_id"]},
-                    "to": {"id": row["sandbox_to_id"]},
-                    "type": row["hs_association_string"],
-                }
-                input_sandbox_associations.append(new_rec)
+    def close(self):
+        """Shuts down the thread pool the blocking calls run on, once the calls on it have finished"""
+        self.executor.shutdown(wait=True)
 
-            sandbox_client = hubspot.Client.create(api_key=self.sandbox_api_key)
+    async def run_blocking(self, func, *args, **kwargs):
+        """Run a blocking migrator method on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
 
-            batch_input_public_association = BatchInputPublicAssociation(
-                inputs=input_sandbox_associations
+    async def migrate_pages_concurrently(
+        self,
+        hs_object,
+        pages,
+        fake_data=False,
+        product_mapping_dict=None,
+        update_existing=False,
+    ):
+        """
+        Async migrate_pages. Pages are fetched on a background thread as in migrate_pages, and each one
+        is created in sandbox as soon as it arrives, with at most `concurrency` pages in flight at once.
+        Returns the number of records created.
+        """
+        pages = iter_in_background(pages, self.concurrency)
+
+        async def migrate_page(object_records):
+            object_records = await self.run_blocking(
+                self.prepare_records,
+                hs_object,
+                object_records,
+                fake_data,
+                product_mapping_dict,
             )
-            try:
-                time.sleep(.4)
-                api_response = sandbox_client.crm.associations.batch_api.create(
-                    from_object_type=association_row["from_object"],
-                    to_object_type=association_row["to_object"],
-                    batch_input_public_association=batch_input_public_association,
+            records_to_create, mapped_records = self.split_mapped_records(
+                hs_object, object_records
+            )
+            results = []
+            if records_to_create:
+                results = await self.run_blocking(
+                    self.batch_create_records, hs_object, records_to_create
+                )
+            if update_existing and mapped_records:
+                await self.run_blocking(
+                    self.update_mapped_records, hs_object, mapped_records
                 )
-                sandbox_associations = api_response.to_dict()["results"]
-            except ApiException as e:
-                print("Exception when calling batch_api->create: %s\n" % e)
+            await self.run_blocking(self.complete_records, hs_object, object_records)
+            return len(results)
+
+        records_created = 0
+        pending = set()
+
+        while True:
+            object_records = await self.run_blocking(next, pages, None)
+            if object_records is None:
+                break
+            pending.add(asyncio.ensure_future(migrate_page(object_records)))
+            if len(pending) >= self.concurrency:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                records_created += sum(task.result() for task in done)
 
-            self.insert_sandbox_associations(associations_df)
+        if pending:
+            done, pending = await asyncio.wait(pending)
+            records_created += sum(task.result() for task in done)
 
-        conn.commit()
-        conn.close()
-        return True
+        return records_created
 
-    def delete_all_associations(self):
-        portal_id = self.sandbox_portal_id
-        conn = sqlite3.connect("hubspot_migration_mappings.sqlite")
-        cur = conn.cursor()
+    async def migrate_associated_object(
+        self,
+        walk,
+        depth,
+        hs_obj,
+        prod_ids,
+        fake_data=False,
+        product_mapping_dict=None,
+        chunk_size=100,
+        update_existing=False,
+    ):
+        """
+        Reads the prod records of hs_obj that walk reached at depth and creates them in sandbox, queuing the records
+        associated with them for the next depth. See get_walk_ids_to_read for the records left out.
+        """
+        print(f"Getting {len(prod_ids)} {hs_obj} {depth} association(s) away from Production")
 
-        distinct_association_types_df = pd.read_sql_query(
-            f"""SELECT DISTINCT 
-                                                                hs_association_string, 
-                                                                from_object, 
-                                                                to_object 
-                                                                FROM sandbox_associations_{portal_id}""",
-            conn,
+        properties = await self.run_blocking(self.get_object_properties, hs_obj)
+        ids_to_get = await self.run_blocking(
+            self.get_walk_ids_to_read, walk, depth, hs_obj, prod_ids, update_existing
         )
-
-        for ix, association_row in distinct_association_types_df.iterrows():
-            print(
-                f"Deleting associations of type {association_row['hs_association_string']}"
+        if not ids_to_get:
+            print(f"No records of type {hs_obj} left to migrate")
+            return
+
+        associations = [obj for obj in object_config.keys() if obj != hs_obj]
+
+        async def migrate_chunk(object_ids):
+            object_records = await self.run_blocking(
+                self.read_record_chunk,
+                "prod",
+                hs_obj,
+                object_ids,
+                properties,
+                associations,
             )
-            associations_df = pd.read_sql_query(
-                f"""SELECT * FROM sandbox_associations_{portal_id}
-                                                WHERE hs_association_string = '{association_row['hs_association_string']}'
-                                                """,
-                conn,
+            walk.add_records(hs_obj, object_records, depth)
+            object_records = await self.run_blocking(
+                self.prepare_records,
+                hs_obj,
+                object_records,
+                fake_data,
+                product_mapping_dict,
             )
-
-            input_sandbox_associations = []
-            for index, row in associations_df.iterrows():
-                new_rec = {
-                    "from": {"id": row["sandbox_from_id"]},
-                    "to": {"id": row["sandbox_to_id"]},
-                    "type": row["hs_association_string"],
-                }
-                input_sandbox_associations.append(new_rec)
-
-            sandbox_client = hubspot.Client.create(api_key=self.sandbox_api_key)
-            batch_input_public_association = BatchInputPublicAssociation(
-                inputs=input_sandbox_associations
+            records_to_create, mapped_records = self.split_mapped_records(
+                hs_obj, object_records
             )
-            try:
-                time.sleep(.4)
-                api_response = sandbox_client.crm.associations.batch_api.archive(
-                    from_object_type=association_row["from_object"],
-                    to_object_type=association_row["to_object"],
-                    batch_input_public_association=batch_input_public_association,
+            if records_to_create:
+                await self.run_blocking(
+                    self.create_record_chunk, hs_obj, records_to_create
                 )
-            except ApiException as e:
-                print("Exception when calling batch_api->archive: %s\n" % e)
-
-            cur.execute(
-                f"""DELETE FROM sandbox_associations_{portal_id} 
-            WHERE hs_association_string = '{association_row['hs_association_string']}'"""
-            )
-            print(f"{len(associations_df)} Associations deleted")
-            conn.commit()
-
-        conn.commit()
-        conn.close()
-        return True
-
-    def replace_with_fake_data(self, property_json, hs_object):
-        person = Person("en")
-        address = Address()
-        #         datetime = Datetime()
-        #         finance = Finance()
-        #         internet = Internet()
-        #         food = Food()
-        #         number = Numeric()
-
-        available_properties = property_json.keys()
-        #     to_replace = [k for k in available_properties if k in replaceable_properties]
-
-        for p in available_properties:
-            if p == "name" and hs_object == "contacts":
-                property_json[p] = person.name()
-            elif p in ["firstname", "first_name"]:
-                property_json[p] = person.first_name()
-            elif p in ["lastname", "last_name"]:
-                property_json[p] = person.last_name()
-            elif p == "email":
-                property_json[p] = person.email()
-            elif p == "address":
-                property_json[p] = (
-                    str(address.street_number())
-                    + " "
-                    + str(address.street_name())
-                    + " "
-                    + str(address.street_suffix())
+            if update_existing and mapped_records:
+                await self.run_blocking(
+                    self.update_mapped_records, hs_obj, mapped_records
                 )
-            elif p == "city":
-                property_json[p] = address.city()
-            elif p in ["zip", "post_code", "postal_code", "zip_code"]:
-                property_json[p] = address.zip_code()
-            elif p in ["phone", "phonenumber", "phone_number"]:
-                property_json[p] = person.telephone()
-
-        #             elif p == 'name' and hs_object == 'companies':
-        #                 property_json[p] = finance.company()
-        #             elif p == 'dealname' and hs_object == 'deals':
-        #                 property_json[p] = food.dish()
-        #             elif p == 'price':
-        #                 property_json[p] = finance.price()
-
-        #             elif p == 'state':
-        #                 property_json[p] = address.state()
-        #         elif p == 'website':
-        #             property_json[p] = internet.url() ## Causes issues for companies in Hubspot, so leaving out
-        #             elif p in ['occupation','job','job_title','job_role']:
-        #                 property_json[p] = person.occupation()
-        #             elif p in ['company']:
-        #                 property_json[p] = finance.company()
-        #             elif p in ['quantity','count','number']:
-        #                 property_json[p] = number.integer_number(start=1)
-
-        return property_json
+            return object_records
+
+        for next_chunk in asyncio.as_completed(
+            [migrate_chunk(object_ids) for object_ids in chunks(ids_to_get, chunk_size)]
+        ):
+            object_records = await next_chunk
+            print(f"Created {len(object_records)} {hs_obj} in Sandbox")
+            await self.run_blocking(self.complete_records, hs_obj, object_records)
+
+    async def delete_associations_concurrently(self):
+        association_types = await self.run_blocking(
+            self.get_association_types, "sandbox_associations"
+        )
+        await asyncio.gather(
+            *[
+                self.run_blocking(self.delete_associations_of_type, association_row)
+                for association_row in association_types
+            ]
+        )
+        return True
 
-    @show_time
-    def migrate_object(
+    @report_run
+    async def migrate_object(
         self,
         hs_object,
         properties=[],
         include_associations=False,
         limit=100,
         fake_data=False,
+        resume=False,
+        update_existing=False,
+        filter_groups=None,
+        sorts=None,
+        max_depth=DEFAULT_WALK_DEPTH,
+        max_records=None,
+        include_anchor=False,
     ):
-
         """
-        hs_object: Which HS Object you are migrating, can be any of ['companies','deals','contacts','line_items','products']
-        properties: If you want to not use the object_config, you can identify the list of properties you want migrated here
-        include_associations: if you want all associated records in the tree migrated (i.e. all companies and deals associated with the contacts migrated), then select True
-        limit: Maximum number of records to migrate, make this None if you intend to migrate all items
-        fake_data: If you want personally identifiable information like name, address, email, phone to be replaced with fake data, select True
+        Coroutine with the same arguments and results as HubspotSandboxMigrator.migrate_object
         """
         assert hs_object in object_config.keys()
 
         if not properties:
             try:
-                #                 print(f"No properties provided. Attempting to utilize default properties for {hs_object}")
                 properties = object_config[hs_object]["properties"]
-            except Exception as ex:
+            except Exception:
                 print("Unable to use default properties for object provided")
                 raise
 
-        print("Confirming that Sandbox API Key is for a Hubspot Sandbox Instance")
-        try:
-            assert is_sandbox(self.sandbox_api_key)
-        except Exception as ex:
-            print(
-                "API Key provided for Sandbox is not actually a Sandbox Hubspot Instance"
-            )
-            raise
+        if filter_groups is None:
+            filter_groups = object_config[hs_object].get("filter_groups", [])
+        if sorts is None:
+            sorts = object_config[hs_object].get("sorts", [])
 
-        print("Confirming that Prod API Key is for a Hubspot Production Instance")
-        try:
-            assert is_production(self.prod_api_key)
-        except Exception as ex:
-            print(
-                "API Key provided for Prod is not actually a Production Hubspot Instance"
+        await self.run_blocking(self.confirm_environments)
+        properties = await self.run_blocking(
+            self.confirm_properties, hs_object, properties
+        )
+
+        await self.run_blocking(self.setup_sqlite)
+        if resume:
+            print(f"Resuming migration of {hs_object} from its last checkpoint")
+        else:
+            await self.run_blocking(self.mapping_store.reset_checkpoints, hs_object)
+        await self.run_blocking(
+            self.save_initial_watermarks, hs_object, include_associations
+        )
+        await self.run_blocking(self.load_mapped_prod_ids)
+
+        product_mapping_dict = None
+        if hs_object == "line_items" or (
+            include_associations
+            and "line_items" in self.get_associated_object_types(hs_object)
+        ):
+            product_mapping_dict = await self.run_blocking(
+                self.get_product_mapping_dict
             )
-            raise
 
-        print("Getting Object Properties")
-        object_properties_df = self.get_properties(hs_object)
-        sandbox_object_client = self.get_hubspot_client(
-            hs_object, environment="sandbox"
+        print(f"Migrating {hs_object} from Production to Sandbox")
+
+        associations = [k for k in object_config.keys() if k != hs_object]
+
+        pages = self.iter_migration_pages(
+            hs_object,
+            limit,
+            properties,
+            associations,
+            resume,
+            filter_groups,
+            sorts,
+        )
+        if include_associations:
+            walk = self.start_association_walk(
+                hs_object, max_depth, max_records, include_anchor
+            )
+            if resume:
+                await self.run_blocking(self.seed_resumed_walk, walk, hs_object)
+            pages = walk.iter_pages(hs_object, pages, 0)
+
+        records_migrated = await self.migrate_pages_concurrently(
+            hs_object,
+            pages,
+            fake_data,
+            product_mapping_dict,
+            update_existing=update_existing,
         )
-        prod_object_client = self.get_hubspot_client(hs_object, environment="prod")
 
-        print("Confirming that Properties Provided Match Object Properties")
-        try:
-            assert all([p in object_properties_df["name"].tolist() for p in properties])
-        except Exception as ex:
-            print(
-                f"List of properties includes entries that are not api names on object {hs_object}"
+        if include_associations:
+            for depth, hs_obj, prod_ids in walk.iter_frontiers():
+                await self.migrate_associated_object(
+                    walk,
+                    depth,
+                    hs_obj,
+                    prod_ids,
+                    fake_data,
+                    product_mapping_dict,
+                    update_existing=update_existing,
+                )
+            await self.run_blocking(self.complete_phase, hs_object, "walk")
+
+            association_types = await self.run_blocking(
+                self.get_association_types_to_create, hs_object, resume
+            )
+            await asyncio.gather(
+                *[
+                    self.run_blocking(
+                        self.create_checkpointed_associations,
+                        hs_object,
+                        association_row,
+                    )
+                    for association_row in association_types
+                ]
             )
-            print(f"Missing properties will be ignored when migrating")
-            print("Sleeping for five seconds to give you an opportunity to cancel")
-            time.sleep(5)
 
-        print(f"Getting {hs_object} from Production")
+        if include_associations:
+            print(
+                f"Successfully migrated {records_migrated} {hs_object} and their associated objects"
+            )
+        else:
+            print(f"Successfully migrated {records_migrated} {hs_object}")
 
-        associations = [k for k in object_config.keys() if k != hs_object]
+    @report_run
+    async def clean_up(self, remove_products=False):
+        """
+        Coroutine with the same arguments and results as HubspotSandboxMigrator.clean_up
+        """
+        records_to_delete = await self.run_blocking(
+            self.get_records_to_delete, remove_products
+        )
 
-        object_records = self.get_object_records(
-            hs_object, limit, properties, associations, environment="prod"
+        chunk_results = await asyncio.gather(
+            *[
+                self.run_blocking(self.archive_record_chunk, hs_obj, chunk)
+                for hs_obj, sandbox_ids in records_to_delete.items()
+                for chunk in chunks(sandbox_ids, 100)
+            ]
         )
+        deleted_records = [
+            sandbox_id for archived_ids in chunk_results for sandbox_id in archived_ids
+        ]
 
-        #     object_properties_list = get_object_properties_list(object_records)
+        await self.delete_associations_concurrently()
 
-        prod_records_df = json_normalize(object_records, sep="_")
+        print(len(deleted_records), "records deleted from Sandbox")
+        await self.run_blocking(
+            self.finish_clean_up, records_to_delete, deleted_records
+        )
 
-        print(f"Creating {hs_object} in Sandbox")
-        records_created = []
-        #     records_created = batch_create_records(sandbox_object_client,
-        #                                              object_properties_list)
-        self.setup_sqlite()
 
-        for rec in object_records:
-            properties = rec["properties"]
-            prod_id = rec["id"]
+@decorate_public_methods(report_calls)
+class MultiSandboxMigrator:
+    """
+    Class for migrating the same data from Hubspot prod to several Hubspot sandboxes, given API keys for all of them.
+    Prod is read once into a snapshot, which is then loaded into every sandbox concurrently. Each sandbox has
+    its own HubspotSandboxMigrator, with its own rate limiter and mapping tables, while the prod rate limiter is shared.
+    """
 
-            if fake_data:
-                properties = self.replace_with_fake_data(properties, hs_object)
+    def __init__(self, prod_api_key, sandbox_api_keys, **migrator_kwargs):
+        """
+        sandbox_api_keys: API keys of the sandboxes to migrate to
+        migrator_kwargs: Passed on to every HubspotSandboxMigrator, e.g. hubspot_tier
+        """
+        if not sandbox_api_keys:
+            raise ValueError("At least one Sandbox API Key must be provided")
 
-            record_created = self.create_sandbox_record_from_prod_record(
-                hs_object, properties, prod_id
+        self.migrators = [
+            HubspotSandboxMigrator(prod_api_key, sandbox_api_key, **migrator_kwargs)
+            for sandbox_api_key in sandbox_api_keys
+        ]
+
+        sandbox_portal_ids = [m.sandbox_portal_id for m in self.migrators]
+        if len(set(sandbox_portal_ids)) != len(sandbox_portal_ids):
+            raise ValueError(
+                f"Sandbox API Keys provided include more than one key for the same sandbox: {sandbox_portal_ids}"
             )
-            records_created.append(record_created)
 
-        sandbox_records_df = json_normalize(records_created, sep="_")
+        # times runs across every sandbox, the work done in each is reported by the metrics of its own migrator
+        self.metrics = MigrationMetrics(labels={"prod_portal": self.migrators[0].prod_portal_id})
 
-        associations_df = self.get_prod_associations(object_records)
-        self.insert_prod_associations(associations_df)
+    def __repr__(self):
+        return f"{self.__class__.__name__} for Sandbox Instances {[m.sandbox_portal_id for m in self.migrators]} and Prod Instance {self.migrators[0].prod_portal_id}"
 
-        if include_associations:
-            for hs_obj in object_config:
-                if hs_obj == "products":
-                    continue
-                if hs_obj == "line_items":
-                    product_mappings_df = self.create_product_mapping()
-                    product_mapping_dict = {
-                        str(pid): str(sid)
-                        for pid, sid in zip(
-                            product_mappings_df["prod_id"].tolist(),
-                            product_mappings_df["sandbox_id"].tolist(),
-                        )
-                    }
-                if hs_obj != hs_object:
-                    sandbox_object_client = self.get_hubspot_client(
-                        hs_obj, environment="sandbox"
-                    )
-                    prod_object_client = self.get_hubspot_client(
-                        hs_obj, environment="prod"
-                    )
-                    print(f"Getting {hs_obj} from Production")
-
-                    properties = self.get_object_properties(hs_obj)
-                    object_records = self.get_associated_records(hs_obj, properties)
-
-                    if object_records:
-                        print(f"Creating {hs_obj} in Sandbox")
-                        records_created = []
-
-                        for rec in object_records:
-                            properties = rec["properties"]
-
-                            if fake_data:
-                                properties = self.replace_with_fake_data(
-                                    properties, hs_obj
-                                )
-
-                            prod_id = rec["id"]
-                            if hs_obj == "line_items":
-                                properties["hs_product_id"] = product_mapping_dict[
-                                    properties["hs_product_id"]
-                                ]
-                            record_created = (
-                                self.create_sandbox_record_from_prod_record(
-                                    hs_obj, properties, prod_id
-                                )
-                            )
-                            records_created.append(record_created)
+    def run_on_sandboxes(self, func, *args, **kwargs):
+        """
+        Calls func(migrator, *args, **kwargs) for the migrator of every sandbox concurrently. A failure in one sandbox
+        does not stop the others; once they have all finished, the first failure is raised.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.migrators)) as executor:
+            futures = [
+                executor.submit(func, migrator, *args, **kwargs)
+                for migrator in self.migrators
+            ]
 
-                        sandbox_records_df = json_normalize(records_created, sep="_")
+        errors = []
+        for migrator, future in zip(self.migrators, futures):
+            if future.exception() is not None:
+                print(
+                    f"Sandbox Instance {migrator.sandbox_portal_id} failed: {future.exception()}"
+                )
+                errors.append(future.exception())
+        if errors:
+            raise errors[0]
 
-                        prod_records_df = json_normalize(object_records, sep="_")
-                        sandbox_records_df = json_normalize(records_created, sep="_")
+        return [future.result() for future in futures]
 
-                        associations_df = self.get_prod_associations(object_records)
-                        self.insert_prod_associations(associations_df)
+    @report_run
+    def migrate_object(
+        self,
+        hs_object,
+        properties=[],
+        include_associations=False,
+        limit=100,
+        fake_data=False,
+        update_existing=False,
+        filter_groups=None,
+        sorts=None,
+        max_depth=DEFAULT_WALK_DEPTH,
+        max_records=None,
+        include_anchor=False,
+        snapshot_path=None,
+    ):
+        """
+        Takes the same arguments as HubspotSandboxMigrator.migrate_object, and migrates the same records to every sandbox.
+        snapshot_path: Directory to keep the snapshot read from prod in, so it can be loaded again with load_snapshot.
+        By default it is written to a temporary directory that is removed once every sandbox is loaded.
+        """
+        if snapshot_path is None:
+            with tempfile.TemporaryDirectory() as path:
+                return self.migrate_object(
+                    hs_object,
+                    properties,
+                    include_associations,
+                    limit,
+                    fake_data,
+                    update_existing,
+                    filter_groups,
+                    sorts,
+                    max_depth,
+                    max_records,
+                    include_anchor,
+                    snapshot_path=path,
+                )
 
-            self.create_all_associations()
+        # fake data is generated while exporting, so every sandbox gets the same fake records and no PII is written to disk
+        self.migrators[0].export_snapshot(
+            snapshot_path,
+            hs_object,
+            properties,
+            include_associations,
+            limit,
+            fake_data,
+            filter_groups,
+            sorts,
+            max_depth,
+            max_records,
+            include_anchor,
+        )
+        self.load_snapshot(snapshot_path, update_existing=update_existing)
+
+    @report_run
+    def load_snapshot(self, path, fake_data=False, update_existing=False):
+        """Loads a snapshot written by export_snapshot into every sandbox concurrently, see HubspotSandboxMigrator.load_snapshot"""
+        self.run_on_sandboxes(
+            HubspotSandboxMigrator.load_snapshot,
+            path,
+            fake_data=fake_data,
+            update_existing=update_existing,
+        )
 
-        if include_associations:
-            print(
-                f"Successfully migrated {limit} {hs_object} and their associated objects"
-            )
-        else:
-            print(f"Successfully migrated {limit} {hs_object}")
+    @report_run
+    def clean_up(self, remove_products=False):
+        """Cleans up the records migrated to every sandbox concurrently, see HubspotSandboxMigrator.clean_up"""
+        self.run_on_sandboxes(
+            HubspotSandboxMigrator.clean_up, remove_products=remove_products
+        )
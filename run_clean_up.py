@@ -1,6 +1,7 @@
 import argparse
+import asyncio
 
-from hubspot_prod_to_sandbox import HubspotSandboxMigrator
+from hubspot_prod_to_sandbox import AsyncHubspotSandboxMigrator, HubspotSandboxMigrator, str2bool
 
 parser = argparse.ArgumentParser(
     description="Script for cleaning up previous hubspot prod to sandbox migration using this sandbox in this environment."
@@ -24,10 +25,39 @@ parser.add_argument(
     help="Your Hubspot Sandbox API Key",
 )
 
-args = parser.parse_args()
+parser.add_argument(
+    "--async",
+    type=str2bool,
+    default=False,
+    action="store",
+    dest="use_async",
+    help="Archive sandbox records with the asyncio migrator, overlapping many Hubspot requests at once",
+)
 
-migrator = HubspotSandboxMigrator(
-    args.hubspot_production_api_key, args.hubspot_sandbox_api_key
+parser.add_argument(
+    "-c",
+    "--concurrency",
+    type=int,
+    default=10,
+    action="store",
+    dest="concurrency",
+    help="The maximum number of Hubspot requests in flight at once when running with --async",
 )
 
-migrator.clean_up()
+args = parser.parse_args()
+
+if args.use_async:
+    migrator = AsyncHubspotSandboxMigrator(
+        args.hubspot_production_api_key,
+        args.hubspot_sandbox_api_key,
+        concurrency=args.concurrency,
+    )
+    try:
+        asyncio.run(migrator.clean_up())
+    finally:
+        migrator.close()
+else:
+    migrator = HubspotSandboxMigrator(
+        args.hubspot_production_api_key, args.hubspot_sandbox_api_key
+    )
+    migrator.clean_up()
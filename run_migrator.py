@@ -1,14 +1,8 @@
-from hubspot_prod_to_sandbox import HubspotSandboxMigrator
+from hubspot_prod_to_sandbox import HubspotSandboxMigrator, AsyncHubspotSandboxMigrator, MultiSandboxMigrator, DEFAULT_WALK_DEPTH, str2bool
 import argparse
+import asyncio
+import json
 
-def str2bool(v):
-    if v.lower() in ('yes', 'true', 't', 'y', '1'):
-        return True
-    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
-        return False
-    else:
-        raise argparse.ArgumentTypeError('Boolean value expected.')
-        
 parser = argparse.ArgumentParser(description='Script for migrating data from Hubspot Prod to Sandbox.')
 
 parser.add_argument('-p',
@@ -21,9 +15,9 @@ parser.add_argument('-p',
 parser.add_argument('-s',
                     '--sandbox', 
                     required=True,
-                    action="store", 
-                    dest='hubspot_sandbox_api_key',
-                    help="Your Hubspot Sandbox API Key")
+                    action="append", 
+                    dest='hubspot_sandbox_api_keys',
+                    help="Your Hubspot Sandbox API Key, repeat to migrate the same records to several sandboxes at once")
 
 parser.add_argument('-o',
                     '--object', 
@@ -48,6 +42,28 @@ parser.add_argument('-a',
                     dest='include_associations',
                     help="Whether you want to migrate associated records with the objects that are migrated")
 
+parser.add_argument('--max-depth', 
+                    type=int,
+                    required=False,
+                    default=DEFAULT_WALK_DEPTH,
+                    action="store", 
+                    dest='max_depth',
+                    help=f"How many associations away from the migrated objects associated records are followed when running with --associations True, {DEFAULT_WALK_DEPTH} by default")
+
+parser.add_argument('--include-anchor', 
+                    type=str2bool,
+                    required=False,
+                    action="store", 
+                    dest='include_anchor',
+                    help="Whether other records of the object associated with those records are migrated too when running with --associations True")
+
+parser.add_argument('--max-records', 
+                    type=int,
+                    required=False,
+                    action="store", 
+                    dest='max_records',
+                    help="The most associated records, of all objects together, migrated when running with --associations True")
+
 parser.add_argument('-f',
                     '--fake-data', 
                     type=str2bool,
@@ -56,9 +72,75 @@ parser.add_argument('-f',
                     dest='fake_data',
                     help="Whether you want to utilize fake data in place of personally identifiable information")
 
+parser.add_argument('--async', 
+                    type=str2bool,
+                    required=False,
+                    action="store", 
+                    dest='use_async',
+                    help="Whether you want to run the migration with the asyncio migrator, overlapping many Hubspot requests at once")
+
+parser.add_argument('-c',
+                    '--concurrency', 
+                    type=int,
+                    required=False,
+                    default=10,
+                    action="store", 
+                    dest='concurrency',
+                    help="The maximum number of Hubspot requests in flight at once when running with --async True")
+
+parser.add_argument('-r',
+                    '--resume', 
+                    type=str2bool,
+                    required=False,
+                    action="store", 
+                    dest='resume',
+                    help="Whether you want to resume an interrupted migration from its last checkpoint instead of starting over")
+
+parser.add_argument('-u',
+                    '--update-existing', 
+                    type=str2bool,
+                    required=False,
+                    action="store", 
+                    dest='update_existing',
+                    help="Whether you want records already in your sandbox to be updated with their current prod values instead of skipped")
+
+parser.add_argument('--filter-groups', 
+                    type=json.loads,
+                    required=False,
+                    action="store", 
+                    dest='filter_groups',
+                    help="JSON list of Hubspot search filter groups selecting which records of the object are migrated, overrides the object_config")
+
+parser.add_argument('--sorts', 
+                    type=json.loads,
+                    required=False,
+                    action="store", 
+                    dest='sorts',
+                    help="JSON list of Hubspot search sorts for the order records of the object are migrated in, overrides the object_config")
+
+parser.add_argument('--plan', 
+                    type=str2bool,
+                    required=False,
+                    action="store", 
+                    dest='plan',
+                    help="Whether you only want to plan the migration, printing the records, API calls and time it would take without migrating anything")
+
+parser.add_argument('--metrics-dir', 
+                    required=False,
+                    action="store", 
+                    dest='metrics_dir',
+                    help="Directory to write the metrics of the migration to, as a JSON report and a Prometheus text file")
+
 args = parser.parse_args()
 
-migrator = HubspotSandboxMigrator(args.hubspot_prod_api_key,args.hubspot_sandbox_api_key)
+if len(args.hubspot_sandbox_api_keys) > 1:
+    if args.use_async or args.resume or args.plan:
+        parser.error("--async, --resume and --plan are not available when migrating to several sandboxes")
+    migrator = MultiSandboxMigrator(args.hubspot_prod_api_key,args.hubspot_sandbox_api_keys,metrics_dir=args.metrics_dir)
+elif args.use_async:
+    migrator = AsyncHubspotSandboxMigrator(args.hubspot_prod_api_key,args.hubspot_sandbox_api_keys[0],concurrency=args.concurrency,metrics_dir=args.metrics_dir)
+else:
+    migrator = HubspotSandboxMigrator(args.hubspot_prod_api_key,args.hubspot_sandbox_api_keys[0],metrics_dir=args.metrics_dir)
 
 if args.include_associations is not None:
     include_associations = args.include_associations
@@ -70,7 +152,36 @@ if args.fake_data is not None:
 else:
     fake_data = False
 
-migrator.migrate_object(hs_object=args.hs_object,
-                        limit=args.limit,
-                        include_associations=include_associations,
-                        fake_data=fake_data)
\ No newline at end of file
+if args.plan:
+    migrator.plan_migration(hs_object=args.hs_object,
+                            include_associations=include_associations,
+                            limit=args.limit,
+                            update_existing=bool(args.update_existing),
+                            filter_groups=args.filter_groups,
+                            sorts=args.sorts,
+                            max_depth=args.max_depth,
+                            max_records=args.max_records,
+                            include_anchor=bool(args.include_anchor))
+    raise SystemExit
+
+migration_kwargs = {}
+if args.resume:
+    migration_kwargs["resume"] = True
+
+migration = migrator.migrate_object(hs_object=args.hs_object,
+                                   limit=args.limit,
+                                   include_associations=include_associations,
+                                   fake_data=fake_data,
+                                   update_existing=bool(args.update_existing),
+                                   filter_groups=args.filter_groups,
+                                   sorts=args.sorts,
+                                   max_depth=args.max_depth,
+                                   max_records=args.max_records,
+                                   include_anchor=bool(args.include_anchor),
+                                   **migration_kwargs)
+
+if args.use_async:
+    try:
+        asyncio.run(migration)
+    finally:
+        migrator.close()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import argparse
+
+from hubspot_prod_to_sandbox import HubspotSandboxMigrator, str2bool
+
+parser = argparse.ArgumentParser(
+    description="Script for exporting Hubspot Prod data to a local snapshot once, and loading it into any number of Sandboxes."
+)
+
+parser.add_argument(
+    "action",
+    choices=["export", "load"],
+    help="export reads from Prod into the snapshot, load copies the snapshot into Sandbox",
+)
+
+parser.add_argument(
+    "-p",
+    "--production",
+    required=True,
+    action="store",
+    dest="hubspot_production_api_key",
+    help="Your Hubspot Production API key",
+)
+
+parser.add_argument(
+    "-s",
+    "--sandbox",
+    required=True,
+    action="store",
+    dest="hubspot_sandbox_api_key",
+    help="Your Hubspot Sandbox API Key",
+)
+
+parser.add_argument(
+    "-d",
+    "--directory",
+    required=True,
+    action="store",
+    dest="path",
+    help="The directory the snapshot is exported to or loaded from",
+)
+
+parser.add_argument(
+    "-o",
+    "--object",
+    action="store",
+    dest="hs_object",
+    help="The primary object you want to export, required for export",
+)
+
+parser.add_argument(
+    "-l",
+    "--limit",
+    type=int,
+    action="store",
+    dest="limit",
+    default=100,
+    help="The number of objects you want to export",
+)
+
+parser.add_argument(
+    "-a",
+    "--associations",
+    type=str2bool,
+    default=False,
+    action="store",
+    dest="include_associations",
+    help="Export the records associated with the objects exported",
+)
+
+parser.add_argument(
+    "-f",
+    "--fake-data",
+    type=str2bool,
+    default=False,
+    action="store",
+    dest="fake_data",
+    help="Replace personally identifiable information with fake data",
+)
+
+args = parser.parse_args()
+
+if args.action == "export" and not args.hs_object:
+    parser.error("--object is required to export a snapshot")
+
+migrator = HubspotSandboxMigrator(
+    args.hubspot_production_api_key, args.hubspot_sandbox_api_key
+)
+
+if args.action == "export":
+    migrator.export_snapshot(
+        args.path,
+        hs_object=args.hs_object,
+        include_associations=args.include_associations,
+        limit=args.limit,
+        fake_data=args.fake_data,
+    )
+else:
+    migrator.load_snapshot(args.path, fake_data=args.fake_data)
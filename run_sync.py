@@ -0,0 +1,62 @@
+import argparse
+
+from hubspot_prod_to_sandbox import HubspotSandboxMigrator, str2bool
+
+parser = argparse.ArgumentParser(
+    description="Script for syncing the records changed in Hubspot Prod since the last migration or sync to Sandbox."
+)
+
+parser.add_argument(
+    "-p",
+    "--production",
+    required=True,
+    action="store",
+    dest="hubspot_production_api_key",
+    help="Your Hubspot Production API key",
+)
+
+parser.add_argument(
+    "-s",
+    "--sandbox",
+    required=True,
+    action="store",
+    dest="hubspot_sandbox_api_key",
+    help="Your Hubspot Sandbox API Key",
+)
+
+parser.add_argument(
+    "-o",
+    "--object",
+    required=True,
+    action="append",
+    dest="hs_objects",
+    help="An object you want to sync, repeat to sync several objects",
+)
+
+parser.add_argument(
+    "-f",
+    "--fake-data",
+    type=str2bool,
+    default=False,
+    action="store",
+    dest="fake_data",
+    help="Replace personally identifiable information with fake data",
+)
+
+parser.add_argument(
+    "--metrics-dir",
+    action="store",
+    dest="metrics_dir",
+    help="Directory to write the metrics of each sync to, as a JSON report and a Prometheus text file",
+)
+
+args = parser.parse_args()
+
+migrator = HubspotSandboxMigrator(
+    args.hubspot_production_api_key,
+    args.hubspot_sandbox_api_key,
+    metrics_dir=args.metrics_dir,
+)
+
+for hs_object in args.hs_objects:
+    migrator.sync_object(hs_object=hs_object, fake_data=args.fake_data)
@@ -0,0 +1,65 @@
+"""
+Fixtures for running the migrator against the mock Hubspot server in benchmarks/mock_hubspot.py.
+Every test gets a fresh server and state, and its own SQLite file in tmp_path.
+"""
+import pytest
+
+import hubspot_prod_to_sandbox
+import mock_hubspot
+from hubspot_prod_to_sandbox import HubspotSandboxMigrator
+
+PROD_API_KEY = "prod-key"
+SANDBOX_API_KEY = "sandbox-key"
+
+
+@pytest.fixture
+def process_caches(monkeypatch):
+    """Empties the account identities and rate limiters the module caches for the life of the process"""
+    monkeypatch.setattr(hubspot_prod_to_sandbox, "account_identities", {})
+    monkeypatch.setattr(hubspot_prod_to_sandbox, "rate_limiters", {})
+    monkeypatch.setattr(hubspot_prod_to_sandbox, "search_rate_limiters", {})
+
+
+@pytest.fixture
+def hubspot(monkeypatch, tmp_path, process_caches):
+    """Base URL of a mock Hubspot server whose prod portal is seeded with 50 contacts and their records"""
+    # the mapping store writes its SQLite file to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    mock_hubspot.STATE.reset()
+    mock_hubspot.seed(mock_hubspot.STATE.get_portal(PROD_API_KEY), contacts=50, companies=5, deals=10, products=3)
+    mock_hubspot.STATE.get_portal(SANDBOX_API_KEY)
+    server, url = mock_hubspot.start_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def prod_portal(hubspot):
+    return mock_hubspot.STATE.portals[PROD_API_KEY]
+
+
+@pytest.fixture
+def sandbox_portal(hubspot):
+    return mock_hubspot.STATE.portals[SANDBOX_API_KEY]
+
+
+@pytest.fixture
+def make_migrator(hubspot):
+    """Builds migrators between the prod and sandbox portals of the mock server, like a new process would"""
+    migrators = []
+
+    def make_migrator(**kwargs):
+        migrators.append(HubspotSandboxMigrator(PROD_API_KEY, SANDBOX_API_KEY, host=hubspot, **kwargs))
+        return migrators[-1]
+
+    yield make_migrator
+    for migrator in migrators:
+        migrator.mapping_store.close()
+
+
+@pytest.fixture
+def migrator(make_migrator):
+    return make_migrator()
+
@@ -0,0 +1,72 @@
+from hubspot_prod_to_sandbox import AssociationGraphWalk
+
+
+def make_record(record_id, **associations):
+    """A prod record as read with associations, e.g. make_record("1", companies=[("10", "contact_to_company")])"""
+    return {
+        "id": record_id,
+        "associations": {
+            to_object: {"results": [{"id": to_id, "type": hs_association_string} for to_id, hs_association_string in results]}
+            for to_object, results in associations.items()
+        },
+    }
+
+
+def test_records_reached_along_several_paths_are_queued_once():
+    walk = AssociationGraphWalk(["companies", "deals"])
+    walk.add_records(
+        "contacts",
+        [
+            make_record("1", companies=[("10", "contact_to_company")], deals=[("20", "contact_to_deal")]),
+            make_record("2", companies=[("10", "contact_to_company")]),
+        ],
+        0,
+    )
+
+    assert list(walk.iter_frontiers()) == [(1, "companies", ["10"]), (1, "deals", ["20"])]
+
+
+def test_walk_stays_within_its_object_types_and_max_depth():
+    walk = AssociationGraphWalk(["companies", "deals"], max_depth=1)
+    walk.add_records("contacts", [make_record("1", companies=[("10", "contact_to_company")])], 0)
+
+    frontiers = []
+    for depth, hs_object, prod_ids in walk.iter_frontiers():
+        frontiers.append((depth, hs_object, prod_ids))
+        # the company's contacts are not an object type of the walk, and its deals are past max_depth
+        walk.add_records(
+            hs_object,
+            [make_record("10", contacts=[("1", "company_to_contact"), ("2", "company_to_contact")], deals=[("20", "company_to_deal")])],
+            depth,
+        )
+
+    assert frontiers == [(1, "companies", ["10"])]
+
+
+def test_walk_goes_deeper_one_depth_at_a_time():
+    walk = AssociationGraphWalk(["companies", "deals", "line_items"], max_depth=2)
+    walk.add_records("contacts", [make_record("1", deals=[("20", "contact_to_deal")])], 0)
+
+    frontiers = []
+    for depth, hs_object, prod_ids in walk.iter_frontiers():
+        frontiers.append((depth, hs_object, prod_ids))
+        if hs_object == "deals":
+            walk.add_records(
+                "deals",
+                [make_record("20", line_items=[("30", "deal_to_line_item")], contacts=[("1", "deal_to_contact")])],
+                depth,
+            )
+
+    assert frontiers == [(1, "deals", ["20"]), (2, "line_items", ["30"])]
+
+
+def test_max_records_stops_the_walk():
+    walk = AssociationGraphWalk(["companies"], max_records=2)
+    walk.add_records(
+        "contacts",
+        [make_record("1", companies=[("10", "contact_to_company"), ("11", "contact_to_company"), ("12", "contact_to_company")])],
+        0,
+    )
+
+    assert list(walk.iter_frontiers()) == [(1, "companies", ["10", "11"])]
+    assert walk.records_queued == 2
@@ -0,0 +1,38 @@
+import pytest
+
+from hubspot_prod_to_sandbox import FakeDataGenerator, MappingStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MappingStore(7, str(tmp_path / "mappings.sqlite"))
+    yield store
+    store.close()
+
+
+def fake_contacts(generator):
+    records = [{"id": str(i), "properties": {"email": "real@example.com", "firstname": "Real"}} for i in range(1, 4)]
+    return [rec["properties"] for rec in generator.fake_records("contacts", records)]
+
+
+def test_fake_data_is_deterministic(store):
+    assert fake_contacts(FakeDataGenerator(store)) == fake_contacts(FakeDataGenerator(None))
+    assert fake_contacts(FakeDataGenerator(store)) == fake_contacts(FakeDataGenerator(store))
+
+
+def test_stored_values_follow_the_seed(store):
+    seed_0 = fake_contacts(FakeDataGenerator(store, seed=0))
+    seed_42 = fake_contacts(FakeDataGenerator(store, seed=42))
+
+    assert seed_42 != seed_0
+    assert seed_42 == fake_contacts(FakeDataGenerator(None, seed=42))
+    assert fake_contacts(FakeDataGenerator(store, seed=0)) == seed_0
+
+
+def test_memoization_can_be_turned_off(make_migrator):
+    migrator = make_migrator(memoize_fake_data=False)
+
+    fake_contacts(migrator.fake_data_generator)
+
+    assert migrator.fake_data_generator.mapping_store is None
+    assert migrator.mapping_store.query(f"SELECT COUNT(*) FROM {migrator.mapping_store.fake_data}") == [(0,)]
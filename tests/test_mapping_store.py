@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from hubspot_prod_to_sandbox import MappingStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "mappings.sqlite")
+
+
+@pytest.fixture
+def store(path):
+    store = MappingStore(7, path)
+    yield store
+    store.close()
+
+
+def test_checkpoints_and_record_status_survive_a_restart(path, store):
+    store.save_checkpoint("contacts", "records", after="200", records_done=200, prod_ids=["1", "2"])
+    store.insert_mappings([(101, 1, "contacts")])
+    store.close()
+
+    reopened = MappingStore(7, path)
+
+    assert reopened.get_checkpoint("contacts", "records") == ("200", 200, False)
+    assert reopened.get_record_ids("contacts", ["fetched"]) == ["2"]
+    assert reopened.get_record_ids("contacts", ["created"]) == ["1"]
+    assert reopened.get_sandbox_ids("contacts", ["1", "2"]) == {"1": "101"}
+    reopened.reset_checkpoints("contacts")
+    assert reopened.get_checkpoint("contacts", "records") is None
+    reopened.close()
+
+
+def test_mappings_are_stored_once(store):
+    store.insert_mappings([(101, 1, "contacts"), (102, 2, "contacts")])
+    store.insert_mappings([(101, 1, "contacts")])
+
+    assert sorted(store.get_mappings()) == [(101, 1, "contacts"), (102, 2, "contacts")]
+
+
+def test_prod_associations_are_stored_once_in_either_direction(store):
+    store.insert_prod_associations([(1, 10, "contacts", "companies", "contact_to_company")])
+    store.insert_prod_associations(
+        [
+            (1, 10, "contacts", "companies", "contact_to_company"),
+            (10, 1, "companies", "contacts", "company_to_contact"),
+            (10, 2, "companies", "contacts", "company_to_contact"),
+        ]
+    )
+
+    assert sorted(store.query(f"SELECT * FROM {store.prod_associations}")) == [
+        (1, 10, "contacts", "companies", "contact_to_company"),
+        (10, 2, "companies", "contacts", "company_to_contact"),
+    ]
+
+
+def test_created_sandbox_associations_are_left_out_of_reruns(store):
+    store.insert_mappings([(101, 1, "contacts"), (102, 2, "contacts"), (110, 10, "companies")])
+    store.insert_prod_associations(
+        [
+            (1, 10, "contacts", "companies", "contact_to_company"),
+            (2, 10, "contacts", "companies", "contact_to_company"),
+        ]
+    )
+    assert len(store.get_sandbox_associations_to_create("contact_to_company")) == 2
+
+    created = [(101, 110, "contacts", "companies", "contact_to_company")]
+    store.insert_sandbox_associations(created)
+    store.insert_sandbox_associations(created)
+
+    assert store.get_sandbox_associations("contact_to_company") == created
+    assert store.get_sandbox_associations_to_create("contact_to_company") == [
+        (102, 110, "contacts", "companies", "contact_to_company")
+    ]
+    assert store.count_sandbox_associations_to_create() == {("contacts", "companies", "contact_to_company"): 1}
+
+
+def test_duplicate_sandbox_associations_of_older_files_are_removed(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            """CREATE TABLE sandbox_associations_7
+                   (sandbox_from_id BIGINT, sandbox_to_id BIGINT, from_object VARCHAR(256),
+                    to_object VARCHAR(256), hs_association_string VARCHAR(256))"""
+        )
+        conn.executemany(
+            "INSERT INTO sandbox_associations_7 VALUES (?, ?, ?, ?, ?)",
+            [(101, 110, "contacts", "companies", "contact_to_company")] * 3,
+        )
+    conn.close()
+
+    store = MappingStore(7, path)
+
+    assert store.get_sandbox_associations("contact_to_company") == [
+        (101, 110, "contacts", "companies", "contact_to_company")
+    ]
+    store.close()
+
+
+def test_several_prod_records_can_share_a_sandbox_record(store):
+    store.insert_mappings([(201, 1, "products"), (201, 2, "products")])
+
+    assert store.get_sandbox_ids("products", ["1", "2"]) == {"1": "201", "2": "201"}
+    store.delete_mappings([201])
+    assert store.get_mappings() == []
+
+
+def test_mappings_of_older_files_are_rekeyed_by_prod_record(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE object_mappings_7 (sandbox_id BIGINT PRIMARY KEY NOT NULL, prod_id BIGINT, hs_object VARCHAR(256))"
+        )
+        conn.executemany("INSERT INTO object_mappings_7 VALUES (?, ?, ?)", [(101, 1, "contacts"), (201, 5, "products")])
+    conn.close()
+
+    store = MappingStore(7, path)
+    store.insert_mappings([(201, 6, "products")])
+
+    assert sorted(store.get_mappings()) == [(101, 1, "contacts"), (201, 5, "products"), (201, 6, "products")]
+    store.close()
+
+
+def test_associated_record_keys_of_many_records_stay_within_the_parameter_limit(store):
+    store.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    store.insert_prod_associations(
+        [(contact_id, 10000 + contact_id % 3, "contacts", "companies", "contact_to_company") for contact_id in range(1200)]
+    )
+
+    keys = store.get_associated_record_keys("contacts", [str(contact_id) for contact_id in range(1200)])
+
+    assert sorted(keys) == [("companies", 10000), ("companies", 10001), ("companies", 10002)]
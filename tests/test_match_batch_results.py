@@ -0,0 +1,54 @@
+from hubspot_prod_to_sandbox import match_batch_results
+
+
+def make_records(*emails):
+    return [{"id": str(i), "properties": {"email": email}} for i, email in enumerate(emails, start=1)]
+
+
+def make_results(*emails):
+    return [{"id": f"s{email}", "properties": {"email": email}} for email in emails]
+
+
+def test_matches_results_returned_out_of_order():
+    records = make_records("a@example.com", "b@example.com", "c@example.com")
+
+    matched = match_batch_results(records, make_results("c@example.com", "a@example.com", "b@example.com"))
+
+    assert {result["id"]: result["prod_id"] for result in matched} == {
+        "sa@example.com": "1",
+        "sb@example.com": "2",
+        "sc@example.com": "3",
+    }
+    assert not any(result.get("matched_by_order") for result in matched)
+
+
+def test_matches_values_hubspot_normalized():
+    records = make_records("A@Example.com ", "b@example.com")
+
+    matched = match_batch_results(records, make_results("b@example.com", "a@example.com"))
+
+    assert {result["id"]: result["prod_id"] for result in matched} == {"sa@example.com": "1", "sb@example.com": "2"}
+    assert not any(result.get("matched_by_order") for result in matched)
+
+
+def test_single_leftover_is_paired_without_a_flag():
+    records = make_records("a@example.com", "b@example.com")
+
+    matched = match_batch_results(records, make_results("a@example.com", "changed@example.com"))
+
+    assert {result["id"]: result["prod_id"] for result in matched} == {"sa@example.com": "1", "schanged@example.com": "2"}
+    assert not any(result.get("matched_by_order") for result in matched)
+
+
+def test_leftovers_are_paired_in_input_order_and_flagged(capsys):
+    records = make_records("a@example.com", "b@example.com", "c@example.com")
+
+    matched = match_batch_results(records, make_results("a@example.com", "x@example.com", "y@example.com"))
+
+    assert {result["id"]: result["prod_id"] for result in matched} == {
+        "sa@example.com": "1",
+        "sx@example.com": "2",
+        "sy@example.com": "3",
+    }
+    assert [result["id"] for result in matched if result.get("matched_by_order")] == ["sx@example.com", "sy@example.com"]
+    assert "Warning: 2 batch create results did not match" in capsys.readouterr().out
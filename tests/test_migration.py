@@ -0,0 +1,284 @@
+"""End to end migrations against the mock Hubspot server"""
+import asyncio
+
+import pytest
+
+import mock_hubspot
+from hubspot_prod_to_sandbox import AsyncHubspotSandboxMigrator, HubspotSandboxMigrator, MultiSandboxMigrator
+
+
+def count_records(portal):
+    return {hs_object: len(records) for hs_object, records in portal.records.items()}
+
+
+def get_association_edges(portal):
+    """Every association in a mock portal as a (hs_object, id, to_object, to_id) edge, in both directions"""
+    return {
+        (hs_object, record_id, to_object, to_id)
+        for (hs_object, record_id), to_objects in portal.associations.items()
+        for to_object, to_ids in to_objects.items()
+        for to_id in to_ids
+    }
+
+
+def get_expected_edges(migrator, prod_portal):
+    """The associations of prod_portal between migrated records, translated to sandbox IDs"""
+    sandbox_ids = {
+        (hs_object, str(prod_id)): str(sandbox_id)
+        for sandbox_id, prod_id, hs_object in migrator.mapping_store.get_mappings()
+    }
+    return {
+        (hs_object, sandbox_ids[(hs_object, record_id)], to_object, sandbox_ids[(to_object, to_id)])
+        for hs_object, record_id, to_object, to_id in get_association_edges(prod_portal)
+        if (hs_object, record_id) in sandbox_ids and (to_object, to_id) in sandbox_ids
+    }
+
+
+def test_migrate_object_copies_records_and_associations(migrator, prod_portal, sandbox_portal):
+    migrator.migrate_object("contacts", limit=20, include_associations=True)
+
+    records = count_records(sandbox_portal)
+    assert records["contacts"] == 20
+    assert records["companies"] == 5
+    assert records["deals"] == 4
+    assert records["line_items"] == 4
+    assert get_association_edges(sandbox_portal) == get_expected_edges(migrator, prod_portal)
+
+
+def test_async_migrate_object_copies_records_and_associations(hubspot, prod_portal, sandbox_portal):
+    async def migrate():
+        async with AsyncHubspotSandboxMigrator("prod-key", "sandbox-key", host=hubspot) as migrator:
+            await migrator.migrate_object("contacts", limit=20, include_associations=True)
+        return migrator
+
+    migrator = asyncio.run(migrate())
+
+    assert count_records(sandbox_portal)["contacts"] == 20
+    assert get_association_edges(sandbox_portal) == get_expected_edges(migrator, prod_portal)
+    migrator.mapping_store.close()
+
+
+def test_rerun_creates_nothing_twice(migrator, sandbox_portal):
+    migrator.migrate_object("contacts", limit=20, include_associations=True)
+    records = count_records(sandbox_portal)
+    edges = get_association_edges(sandbox_portal)
+    sandbox_associations = migrator.mapping_store.query(
+        f"SELECT * FROM {migrator.mapping_store.sandbox_associations}"
+    )
+    create_calls = {route: n for route, n in mock_hubspot.STATE.calls.items() if route.endswith("/batch/create")}
+
+    migrator.migrate_object("contacts", limit=20, include_associations=True)
+
+    assert count_records(sandbox_portal) == records
+    assert get_association_edges(sandbox_portal) == edges
+    assert sorted(
+        migrator.mapping_store.query(f"SELECT * FROM {migrator.mapping_store.sandbox_associations}")
+    ) == sorted(sandbox_associations)
+    assert {route: n for route, n in mock_hubspot.STATE.calls.items() if route.endswith("/batch/create")} == create_calls
+
+
+def test_resume_after_interruption(monkeypatch, make_migrator, migrator, prod_portal, sandbox_portal):
+    create_record_chunk = HubspotSandboxMigrator.create_record_chunk
+    chunks_created = []
+
+    def interrupted_create_record_chunk(self, hs_object, chunk):
+        if len(chunks_created) == 1:
+            raise KeyboardInterrupt("interrupted")
+        chunks_created.append(hs_object)
+        return create_record_chunk(self, hs_object, chunk)
+
+    monkeypatch.setattr(HubspotSandboxMigrator, "create_record_chunk", interrupted_create_record_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        migrator.migrate_object("contacts", limit=20, include_associations=True)
+    monkeypatch.setattr(HubspotSandboxMigrator, "create_record_chunk", create_record_chunk)
+    assert count_records(sandbox_portal)["contacts"] == 20
+    assert count_records(sandbox_portal)["companies"] == 0
+
+    resumed = make_migrator()
+    resumed.migrate_object("contacts", limit=20, include_associations=True, resume=True)
+
+    records = count_records(sandbox_portal)
+    assert records["contacts"] == 20
+    assert records["companies"] == 5
+    assert get_association_edges(sandbox_portal) == get_expected_edges(resumed, prod_portal)
+
+
+def test_resume_retries_records_whose_create_failed(monkeypatch, migrator, sandbox_portal):
+    create_record_chunk = HubspotSandboxMigrator.create_record_chunk
+    failed = []
+
+    def create_record_chunk_failing_one(self, hs_object, chunk):
+        # the first record of the first chunk fails, the way a record rejected one at a time is left out
+        if not failed:
+            failed.append(chunk[0]["id"])
+            chunk = chunk[1:]
+        return create_record_chunk(self, hs_object, chunk)
+
+    monkeypatch.setattr(HubspotSandboxMigrator, "create_record_chunk", create_record_chunk_failing_one)
+    migrator.migrate_object("contacts", limit=10)
+    assert count_records(sandbox_portal)["contacts"] == 9
+    assert migrator.mapping_store.get_record_ids("contacts", ["fetched"]) == failed
+
+    migrator.migrate_object("contacts", limit=10, resume=True)
+
+    assert count_records(sandbox_portal)["contacts"] == 10
+    assert migrator.mapping_store.get_sandbox_ids("contacts", failed)
+    assert migrator.mapping_store.get_record_ids("contacts", ["fetched", "created"]) == []
+
+
+def test_partly_failed_association_batch_records_only_created(monkeypatch, migrator, prod_portal, sandbox_portal):
+    get_association_types_to_create = HubspotSandboxMigrator.get_association_types_to_create
+    archived = {}
+
+    def archive_a_company_first(self, hs_object, resume=False):
+        # the company goes away in sandbox after it has been migrated, so associating it fails
+        sandbox_id, _, _ = next(row for row in self.mapping_store.get_mappings() if row[2] == "companies")
+        archived["id"] = str(sandbox_id)
+        sandbox_portal.archive("companies", str(sandbox_id))
+        return get_association_types_to_create(self, hs_object, resume)
+
+    monkeypatch.setattr(HubspotSandboxMigrator, "get_association_types_to_create", archive_a_company_first)
+    migrator.migrate_object("contacts", limit=20, include_associations=True)
+
+    stored = migrator.mapping_store.query(
+        f"SELECT sandbox_from_id, sandbox_to_id, from_object, to_object FROM {migrator.mapping_store.sandbox_associations}"
+    )
+    assert stored
+    assert not [row for row in stored if archived["id"] in (str(row[0]), str(row[1]))]
+    created = get_association_edges(sandbox_portal)
+    assert {(row[2], str(row[0]), row[3], str(row[1])) for row in stored} <= created
+    expected = {
+        edge for edge in get_expected_edges(migrator, prod_portal) if archived["id"] not in (edge[1], edge[3])
+    }
+    assert created == expected
+
+
+def test_get_prod_associations_keeps_each_association_once(migrator):
+    contact = {
+        "id": "1",
+        "associations": {
+            "companies": {"results": [{"id": "10", "type": "contact_to_company"}, {"id": "10", "type": "contact_to_company"}]},
+        },
+    }
+    company = {
+        "id": "10",
+        "associations": {
+            "contacts": {"results": [{"id": "1", "type": "company_to_contact"}, {"id": "2", "type": "company_to_contact"}]},
+        },
+    }
+
+    rows = migrator.get_prod_associations([contact, company])
+
+    assert rows == [
+        ("1", "10", "contacts", "companies", "contact_to_company"),
+        ("10", "2", "companies", "contacts", "company_to_contact"),
+    ]
+
+
+def test_rerun_keeps_every_prod_product_sharing_a_sandbox_product(migrator, prod_portal, sandbox_portal):
+    widgets = [prod_portal.create("products", {"name": "Widget", "price": "5"}) for _ in range(2)]
+
+    mapping = migrator.create_product_mapping()
+    calls = dict(mock_hubspot.STATE.calls)
+    rerun_mapping = migrator.create_product_mapping()
+
+    assert mapping[str(widgets[0])] == mapping[str(widgets[1])]
+    assert rerun_mapping == mapping
+    assert len(sandbox_portal.records["products"]) == len(prod_portal.records["products"]) - 1
+    # the second run finds every prod product mapped, so it reads the prod catalogue without indexing sandbox's
+    assert {route: n - calls.get(route, 0) for route, n in mock_hubspot.STATE.calls.items() if n != calls.get(route, 0)} == {
+        "GET /crm/v3/objects/products": 1
+    }
+
+
+def test_clean_up_keeps_the_mappings_of_records_it_could_not_archive(monkeypatch, migrator, sandbox_portal):
+    migrator.migrate_object("contacts", limit=10)
+    archive_record_chunk = HubspotSandboxMigrator.archive_record_chunk
+    failed = []
+
+    def archive_record_chunk_failing_one(self, hs_object, sandbox_ids):
+        # the way a record that fails to archive one at a time is left out of the IDs archived
+        failed.append(sandbox_ids[0])
+        return archive_record_chunk(self, hs_object, sandbox_ids[1:])
+
+    monkeypatch.setattr(HubspotSandboxMigrator, "archive_record_chunk", archive_record_chunk_failing_one)
+    with pytest.raises(RuntimeError, match="1 records could not be archived"):
+        migrator.clean_up()
+    assert [row[0] for row in migrator.mapping_store.get_mappings(include_products=False)] == failed
+
+    monkeypatch.setattr(HubspotSandboxMigrator, "archive_record_chunk", archive_record_chunk)
+    migrator.clean_up()
+
+    assert count_records(sandbox_portal)["contacts"] == 0
+    assert migrator.mapping_store.get_mappings() == []
+
+
+def test_run_report_times_methods_but_not_per_record_helpers(migrator):
+    migrator.migrate_object("contacts", limit=10)
+
+    methods = migrator.metrics.last_report["methods"]
+    assert methods["migrate_object"]["calls"] == 1
+    assert "create_record_chunk" in methods
+    assert not {"call_api", "is_mapped", "get_hubspot_client"} & set(methods)
+
+
+def test_walk_comes_back_into_the_anchor_object_only_with_include_anchor(make_migrator, sandbox_portal):
+    make_migrator().migrate_object("contacts", limit=5, include_associations=True, max_depth=1)
+    records = count_records(sandbox_portal)
+    assert records["contacts"] == 5
+    assert records["line_items"] == 0
+
+    make_migrator().migrate_object("contacts", limit=5, include_associations=True, include_anchor=True)
+
+    assert count_records(sandbox_portal)["contacts"] > 5
+
+
+def test_sync_skips_the_records_it_already_synced_at_the_watermark(migrator, prod_portal, sandbox_portal):
+    # every contact was last modified in the same millisecond, the one the watermark ends up at
+    for record in prod_portal.records["contacts"].values():
+        record["updatedAt"] = "2026-01-01T00:00:00.000Z"
+    migrator.sync_object("contacts")
+    assert count_records(sandbox_portal)["contacts"] == 50
+    calls = dict(mock_hubspot.STATE.calls)
+
+    migrator.sync_object("contacts")
+    edited_id = next(iter(prod_portal.records["contacts"]))
+    prod_portal.records["contacts"][edited_id]["updatedAt"] = "2026-01-02T00:00:00.000Z"
+    migrator.sync_object("contacts")
+
+    writes = {
+        route: n - calls.get(route, 0)
+        for route, n in mock_hubspot.STATE.calls.items()
+        if route.startswith("POST") and "/batch/" in route and n != calls.get(route, 0)
+    }
+    assert writes == {"POST /crm/v3/objects/contacts/batch/update": 1}
+    assert migrator.mapping_store.get_watermark_ids("contacts") == {edited_id}
+
+
+def test_multi_sandbox_migration_sends_each_sandbox_the_properties_it_can_write(monkeypatch, hubspot, sandbox_portal):
+    multi = MultiSandboxMigrator("prod-key", ["sandbox-key", "sandbox-key-2"], host=hubspot)
+    first = multi.migrators[0]
+    get_property_schema = first.get_property_schema
+
+    def get_property_schema_without_lifecyclestage(hs_object, environment="prod", refresh=False):
+        schema = dict(get_property_schema(hs_object, environment, refresh))
+        if environment == "sandbox":
+            schema.pop("lifecyclestage", None)
+        return schema
+
+    # only the first sandbox lacks lifecyclestage, so the second still gets it
+    monkeypatch.setattr(first, "get_property_schema", get_property_schema_without_lifecyclestage)
+    multi.migrate_object("contacts", limit=5)
+
+    second_portal = mock_hubspot.STATE.portals["sandbox-key-2"]
+    assert [rec["properties"].get("lifecyclestage") for rec in sandbox_portal.records["contacts"].values()] == [None] * 5
+    assert [rec["properties"].get("lifecyclestage") for rec in second_portal.records["contacts"].values()] == ["lead"] * 5
+    for migrator in multi.migrators:
+        migrator.mapping_store.close()
+
+
+def test_get_properties_is_kept_as_a_deprecated_wrapper(migrator):
+    with pytest.warns(DeprecationWarning, match="get_property_schema"):
+        properties = migrator.get_properties("contacts")
+
+    assert "email" in list(properties["name"])
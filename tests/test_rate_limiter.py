@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+
+from hubspot_prod_to_sandbox import (
+    RateLimiter,
+    call_with_headers,
+    get_rate_limiter,
+    get_search_rate_limiter,
+    is_search_endpoint,
+)
+
+
+def test_burst_is_free_then_paced():
+    rate_limiter = RateLimiter(burst_limit=2, burst_interval=1, daily_limit=100)
+
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == pytest.approx(0.5, abs=0.05)
+
+
+def test_daily_limit():
+    rate_limiter = RateLimiter(burst_limit=10, burst_interval=1, daily_limit=1)
+    rate_limiter.reserve()
+
+    with pytest.raises(RuntimeError, match="Daily Hubspot API limit"):
+        rate_limiter.reserve()
+
+
+def test_throttled_halves_the_rate_and_pauses_for_retry_after():
+    rate_limiter = RateLimiter(burst_limit=10, burst_interval=1, daily_limit=100)
+
+    rate_limiter.throttled({"Retry-After": "2"})
+
+    assert rate_limiter.rate == 5
+    assert rate_limiter.reserve() == pytest.approx(2, abs=0.05)
+
+
+def test_succeeded_climbs_back_to_the_burst_limit():
+    rate_limiter = RateLimiter(burst_limit=10, burst_interval=1, daily_limit=100)
+    rate_limiter.throttled()
+    rate_limiter.throttled()
+
+    for _ in range(20):
+        rate_limiter.succeeded()
+
+    assert rate_limiter.rate == rate_limiter.max_rate == 10
+
+
+def test_follows_rate_limit_headers():
+    rate_limiter = RateLimiter(burst_limit=100, burst_interval=10, daily_limit=250000)
+
+    rate_limiter.succeeded(
+        {
+            "X-HubSpot-RateLimit-Max": "50",
+            "X-HubSpot-RateLimit-Interval-Milliseconds": "10000",
+            "X-HubSpot-RateLimit-Remaining": "3",
+            "X-HubSpot-RateLimit-Daily-Remaining": "1000",
+        }
+    )
+
+    assert rate_limiter.max_rate == 5
+    assert rate_limiter.tokens == 3
+    assert rate_limiter.daily_remaining == 1000
+
+
+def test_search_limiter_ignores_rate_limit_headers(process_caches):
+    rate_limiter = get_search_rate_limiter("prod-key")
+
+    rate_limiter.succeeded({"X-HubSpot-RateLimit-Max": "50", "X-HubSpot-RateLimit-Interval-Milliseconds": "10000"})
+
+    assert rate_limiter.max_rate == 4
+    assert get_search_rate_limiter("prod-key") is rate_limiter
+
+
+def test_limiters_are_shared_per_api_key(process_caches):
+    rate_limiter = get_rate_limiter("prod-key", burst_limit=150)
+
+    assert get_rate_limiter("prod-key") is rate_limiter
+    assert get_rate_limiter("other-prod-key") is not rate_limiter
+    assert rate_limiter.burst_limit == 150
+
+
+def test_searches_wait_on_the_search_limiter(migrator):
+    client = migrator.get_hubspot_client("contacts", "prod")
+    search_rate_limiter = migrator.search_rate_limiters["prod"]
+
+    migrator.call_api("prod", client.search_api.do_search, public_object_search_request={"limit": 1})
+    migrator.call_api("prod", client.basic_api.get_page, limit=1)
+
+    assert is_search_endpoint("crm.contacts.search_api.do_search")
+    assert search_rate_limiter.tokens == pytest.approx(3, abs=0.1)
+
+
+class SharedClientApi:
+    """A hubspot-style API whose calls all land on one api_client, the way threads share a migrator's clients"""
+
+    def __init__(self):
+        self.last_response_headers = None
+        self.both_received = threading.Barrier(2)
+
+    def get_page(self, **kwargs):
+        return self.get_page_with_http_info(**kwargs)[0]
+
+    def get_page_with_http_info(self, remaining, _return_http_data_only=None):
+        headers = {"X-HubSpot-RateLimit-Remaining": remaining}
+        self.last_response_headers = headers
+        # both calls have received their response before either returns, so last_response is the other's for one
+        self.both_received.wait(timeout=5)
+        if _return_http_data_only:
+            return remaining
+        return remaining, 200, headers
+
+
+def test_interleaved_calls_keep_their_own_headers():
+    api = SharedClientApi()
+    results = {}
+
+    def call(remaining):
+        results[remaining] = call_with_headers(api.get_page, remaining=remaining)
+
+    threads = [threading.Thread(target=call, args=(remaining,)) for remaining in ("10", "3")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {
+        "10": ("10", {"X-HubSpot-RateLimit-Remaining": "10"}),
+        "3": ("3", {"X-HubSpot-RateLimit-Remaining": "3"}),
+    }
+
+
+def test_call_with_headers_gives_no_headers_for_plain_functions():
+    assert call_with_headers(lambda page: page, page=2) == (2, {})